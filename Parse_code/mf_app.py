@@ -1,7 +1,15 @@
 import streamlit as st
-import pandas as pd
+import hashlib
 import json
-from mftool import Mftool
+import os
+import sys
+
+# Shared helpers live at the repository root, one level above this script.
+# Heavy modules (pandas, mftool) are imported by the functions that need
+# them, so the upload screen renders without loading them.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import metrics
+from nav_cache import IST, NavCache, expected_nav_date
 
 # --- CONFIGURATION ---
 st.set_page_config(page_title="Live Portfolio Dashboard", layout="wide")
@@ -10,116 +18,172 @@ st.set_page_config(page_title="Live Portfolio Dashboard", layout="wide")
 @st.cache_resource
 def get_mftool():
     """Initialize the MF Tool library (Cached to prevent reloading)"""
+    from mftool import Mftool
     return Mftool()
 
-def fetch_latest_nav(amfi_code, obj_mftool):
-    """Fetch latest NAV for a given AMFI code"""
-    if not amfi_code:
-        return None, None
-    
-    try:
-        # Fetch quote using mftool
-        quote = obj_mftool.get_scheme_quote(str(amfi_code))
-        return float(quote['nav']), quote['last_updated']
-    except Exception:
-        return None, None
+@st.cache_resource(max_entries=2)
+def get_nav_master(source, nav_day):
+    """Load the AMFI NAV master file once per NAV day (shared by all sessions)"""
+    from amfi_master import load_nav_master
+    return load_nav_master(source)
+
+@st.cache_resource
+def get_nav_cache():
+    """Open the on-disk NAV cache shared by all sessions"""
+    return NavCache()
+
+@st.cache_resource
+def get_scheduler():
+    """Background refresher of every held scheme's NAV (one per server process)"""
+    from nav_scheduler import get_scheduler
+    return get_scheduler(get_nav_cache())
+
+def show_scheduler_status():
+    """Sidebar summary of the background NAV refresh"""
+    from datetime import datetime
+
+    status = get_scheduler().status()
+    def when(ts):
+        return datetime.fromtimestamp(ts, IST).strftime("%d-%b %H:%M IST") if ts else "-"
+    st.subheader("🕒 NAV Refresher")
+    if status["state"] == "never":
+        st.caption(f"Not run yet · {status['held']} schemes tracked")
+        return
+    nav_day = f"{status['nav_date']:%d-%b-%Y}" if status.get("nav_date") else "-"
+    st.caption(f"State: {status['state']} · NAVs for {nav_day}\n\n"
+               f"Last run: {when(status['finished_at'] or status['started_at'])} · "
+               f"{status['refreshed'] or 0} of {status['codes'] or 0} schemes refreshed")
+    if status["state"] == "waiting":
+        st.caption(f"Retrying at {when(status['retry_at'])}: {status['error']}")
+
+def show_dashboard(data, nav_source, refresh, digest):
+    """Value the uploaded portfolio database at live NAVs and render the dashboard.
+
+    ``digest`` is the SHA-256 of the uploaded file, which keys the returns cache.
+    """
+    import pandas as pd
+    from amfi_master import AMFI_NAV_SOURCE
+    from mf_portfolio import flatten_folios, scheme_flows, value_holdings
+    from nav_fetch import fetch_navs
+    from portfolio_summary import shares, styled, totals
+    from returns import TOTAL_LABEL, holdings_returns
+
+    nav_source = nav_source or AMFI_NAV_SOURCE
 
-# --- MAIN UI ---
-st.title("📈 Live Mutual Fund Portfolio Tracker")
-st.markdown("Upload your **`my_portfolio_db.json`** file to see values updated with **Live NAVs**.")
-
-# 1. SIDEBAR: File Upload
-with st.sidebar:
-    st.header("📁 Load Data")
-    uploaded_file = st.file_uploader("Upload JSON Database", type=["json"])
-    
-    refresh = st.button("🔄 Refresh NAVs")
-
-# 2. MAIN LOGIC
-if uploaded_file:
-    # Load JSON data
-    data = json.load(uploaded_file)
-    mf = get_mftool()
-    
     investor_name = data.get('investor_info', {}).get('name', 'Investor')
     st.subheader(f"Welcome, {investor_name}")
 
-    # Container for the rows
-    portfolio_data = []
-    
-    # Progress bar for fetching NAVs (can be slow for many funds)
-    progress_bar = st.progress(0)
-    status_text = st.empty()
-    
-    # Flatten the JSON structure
-    all_schemes = []
-    for folio in data.get('folios', []):
-        for scheme in folio.get('schemes', []):
-            all_schemes.append({
-                "folio": folio['folio'],
-                "scheme_data": scheme
-            })
-
-    total_schemes = len(all_schemes)
-
-    # 3. ITERATE AND UPDATE
-    for i, item in enumerate(all_schemes):
-        scheme = item['scheme_data']
-        folio_num = item['folio']
-        
-        name = scheme['scheme']
-        amfi_code = scheme.get('amfi', None) # casparser usually finds this
-        units = float(scheme['valuation']['units'])
-        old_val = float(scheme['valuation']['value'])
-        
-        # Update Status
-        status_text.text(f"Fetching NAV for: {name}...")
-        progress_bar.progress((i + 1) / total_schemes)
+    # Flatten the JSON structure into one row per scheme
+    holdings = flatten_folios(data)
+    nav = pd.Series(float("nan"), index=holdings.index)
+    nav_date = pd.Series("", index=holdings.index, dtype=object)
+    status = pd.Series("✅ Live", index=holdings.index, dtype=object)
 
-        # FETCH LIVE DATA
-        latest_nav, nav_date = fetch_latest_nav(amfi_code, mf)
-        
-        # Calculate New Value
-        if latest_nav:
-            current_val = units * latest_nav
-            nav_display = latest_nav
-            val_display = current_val
-            gain_loss = current_val - scheme['valuation'].get('cost', 0)
-            nav_status = f"✅ Live ({nav_date})"
-        else:
-            # Fallback to PDF data if live fetch fails
-            current_val = old_val
-            nav_display = float(scheme['valuation'].get('nav', 0))
-            val_display = old_val
-            gain_loss = 0
-            nav_status = "⚠️ Old (PDF Data)"
-
-        portfolio_data.append({
-            "Scheme Name": name,
-            "AMFI Code": amfi_code,
-            "Units": units,
-            "Latest NAV (₹)": nav_display,
-            "Current Value (₹)": val_display,
-            "Status": nav_status,
-        })
-
-    status_text.empty()
-    progress_bar.empty()
-
-    # 4. DISPLAY DASHBOARD
-    if portfolio_data:
-        df = pd.DataFrame(portfolio_data)
+    # 3. READ NAVs PRECOMPUTED BY THE BACKGROUND REFRESHER
+    # (a refresh still serves quotes for the latest NAV date and re-checks only stale ones)
+    nav_cache = get_nav_cache()
+    scheduler = get_scheduler()
+    codes = holdings["amfi"].dropna().astype(str).str.strip()
+    scheduler.hold(codes)
+    fresh = nav_cache.fresh(codes, force=refresh)
+    for idx, code in codes.items():
+        if code in fresh:
+            nav[idx], nav_date[idx] = fresh[code]
+
+    # 4. LOOK UP THE REST IN THE AMFI MASTER FILE (one read for all schemes)
+    pending = nav.isna()
+    if pending.any():
+        try:
+            nav_day = expected_nav_date()
+            master = get_nav_master(nav_source, nav_day)
+            if refresh and master.nav_date.date() < nav_day:
+                get_nav_master.clear()
+                master = get_nav_master(nav_source, nav_day)
+            found = master.lookup(holdings.loc[pending, "amfi"], holdings.loc[pending, "isin"])
+            nav[pending] = found["nav"]
+            nav_date[pending] = found["nav_date"].dt.strftime("%d-%b-%Y").fillna("")
+            # Codes resolved from ISINs are refreshed in the background from now on
+            scheduler.hold(found["amfi_code"].dropna().astype(str))
+        except Exception as exc:
+            st.warning(f"Could not load the AMFI NAV file ({exc}). Fetching quotes per scheme instead.")
+
+    # 5. FETCH ANY REMAINING CODES PER SCHEME (each AMFI code once, in parallel)
+    missing = nav.isna() & holdings["amfi"].notna()
+    if missing.any():
+        # Progress bar for fetching NAVs (can be slow for many funds)
+        progress_bar = st.progress(0)
+        status_text = st.empty()
+
+        def show_progress(done, total, code):
+            status_text.text(f"Fetched NAV {done} of {total} (AMFI {code})...")
+            progress_bar.progress(done / total)
+
+        mf = get_mftool()
+        navs = fetch_navs(
+            holdings.loc[missing, "amfi"],
+            mf,
+            fetch=lambda obj, code: nav_cache.fetch(obj, code, force=refresh),
+            on_progress=show_progress,
+        )
+        for idx, amfi_code in holdings.loc[missing, "amfi"].items():
+            latest_nav, latest_date = navs.get(str(amfi_code).strip(), (None, None))
+            if not latest_nav:
+                # Network failed: an older cached quote still beats the PDF value
+                cached = nav_cache.latest(amfi_code)
+                if cached:
+                    latest_nav, latest_date = cached["nav"], cached["last_updated"]
+                    status[idx] = "🕒 Cached"
+            nav[idx], nav_date[idx] = latest_nav, latest_date
+
+        status_text.empty()
+        progress_bar.empty()
+
+    # 6. CALCULATE NEW VALUES (vectorized; PDF data where no NAV was found)
+    valued = value_holdings(holdings, nav)
+    status = (status + " (" + nav_date.astype(str) + ")").where(valued["live"], "⚠️ Old (PDF Data)")
+    invested = valued["cost"].where(valued["cost"] > 0)
+    portfolio_data = pd.DataFrame({
+        "Scheme Name": valued["scheme"],
+        "AMFI Code": valued["amfi"],
+        "Units": valued["units"],
+        "Latest NAV (₹)": valued["nav"],
+        "Current Value (₹)": valued["value"],
+        "Weight (%)": shares(valued["value"]),
+        "Gain (₹)": valued["gain"],
+        "Return (%)": valued["gain"] / invested * 100,
+        "Status": status,
+    })
+
+    # XIRR from the statement's dated transactions, valued today (cached per statement and valuation)
+    held = pd.DataFrame({"value": valued["value"], "as_of": pd.Timestamp.today().normalize()})
+    returns = holdings_returns(digest, lambda: scheme_flows(data), held)
+    if returns.empty:
+        returns = None
+    else:
+        portfolio_data["XIRR (%)"] = returns["XIRR (%)"].reindex(portfolio_data.index)
+
+    # 7. DISPLAY DASHBOARD
+    if not portfolio_data.empty:
+        df = portfolio_data
         
         # Top level metrics
-        total_value = df["Current Value (₹)"].sum()
-        st.metric(label="💰 Total Portfolio Value (Live)", value=f"₹{total_value:,.2f}")
+        total = totals(df, ["Current Value (₹)", "Gain (₹)"])
+        col_value, col_gain, col_xirr = st.columns(3)
+        col_value.metric(label="💰 Total Portfolio Value (Live)", value=f"₹{total['Current Value (₹)']:,.2f}")
+        col_gain.metric(label="📊 Total Gain", value=f"₹{total['Gain (₹)']:,.2f}")
+        if returns is not None and pd.notna(returns.loc[TOTAL_LABEL, "XIRR (%)"]):
+            col_xirr.metric(label="📈 Portfolio XIRR", value=f"{returns.loc[TOTAL_LABEL, 'XIRR (%)']:.2f}%")
         
         # Formatting for display
         st.dataframe(
-            df.style.format({
+            styled(df, {
                 "Units": "{:.4f}",
                 "Latest NAV (₹)": "{:.4f}",
                 "Current Value (₹)": "{:,.2f}",
+                "Weight (%)": "{:.2f}",
+                "Gain (₹)": "{:,.2f}",
+                "Return (%)": "{:.2f}",
+                "XIRR (%)": "{:.2f}",
             }),
             use_container_width=True,
             height=500
@@ -127,5 +191,109 @@ if uploaded_file:
     else:
         st.warning("No schemes found in the JSON file.")
 
-else:
-    st.info("👈 Please upload your JSON file from the sidebar to begin.")
\ No newline at end of file
+    # 8. VALUE HISTORY (units held each day x that day's NAV, from the local NAV history)
+    if not holdings.empty:
+        show_value_history(data, holdings)
+
+def show_value_history(data, holdings):
+    """Daily portfolio value over a chosen period, from stored NAVs and the statement's unit balances"""
+    import pandas as pd
+    from mf_portfolio import unit_balances
+    from nav_history import get_history, value_series
+
+    history = get_history()
+    covered = holdings["amfi"].map(history.has)
+    st.subheader("📉 Value History")
+    if not covered.any():
+        st.caption("No NAV history stored for these schemes yet. Load AMFI NAV history reports "
+                   "with `python nav_history.py load FILE_OR_URL`.")
+        return
+    years = st.radio("Period", [1, 3, 5, 10], index=1, horizontal=True, format_func=lambda y: f"{y}Y")
+    end = pd.Timestamp.today().normalize()
+    dates, navs = history.navs(holdings["amfi"].tolist(), end - pd.DateOffset(years=years), end)
+    opening, balances = unit_balances(data)
+    st.line_chart(value_series(opening, balances, navs, dates).rename("Value (₹)"))
+    if not covered.all():
+        st.caption(f"Not included (no stored NAVs): {', '.join(holdings.loc[~covered, 'scheme'].astype(str))}")
+
+def show_household(files):
+    """Merge several family members' statements into one household view"""
+    from household import combine, household_view, member_breakdown, member_totals, parse_statements, revalue
+    from portfolio_summary import shares, styled
+
+    with st.spinner(f"Reading {len(files)} statements..."):
+        results = parse_statements(files)
+    frames = []
+    for (name, _), (frame, error) in zip(files, results):
+        if error:
+            st.warning(f"Skipped {name}: {error}")
+        else:
+            frames.append(frame)
+    if not frames:
+        return
+
+    # Value at NAVs precomputed by the background refresher; statement values otherwise
+    holdings = combine(frames)
+    codes = holdings["amfi"].dropna()
+    get_scheduler().hold(codes)
+    fresh = get_nav_cache().fresh(codes)
+    holdings = revalue(holdings, {code: nav for code, (nav, _) in fresh.items()})
+
+    household = household_view(holdings)
+    members = member_totals(holdings)
+    st.subheader(f"🏠 Household of {len(members)} members")
+    col_value, col_schemes, col_live = st.columns(3)
+    col_value.metric("💰 Household Value", f"₹{household['value'].sum():,.2f}")
+    col_schemes.metric("📚 Schemes", f"{len(household):,}")
+    col_live.metric("✅ Valued at latest NAV", f"{holdings['live'].mean():.0%}")
+
+    household["Weight (%)"] = shares(household["value"])
+    st.dataframe(styled(household.rename(columns={
+        "scheme": "Scheme Name", "amfi": "AMFI Code", "units": "Units", "value": "Current Value (₹)",
+        "cost": "Invested (₹)", "members": "Members", "nav": "NAV (₹)", "gain": "Gain (₹)",
+    }).reset_index(drop=True), {
+        "Units": "{:,.4f}", "Current Value (₹)": "{:,.2f}", "Invested (₹)": "{:,.2f}",
+        "NAV (₹)": "{:.4f}", "Gain (₹)": "{:,.2f}", "Weight (%)": "{:.2f}",
+    }), use_container_width=True)
+
+    st.subheader("👪 Per Member")
+    members["Share (%)"] = shares(members["value"])
+    st.dataframe(styled(members.rename(columns={
+        "schemes": "Schemes", "value": "Current Value (₹)", "cost": "Invested (₹)",
+    }), {"Current Value (₹)": "{:,.2f}", "Invested (₹)": "{:,.2f}", "Share (%)": "{:.2f}"}),
+        use_container_width=True)
+    breakdown = member_breakdown(holdings)
+    st.dataframe(styled(breakdown, {member: "{:,.2f}" for member in breakdown.columns}),
+                 use_container_width=True)
+
+# --- MAIN UI ---
+def main():
+    st.title("📈 Live Mutual Fund Portfolio Tracker")
+    st.markdown("Upload your **`my_portfolio_db.json`** file to see values updated with **Live NAVs**, "
+                "or several family members' statements for a household view.")
+
+    # 1. SIDEBAR: File Upload
+    with st.sidebar:
+        st.header("📁 Load Data")
+        uploaded_files = st.file_uploader("Upload JSON Database", type=["json"], accept_multiple_files=True)
+        nav_source = st.text_input("AMFI NAV file (URL or local path)", value=os.environ.get("AMFI_NAV_SOURCE", ""),
+                                   placeholder="AMFI NAVAll.txt (default)")
+
+        refresh = st.button("🔄 Refresh NAVs")
+        show_scheduler_status()
+
+    # 2. MAIN LOGIC
+    files = [(f.name, f.getvalue()) for f in uploaded_files or []]
+    data = json.loads(files[0][1]) if len(files) == 1 else None
+    if data is not None and "folios" in data:
+        with metrics.timer("page_rerun_seconds", page="dashboard"):
+            show_dashboard(data, nav_source, refresh, hashlib.sha256(files[0][1]).hexdigest())
+    elif files:
+        with metrics.timer("page_rerun_seconds", page="household"):
+            show_household(files)
+    else:
+        st.info("👈 Please upload your JSON file from the sidebar to begin.")
+
+if __name__ == "__main__":
+    metrics.start_writer("mf_app")
+    main()
@@ -0,0 +1,132 @@
+"""Bulk loader for the AMFI NAV master file (NAVAll.txt).
+
+The whole file is read in one pass into a compact table indexed by AMFI
+code, with a second index from ISIN to AMFI code. A portfolio is then
+valued with a single join instead of one quote request per scheme.
+"""
+import io
+import os
+import urllib.request
+
+import pandas as pd
+
+import metrics
+
+AMFI_NAV_URL = "https://www.amfiindia.com/spages/NAVAll.txt"
+AMFI_NAV_SOURCE = os.environ.get("AMFI_NAV_SOURCE", AMFI_NAV_URL)
+DOWNLOAD_TIMEOUT = 60
+
+# Header names as published by AMFI, matched case-insensitively. The
+# positions are the classic six-column layout, used if no header is found.
+COLUMNS = {
+    "amfi_code": (("scheme code",), 0),
+    "isin_growth": (("isin div payout", "isin growth"), 1),
+    "isin_reinvest": (("isin div reinvestment",), 2),
+    "scheme_name": (("scheme name",), 3),
+    "nav": (("net asset value",), 4),
+    "nav_date": (("date",), 5),
+}
+
+
+def read_source(source=AMFI_NAV_SOURCE):
+    """Return the raw NAV master text from a URL, a local path or a file object"""
+    if hasattr(source, "read"):
+        raw = source.read()
+    elif str(source).startswith(("http://", "https://")):
+        with urllib.request.urlopen(source, timeout=DOWNLOAD_TIMEOUT) as response:
+            raw = response.read()
+    else:
+        with open(source, "rb") as f:
+            raw = f.read()
+    return raw.decode("utf-8", errors="replace") if isinstance(raw, bytes) else raw
+
+
+def _column_positions(header):
+    names = [h.strip().lower() for h in header.split(";")]
+    positions = {}
+    for column, (labels, default) in COLUMNS.items():
+        found = [i for i, name in enumerate(names) if any(name.startswith(label) for label in labels)]
+        positions[column] = found[0] if found else default
+    return positions
+
+
+def parse_nav_rows(text):
+    """Every NAV row of a file in AMFI's semicolon format, in file order.
+
+    AMC names and scheme category headings are interleaved with the data;
+    only lines that start with a numeric scheme code are kept. NAVAll.txt
+    has one row per scheme; AMFI's NAV history reports have one per scheme
+    and date.
+    """
+    lines = text.splitlines()
+    header = next((line for line in lines if line.lower().startswith("scheme code")), "")
+    positions = _column_positions(header) if header else {c: d for c, (_, d) in COLUMNS.items()}
+    rows = "\n".join(line for line in lines if line[:1].isdigit() and ";" in line)
+    if not rows:
+        raise ValueError("No NAV rows found in the AMFI NAV file")
+
+    order = sorted(positions, key=positions.get)
+    df = pd.read_csv(
+        io.StringIO(rows), sep=";", header=None, dtype=str,
+        usecols=[positions[c] for c in order], keep_default_na=False,
+    )
+    df.columns = order
+    df["amfi_code"] = pd.to_numeric(df["amfi_code"], errors="coerce")
+    df = df.dropna(subset=["amfi_code"])
+    for column in ("isin_growth", "isin_reinvest"):
+        df[column] = df[column].str.strip().where(df[column].str.len() == 12)
+    df["scheme_name"] = df["scheme_name"].str.strip()
+    df["nav"] = pd.to_numeric(df["nav"], errors="coerce")
+    df["nav_date"] = pd.to_datetime(df["nav_date"].str.strip(), format="%d-%b-%Y", errors="coerce")
+    return df.astype({"amfi_code": "int32", "isin_growth": "string", "isin_reinvest": "string",
+                      "scheme_name": "string"})
+
+
+@metrics.timed("parse_seconds", parser="amfi_nav")
+def parse_nav_master(text):
+    """Parse NAVAll.txt text into a DataFrame indexed by AMFI code"""
+    df = parse_nav_rows(text)
+    return df.drop_duplicates("amfi_code", keep="last").set_index("amfi_code").sort_index()
+
+
+class NavMaster:
+    """Parsed NAV master with lookups by AMFI code and by ISIN"""
+
+    def __init__(self, table):
+        self.table = table
+        isins = pd.concat([
+            pd.Series(table.index, index=table["isin_growth"]),
+            pd.Series(table.index, index=table["isin_reinvest"]),
+        ])
+        self.isin_codes = isins[isins.index.notna()]
+        self.isin_codes = self.isin_codes[~self.isin_codes.index.duplicated()]
+
+    def __len__(self):
+        return len(self.table)
+
+    @property
+    def nav_date(self):
+        """Most recent NAV date in the file"""
+        return self.table["nav_date"].max()
+
+    def resolve_codes(self, amfi_codes, isins=None):
+        """Numeric AMFI codes, filling missing or unknown ones from the ISIN index"""
+        codes = pd.to_numeric(pd.Series(amfi_codes), errors="coerce")
+        codes = codes.where(codes.isin(self.table.index))
+        if isins is not None:
+            by_isin = pd.Series(isins, index=codes.index).map(self.isin_codes)
+            codes = codes.fillna(by_isin)
+        return codes
+
+    def lookup(self, amfi_codes, isins=None):
+        """NAV and NAV date for every requested code, aligned to the input order"""
+        codes = self.resolve_codes(amfi_codes, isins)
+        found = self.table.reindex(codes.astype("float").values)[["nav", "nav_date"]]
+        found.index = codes.index
+        found.insert(0, "amfi_code", codes.astype("Int64"))
+        return found
+
+
+def load_nav_master(source=AMFI_NAV_SOURCE):
+    """Download or read NAVAll.txt and build its indexes in one pass"""
+    return NavMaster(parse_nav_master(read_source(source)))
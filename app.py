@@ -1,113 +1,104 @@
 import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
 from datetime import datetime, timedelta
-import json
 import os
 import random
 
-# Constants and directories
-CLIENTS_FILE = "clients.json"
-DATADIR = "userdata"
-os.makedirs(DATADIR, exist_ok=True)
+# pandas and the parsing modules are imported by the pages that use them
+import metrics
+from client_store import get_store
+from userdata_store import get_store as get_userdata_store
 
-# Helper: Load all clients
+# Helper: Load all clients (full scan; prefer get_store().get(phone) for lookups)
 def load_clients():
-    if not os.path.exists(CLIENTS_FILE):
-        return {}
-    with open(CLIENTS_FILE) as f:
-        return json.load(f)
+    return get_store().all()
 
 # Helper: Save all clients
 def save_clients(clients):
-    with open(CLIENTS_FILE, "w") as f:
-        json.dump(clients, f, indent=2)
+    get_store().replace_all(clients)
 
-# Helper: Save user data (portfolio, goals, insurance)
+# Helper: Save user data (portfolio, goals, insurance); skipped if unchanged
 def save_userdata(mobile, key, data):
-    filepath = os.path.join(DATADIR, f"{mobile}_{key}.json")
-    with open(filepath, "w") as f:
-        json.dump(data, f)
+    get_userdata_store().save(mobile, key, data)
 
 def load_userdata(mobile, key):
-    filepath = os.path.join(DATADIR, f"{mobile}_{key}.json")
-    if os.path.exists(filepath):
-        with open(filepath) as f:
-            return json.load(f)
-    return None
+    return get_userdata_store().load(mobile, key)
 
 def clear_userdata(mobile):
-    for key in ["portfolio", "financialgoals", "insurance"]:
-        filepath = os.path.join(DATADIR, f"{mobile}_{key}.json")
-        if os.path.exists(filepath):
-            os.remove(filepath)
-
-# Parse CAMS JSON to extract portfolio data
-def parse_cams_json(file):
-    import json
-    from collections import defaultdict
-
-    data = json.load(file)
-    records = data.get("TRXN_DETAILS", [])
-    holdings = defaultdict(lambda: {"units": 0.0, "latest_nav": 0.0, "scheme_name": ""})
-
-    for record in records:
-        scheme_name = record.get("Scheme Name", "N/A")
-        units = float(record.get("Units", 0))
-        nav = float(record.get("Price", 0))
-        desc = record.get("Desc", "").lower()
-
-        # Purchase adds units, redemption/switch/subtract units
-        if "purchase" in desc:
-            holdings[scheme_name]["units"] += units
-        elif "redemption" in desc or "switch" in desc:
-            holdings[scheme_name]["units"] -= units
-        else:
-            holdings[scheme_name]["units"] += units  # treat other as addition
-
-        holdings[scheme_name]["latest_nav"] = nav  # assumes sorted by date or always use latest
-
-        holdings[scheme_name]["scheme_name"] = scheme_name
+    get_userdata_store().clear(mobile)
 
-    portfolio = []
-    total_value = 0.0
-    for h in holdings.values():
-        value = h["units"] * h["latest_nav"]
-        portfolio.append({
-            "Scheme Name": h["scheme_name"],
-            "Total Units": h["units"],
-            "Current NAV": h["latest_nav"],
-            "Current Value": value
-        })
-        total_value += value
-    return portfolio, total_value
+# Show portfolio in Streamlit with CAMS JSON upload; holdings accumulate across statements
+def show_cams_portfolio(mobile):
+    import pandas as pd
+    from cams_ledger import BACKDATED_FIELDS, get_ledger
+    from returns import statement_returns
 
-
-# Show portfolio in Streamlit with CAMS JSON upload
-def show_cams_portfolio():
     st.header("Upload CAMS JSON Portfolio File")
     uploaded_file = st.file_uploader("Choose your CAMS JSON file", type="json")
     if uploaded_file is not None:
-        portfolio, total = parse_cams_json(uploaded_file)
+        # Stream transactions and apply only those newer than the folio checkpoints
+        progress_bar = st.progress(0.0)
+        def show_progress(bytes_read, records):
+            progress_bar.progress(min(bytes_read / max(uploaded_file.size, 1), 1.0),
+                                  text=f"Read {records:,} transactions")
+        ledger = get_ledger()
+        # Reruns keep the first result rather than reporting the same file as a duplicate
+        key = f"cams_ingest_{uploaded_file.file_id}"
+        if key not in st.session_state:
+            st.session_state[key] = ledger.ingest(mobile, uploaded_file, progress=show_progress)
+        summary = st.session_state[key]
+        progress_bar.empty()
+        if summary["duplicate"]:
+            st.info("This statement was already uploaded; showing your saved holdings.")
+        elif summary["older"]:
+            folios = ", ".join(f"{folio or 'unknown folio'} (last applied {day})"
+                               for folio, day in summary["older"].items())
+            st.warning(f"This statement ends before transactions already recorded for {folios}, so "
+                       "nothing from it was applied. Statements have to be uploaded oldest first; adding "
+                       "an older one now needs your saved CAMS holdings to be reset.")
+        else:
+            st.caption(f"Applied {summary['applied']:,} new transactions across {summary['folios']} folios; "
+                       f"skipped {summary['skipped']:,} already recorded.")
+            if summary["backdated"]:
+                with st.expander(f"{len(summary['backdated']):,} transactions dated before your last upload "
+                                 "were taken as already recorded"):
+                    st.write("A backdated correction among these is not applied; it needs your saved CAMS "
+                             "holdings to be reset and the statements uploaded oldest first.")
+                    st.dataframe(pd.DataFrame(summary["backdated"], columns=BACKDATED_FIELDS))
+        portfolio, total = ledger.portfolio(mobile)
+        if summary["applied"]:
+            save_portfolio(mobile, portfolio)  # skipped by the store when unchanged
         if len(portfolio) > 0:
             df = pd.DataFrame(portfolio)
             st.subheader("Your Portfolio Holdings")
             st.dataframe(df)
             st.write(f"**Total Portfolio Value:** ₹{total:,.2f}")
+            st.subheader("Returns (this statement)")
+            st.dataframe(statement_returns(uploaded_file, summary["sha256"]).style.format({
+                "Invested": "₹{:,.2f}",
+                "Current Value": "₹{:,.2f}",
+                "Absolute Return": "₹{:,.2f}",
+                "Holding Period Return (%)": "{:.2f}",
+                "Holding Days": "{:,.0f}",
+                "XIRR (%)": "{:.2f}",
+            }, na_rep="-"))
         else:
             st.write("No holdings data found in the file.")
 
 def save_portfolio(mobile, portfolio):
-    save_userdata(mobile, "portfolio", portfolio)
+    from frames import as_frame
+    get_userdata_store().save_frame(mobile, "portfolio", as_frame(portfolio, "portfolio"))
 
 def load_portfolio(mobile):
-    return load_userdata(mobile, "portfolio")
+    return get_userdata_store().load_frame(mobile, "portfolio")
 
 def display_portfolio(portfolio):
-    if portfolio and len(portfolio) > 0:
-        df = pd.DataFrame(portfolio)
+    from frames import as_frame
+    from portfolio_summary import totals
+
+    if portfolio is not None and len(portfolio) > 0:
+        df = as_frame(portfolio, "portfolio")
         st.dataframe(df)
-        total_val = sum(item.get("Current Value", 0) for item in portfolio)
+        total_val = totals(df, ["Current Value"]).get("Current Value", 0.0)
         st.write(f"**Total Portfolio Value:** ₹{total_val:,.2f}")
     else:
         st.write("No portfolio data found.")
@@ -118,20 +109,21 @@ def main_app(user_mobile):
     menu = ["Home", "View Portfolio", "Upload CAMS Portfolio", "Logout"]
     choice = st.sidebar.selectbox("Select Activity", menu)
 
-    if choice == "Home":
-        st.write("Welcome to your personalized Portfolio Tracker")
+    with metrics.timer("page_rerun_seconds", page=choice):
+        if choice == "Home":
+            st.write("Welcome to your personalized Portfolio Tracker")
 
-    elif choice == "View Portfolio":
-        st.header("Your Portfolio")
-        portfolio = load_portfolio(user_mobile)
-        display_portfolio(portfolio)
+        elif choice == "View Portfolio":
+            st.header("Your Portfolio")
+            portfolio = load_portfolio(user_mobile)
+            display_portfolio(portfolio)
 
-    elif choice == "Upload CAMS Portfolio":
-        show_cams_portfolio()
+        elif choice == "Upload CAMS Portfolio":
+            show_cams_portfolio(user_mobile)
 
-    elif choice == "Logout":
-        st.success("You have been logged out.")
-        st.experimental_rerun()
+        elif choice == "Logout":
+            st.success("You have been logged out.")
+            st.experimental_rerun()
 
 def authenticate_user(mobile, otp):
     valid_otp = "123456"
@@ -158,6 +150,7 @@ def user_login():
     return None
 
 if __name__ == "__main__":
+    metrics.start_writer("cams")
     if "user_mobile" not in st.session_state:
         user_mobile = user_login()
         if user_mobile:
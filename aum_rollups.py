@@ -0,0 +1,249 @@
+"""Firm-wide AUM rollups by category, CAMS scheme, income bracket and age bracket.
+
+Totals are kept materialized in SQLite, one row per (dimension, bucket)
+with the AUM and the number of clients in it, so the advisor dashboard
+reads a handful of rows however many clients there are. Each client's own
+contribution is stored beside the totals; when a portfolio is saved the
+``on_save`` hook works out the difference from the stored contribution and
+adds only that delta to the affected buckets. A client's brackets are
+taken from the client store at save time. The stat signature of the file
+behind each contribution is stored too, and ``reconcile`` re-applies every
+client whose file no longer matches, so saves made by other processes, the
+batch job, or before the hook was attached still reach the totals.
+``rebuild`` recomputes everything from the saved portfolios, which also
+clears any rounding drift.
+
+CSV uploads name an investment category per row while CAMS holdings name
+a fund, so CSV portfolios roll up by ``category`` and CAMS portfolios by
+``scheme``, and the two never share buckets.
+
+    python aum_rollups.py rebuild
+    python aum_rollups.py show [category|scheme|income_bracket|age_bracket]
+"""
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import defaultdict
+
+import client_store
+import metrics
+import userdata_store
+
+AUM_DB = os.environ.get("AUM_DB", "aum.db")
+KEY = "portfolio"
+CATEGORY_COLUMN = "Scheme Name"  # a category in CSV uploads, a fund in CAMS holdings
+SOURCE_DIMENSIONS = {"Investment Amount": "category", "Current Value": "scheme"}  # by value column
+DIMENSIONS = ("category", "scheme", "income_bracket", "age_bracket")
+ROLLUP_VERSION = "3"  # bumped when buckets or tables change meaning, so stored rollups are rebuilt
+RECONCILE_EVERY = float(os.environ.get("AUM_RECONCILE_SECONDS", "30"))
+TOTAL = "total"
+UNKNOWN = "Unknown"
+BREAKDOWN_COLUMNS = ["bucket", "aum", "clients"]
+
+
+def positions(df):
+    """``(dimension, {bucket: amount})`` for a stored portfolio frame"""
+    from frames import as_frame
+    from portfolio_summary import to_amounts, value_column
+
+    df = as_frame(df, KEY)
+    column = value_column(df) if df is not None else None
+    if column is None or CATEGORY_COLUMN not in df:
+        return None, {}
+    categories = df[CATEGORY_COLUMN].astype("string").str.strip().fillna(UNKNOWN).replace("", UNKNOWN)
+    amounts = to_amounts(df[column]).set_axis(df.index).groupby(categories, sort=False).sum()
+    return SOURCE_DIMENSIONS[column], {str(category): float(amount) for category, amount in amounts.items()}
+
+
+def contribution(positions, client):
+    """A client's ``(dimension, bucket, aum)`` rows; none for an empty portfolio"""
+    dimension, amounts = positions
+    if not amounts:
+        return []
+    total = sum(amounts.values())
+    client = client or {}
+    return [
+        (TOTAL, "", total),
+        ("income_bracket", client.get("income_bracket") or UNKNOWN, total),
+        ("age_bracket", client.get("age_bracket") or UNKNOWN, total),
+        *((dimension, bucket, amount) for bucket, amount in amounts.items()),
+    ]
+
+
+class AumRollups:
+    """Materialized AUM totals and the per-client contributions behind them"""
+
+    def __init__(self, path=AUM_DB):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS rollups (
+                    dimension TEXT NOT NULL,
+                    bucket TEXT NOT NULL,
+                    aum REAL NOT NULL,
+                    clients INTEGER NOT NULL,
+                    PRIMARY KEY (dimension, bucket)
+                )""")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS contributions (
+                    mobile TEXT NOT NULL,
+                    dimension TEXT NOT NULL,
+                    bucket TEXT NOT NULL,
+                    aum REAL NOT NULL,
+                    PRIMARY KEY (mobile, dimension, bucket)
+                )""")
+            conn.execute("CREATE TABLE IF NOT EXISTS sources (mobile TEXT PRIMARY KEY, signature TEXT NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    @metrics.timed("aum_rollup_seconds", op="update")
+    def update_client(self, mobile, df, signature=None):
+        """Apply the change in one client's portfolio; ``df`` None removes it.
+
+        ``signature`` is the stat signature of the file ``df`` was saved to
+        (see ``UserDataStore.signature``); without one, ``reconcile`` reads
+        the client's file again.
+        """
+        rows = contribution(positions(df), client_store.get_store().get(mobile)) if df is not None else []
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            delta = defaultdict(lambda: [0.0, 0])
+            for dimension, bucket, aum in conn.execute(
+                    "SELECT dimension, bucket, aum FROM contributions WHERE mobile = ?", (mobile,)):
+                delta[dimension, bucket][0] -= aum
+                delta[dimension, bucket][1] -= 1
+            for dimension, bucket, aum in rows:
+                delta[dimension, bucket][0] += aum
+                delta[dimension, bucket][1] += 1
+            changed = [(dimension, bucket, aum, clients)
+                       for (dimension, bucket), (aum, clients) in delta.items() if aum or clients]
+            conn.executemany(
+                "INSERT INTO rollups VALUES (?, ?, ?, ?) ON CONFLICT (dimension, bucket) DO UPDATE SET "
+                "aum = aum + excluded.aum, clients = clients + excluded.clients", changed)
+            conn.execute("DELETE FROM rollups WHERE clients <= 0")
+            conn.execute("DELETE FROM contributions WHERE mobile = ?", (mobile,))
+            conn.executemany("INSERT INTO contributions VALUES (?, ?, ?, ?)",
+                             [(mobile, *row) for row in rows])
+            conn.execute("DELETE FROM sources WHERE mobile = ?", (mobile,))
+            if signature:
+                conn.execute("INSERT INTO sources VALUES (?, ?)", (mobile, signature))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        metrics.inc("aum_rollup_buckets_total", len(changed))
+
+    def reconcile(self, store):
+        """Re-apply every client whose portfolio file changed since it was rolled up; returns how many"""
+        current = store.signatures(KEY)
+        known = dict(self._connect().execute("SELECT mobile, signature FROM sources"))
+        stale = sorted(mobile for mobile in current.keys() | known.keys() if current.get(mobile) != known.get(mobile))
+        for mobile in stale:
+            df = store.load_frame(mobile, KEY) if mobile in current else None
+            self.update_client(mobile, df, current.get(mobile))
+        metrics.inc("aum_rollup_reconciled_total", len(stale))
+        return len(stale)
+
+    def total(self):
+        """``(aum, clients)`` across the firm"""
+        row = self._connect().execute(
+            "SELECT aum, clients FROM rollups WHERE dimension = ? AND bucket = ''", (TOTAL,)).fetchone()
+        return row or (0.0, 0)
+
+    def breakdown(self, dimension):
+        """AUM, client count and share per bucket of ``dimension``, largest first"""
+        import pandas as pd
+        from portfolio_summary import SHARE_COLUMN, shares
+
+        if dimension not in DIMENSIONS:
+            raise ValueError(f"dimension must be one of {', '.join(DIMENSIONS)}")
+        rows = self._connect().execute(
+            "SELECT bucket, aum, clients FROM rollups WHERE dimension = ? ORDER BY aum DESC, bucket",
+            (dimension,)).fetchall()
+        df = pd.DataFrame(rows, columns=BREAKDOWN_COLUMNS).astype({"aum": "float64", "clients": "int64"})
+        df[SHARE_COLUMN] = shares(df["aum"])
+        return df
+
+    def rebuild(self, store):
+        """Recompute every rollup from the portfolios in ``store``; returns the number of clients"""
+        signatures = store.signatures(KEY)
+        mobiles = sorted(signatures)
+        clients = client_store.get_store().all()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM contributions")
+            conn.execute("DELETE FROM sources")
+            for mobile in mobiles:
+                rows = contribution(positions(store.load_frame(mobile, KEY)), clients.get(mobile))
+                conn.executemany("INSERT INTO contributions VALUES (?, ?, ?, ?)",
+                                 [(mobile, *row) for row in rows])
+            conn.executemany("INSERT INTO sources VALUES (?, ?)", signatures.items())
+            conn.execute("DELETE FROM rollups")
+            conn.execute("INSERT INTO rollups SELECT dimension, bucket, SUM(aum), COUNT(*) "
+                         "FROM contributions GROUP BY dimension, bucket")
+            conn.execute("INSERT OR REPLACE INTO meta VALUES ('built', datetime('now'))")
+            conn.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (ROLLUP_VERSION,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return len(mobiles)
+
+    def built(self):
+        """Whether the rollups were built by this version of the bucketing"""
+        row = self._connect().execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        return row is not None and row[0] == ROLLUP_VERSION
+
+
+_rollups = None
+_reconciled = 0.0
+_rollups_lock = threading.Lock()
+
+
+def get_rollups():
+    """Process-wide AUM rollups, built on first use.
+
+    Saves through this process's ``get_store()`` reach the rollups at once
+    through an ``on_save`` hook; any other save is found by ``reconcile``,
+    which runs here at most once per ``RECONCILE_EVERY`` seconds.
+    """
+    global _rollups, _reconciled
+    with _rollups_lock:
+        store = userdata_store.get_store()
+        if _rollups is None:
+            rollups = AumRollups()
+            if not rollups.built():
+                rollups.rebuild(store)
+            store.on_save(KEY, lambda mobile, df: rollups.update_client(mobile, df, store.signature(mobile, KEY)))
+            _rollups = rollups
+        if time.monotonic() - _reconciled >= RECONCILE_EVERY:
+            _rollups.reconcile(store)
+            _reconciled = time.monotonic()
+    return _rollups
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in ("rebuild", "show"):
+        sys.exit(__doc__)
+    rollups = AumRollups()
+    if sys.argv[1] == "rebuild":
+        clients = rollups.rebuild(userdata_store.get_store())
+        print(f"Rolled up {clients} portfolios into {rollups.path}")
+    else:
+        rollups.reconcile(userdata_store.get_store())
+        aum, clients = rollups.total()
+        print(f"AUM {aum:,.0f} across {clients} clients")
+        for dimension in sys.argv[2:] or DIMENSIONS:
+            print(f"\n{dimension}\n{rollups.breakdown(dimension).to_string(index=False)}")
@@ -1,46 +1,71 @@
 import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
-from datetime import datetime, timedelta
-import json
 import os
 import random
 
-# Constants and directories
-CLIENTS_FILE = "clients.json"
-DATADIR = "userdata"
-os.makedirs(DATADIR, exist_ok=True)
+# Only light modules load at startup; pages import pandas and the
+# analytics modules themselves, so login and registration stay fast.
+import metrics
+from client_store import AGE_BRACKETS, INCOME_BRACKETS, get_store, is_admin
+from otp_store import get_store as get_otp_store
+from session_budget import get_budget
+from userdata_store import WriteBatch, is_frame
+from userdata_store import get_store as get_userdata_store
 
-# Helper: Load all clients
+# Helper: Load all clients (full scan; prefer get_store().get(phone) for lookups)
 def load_clients():
-    if not os.path.exists(CLIENTS_FILE):
-        return {}
-    with open(CLIENTS_FILE) as f:
-        return json.load(f)
+    return get_store().all()
 
 # Helper: Save all clients
 def save_clients(clients):
-    with open(CLIENTS_FILE, "w") as f:
-        json.dump(clients, f, indent=2)
+    get_store().replace_all(clients)
 
 # Helper: Save user data (portfolio, goals, insurance)
+# Writes are staged per session and flushed once at the end of the run;
+# unchanged data is never rewritten.
 def save_userdata(mobile, key, data):
-    filepath = os.path.join(DATADIR, f"{mobile}_{key}.json")
-    with open(filepath, "w") as f:
-        json.dump(data, f)
+    if "userdata_batch" not in st.session_state:
+        st.session_state.userdata_batch = WriteBatch(get_userdata_store())
+    if is_frame(data):
+        st.session_state.userdata_batch.stage_frame(mobile, key, data)
+    else:
+        st.session_state.userdata_batch.stage(mobile, key, data)
+
+def flush_userdata():
+    batch = st.session_state.get("userdata_batch")
+    if batch:
+        batch.flush()
+
+# Helper: Large per-session frames live in the session budget, which spills
+# idle sessions to disk; a frame forgotten after a long absence is reloaded
+# from the user's saved data.
+SESSION_FRAMES = {"portfoliodata": "portfolio", "insurancedata": "insurance"}
+
+def sessionid():
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx else "local"
+
+def getsessionframe(name):
+    df = get_budget().get(sessionid(), name)
+    mobile = st.session_state.get("usermobile")
+    if df is None and mobile:
+        df = get_userdata_store().load_frame(mobile, SESSION_FRAMES[name])
+        if df is None or df.empty:
+            return None
+        setsessionframe(name, df)
+    return df
+
+def setsessionframe(name, df):
+    get_budget().put(sessionid(), name, df)
 
 def load_userdata(mobile, key):
-    filepath = os.path.join(DATADIR, f"{mobile}_{key}.json")
-    if os.path.exists(filepath):
-        with open(filepath) as f:
-            return json.load(f)
-    return None
+    return get_userdata_store().load(mobile, key)
 
 def clear_userdata(mobile):
-    for key in ["portfolio", "financialgoals", "insurance"]:
-        filepath = os.path.join(DATADIR, f"{mobile}_{key}.json")
-        if os.path.exists(filepath):
-            os.remove(filepath)
+    batch = st.session_state.get("userdata_batch")
+    if batch:
+        batch.pending.clear()
+    get_userdata_store().clear(mobile)
 
 # -------- Registration and Authentication Logic -----------
 
@@ -51,8 +76,8 @@ def register_page():
         address = st.text_area("Address")
         phone = st.text_input("Phone Number")
         email = st.text_input("Email ID")
-        income_bracket = st.selectbox("Income Bracket", ["<5 Lakh", "5-10 Lakh", "10-25 Lakh", "25+ Lakh"])
-        age_bracket = st.selectbox("Age Bracket", ["<25", "25-35", "35-50", "50+"])
+        income_bracket = st.selectbox("Income Bracket", INCOME_BRACKETS)
+        age_bracket = st.selectbox("Age Bracket", AGE_BRACKETS)
         submit = st.form_submit_button("Submit")
     if submit:
         if name and address and phone and email:
@@ -74,28 +99,23 @@ def register_page():
             password = st.text_input("Choose Password", type="password")
             create_btn = st.form_submit_button("Create Account")
         if create_btn:
-            clients = load_clients()
-            # Use phone number as the unique key
+            # Use phone number as the unique key; the insert fails atomically
+            # if the phone or user ID is already taken
             phone = st.session_state.new_reg["phone"]
-            if phone in clients:
-                st.error("Mobile number already registered.")
-            elif any(u.get("user_id") == user_id for u in clients.values()):
-                st.error("User ID already in use.")
-            else:
-                clients[phone] = {
-                    **st.session_state.new_reg,
-                    "user_id": user_id,
-                    "password": password,
-                    "registered": True
-                }
-                save_clients(clients)
+            ok, message = get_store().add(phone, {
+                **st.session_state.new_reg,
+                "user_id": user_id,
+                "password": password,
+                "registered": True
+            })
+            if ok:
                 st.success("Registration complete! Now use your registered phone number to log in via OTP.")
                 del st.session_state["new_reg"]
+            else:
+                st.error(message)
 
 # ----------- OTP Login and Existing User Flow -----------
 
-if "otpdata" not in st.session_state:
-    st.session_state.otpdata = {}
 if "loggedin" not in st.session_state:
     st.session_state.loggedin = False
 
@@ -104,26 +124,22 @@ def generate_otp():
 
 def send_dummy_otp(mobile):
     otp = generate_otp()
-    st.session_state.otpdata[mobile] = {"otp": otp, "expires": datetime.now() + timedelta(minutes=5)}
+    ok, message = get_otp_store().issue(mobile, otp)
+    if not ok:
+        st.sidebar.error(message)
+        return None
     st.sidebar.success(f"Dummy OTP for mobile is {otp}")
     return otp
 
 def verify_otp(mobile, entered_otp):
-    otpinfo = st.session_state.otpdata.get(mobile, None)
-    if not otpinfo:
-        return False, "No OTP sent for this number."
-    if datetime.now() > otpinfo["expires"]:
-        return False, "OTP has expired."
-    if otpinfo["otp"] != entered_otp:
-        return False, "Incorrect OTP."
-    return True, "OTP Verified successfully!"
+    return get_otp_store().verify(mobile, entered_otp)
 
 def loginsidebar():
     st.sidebar.title("Login - OTP Authentication")
-    clients = load_clients()
     mobile = st.sidebar.text_input("Enter your registered Mobile Number")
     if st.sidebar.button("Send OTP"):
-        if mobile in clients and clients[mobile].get("registered"):
+        client = get_store().get(mobile) if mobile else None
+        if client and client.get("registered"):
             send_dummy_otp(mobile)
         else:
             st.sidebar.error("Mobile number not registered.")
@@ -155,19 +171,17 @@ def logoutsidebar():
         user = st.session_state.get("usermobile")
         if user:
             clear_userdata(user)
+        get_budget().drop(sessionid())
         st.session_state.clear()
         st.rerun()
 
 def load_userspecific_data(mobile):
-    portfolio = load_userdata(mobile, "portfolio")
-    if portfolio:
-        st.session_state.portfoliodata = portfolio
+    get_budget().drop(sessionid())
+    for name in SESSION_FRAMES:
+        getsessionframe(name)
     financialgoals = load_userdata(mobile, "financialgoals")
     if financialgoals:
         st.session_state.financialgoals = financialgoals
-    insurance = load_userdata(mobile, "insurance")
-    if insurance:
-        st.session_state.insurancedata = insurance
 
 # --------- App Pages: Portfolio, Insurance, Goals ---------
 
@@ -199,64 +213,124 @@ def homepagecontent():
     )
     st.markdown("---")
 
+def uploadcsv(label, kind):
+    """Typed frame from a newly uploaded CSV, else None; each file is parsed once"""
+    from csv_ingest import ingest_csv
+
+    uploadedfile = st.file_uploader(label, type="csv", key=f"{kind}_uploader")
+    if uploadedfile is None:
+        return None
+    df = None
+    reportkey = f"{kind}_upload"
+    if st.session_state.get(reportkey, (None,))[0] != uploadedfile.file_id:
+        df, errors, message = ingest_csv(uploadedfile, kind)
+        st.session_state[reportkey] = (uploadedfile.file_id, df is None, errors, message)
+    _, rejected, errors, message = st.session_state[reportkey]
+    if rejected:
+        st.error(message)
+    elif message:
+        st.warning(message)
+        with st.expander(f"Rows skipped ({len(errors)} shown)"):
+            st.dataframe(errors)
+    return df
+
 def portfoliotracker():
+    from chart_cache import pie_chart
+    from portfolio_summary import AMOUNT_FORMAT, allocation, styled, to_amounts
+
     st.markdown('<div class="header-box">Portfolio Tracker</div>', unsafe_allow_html=True)
     st.write("Upload your investment details CSV file below.")
-    uploadedfile = st.file_uploader("Upload Portfolio CSV", type="csv", key="portfolio_uploader")
-    if uploadedfile is not None:
-        df = pd.read_csv(uploadedfile)
-        st.session_state.portfoliodata = df.to_dict()
-    if "portfoliodata" in st.session_state:
-        df = pd.DataFrame(st.session_state.portfoliodata)
-        df = df.rename(columns={"Scheme Name": "Investment Category", "Investment Amount": "Amount"})
-        df['Amount'] = df['Amount'].apply(lambda x: f"{x:,.0f}")
+    portfolio = uploadcsv("Upload Portfolio CSV", "portfolio")
+    if portfolio is not None:
+        setsessionframe("portfoliodata", portfolio)
+    else:
+        portfolio = getsessionframe("portfoliodata")
+    if portfolio is not None:
+        df = portfolio.rename(columns={"Scheme Name": "Investment Category", "Investment Amount": "Amount"})
+        df["Amount"] = to_amounts(df["Amount"])
         st.markdown('<div class="content-box"><h4>Investment Details</h4></div>', unsafe_allow_html=True)
-        st.dataframe(df)
-        summary = df.groupby("Investment Category")["Amount"].apply(lambda x: sum(int(i.replace(",", "")) for i in x))
+        st.dataframe(styled(df, {"Amount": AMOUNT_FORMAT}))
+        summary = allocation(df, "Investment Category", "Amount")
         if not summary.empty:
             st.markdown('<div class="content-box"><h4>Portfolio Distribution</h4></div>', unsafe_allow_html=True)
-            fig, ax = plt.subplots()
-            ax.pie(summary, labels=summary.index, autopct='%1.1f%%', startangle=90, colors=[
-                "#FF6F00", "#757575", "#FFD180", "#B0BEC5", "#FFB74D", "#E0E0E0", "#F57C00"
-            ])
-            ax.axis('equal')
-            st.pyplot(fig)
-            totalamount = summary.sum()
+            st.image(pie_chart(summary.index, summary["Amount"]))
+            totalamount = summary["Amount"].sum()
             st.markdown(f'<div class="content-box"><b>Total Portfolio Amount</b>: {totalamount:,.0f}</div>', unsafe_allow_html=True)
         mobile = st.session_state.get("usermobile")
-        if mobile and "portfoliodata" in st.session_state:
-            save_userdata(mobile, "portfolio", st.session_state.portfoliodata)
+        if mobile:
+            save_userdata(mobile, "portfolio", portfolio)
 
 def insurancepolicies():
+    from portfolio_summary import AMOUNT_FORMAT, DATE_FORMAT, styled
+    from renewal_index import DUE_DAYS, due_in_frame
+    from renewal_index import get_index as get_renewal_index
+
     st.markdown('<div class="header-box">Insurance Policies</div>', unsafe_allow_html=True)
     st.write("Upload your insurance policies CSV below.")
-    uploadedfile = st.file_uploader("Upload Insurance Policies CSV", type="csv", key="insurance_uploader")
-    if uploadedfile is not None:
-        df = pd.read_csv(uploadedfile)
-        st.session_state.insurancedata = df.to_dict()
-    if "insurancedata" in st.session_state:
-        df = pd.DataFrame(st.session_state.insurancedata)
-        df["Premium Amount"] = df["Premium Amount"].apply(lambda x: f"{x:,.0f}")
-        df["Due Date"] = pd.to_datetime(df["Due Date"], errors="coerce")
-        df["Due Date"] = df["Due Date"].dt.strftime('%d-%b-%Y')
+    df = uploadcsv("Upload Insurance Policies CSV", "insurance")
+    if df is not None:
+        setsessionframe("insurancedata", df)
+    else:
+        df = getsessionframe("insurancedata")
+    if df is not None:
         st.markdown('<div class="content-box"><h4>All Policies</h4></div>', unsafe_allow_html=True)
-        st.dataframe(df)
-        now = datetime.now()
-        dfdue = pd.to_datetime(df["Due Date"], format='%d-%b-%Y', errors="coerce")
-        mask = (dfdue - now).dt.days < 30
-        mask &= (dfdue - now).dt.days >= 0
-        upcoming = df[mask]
+        st.dataframe(styled(df, {"Premium Amount": AMOUNT_FORMAT, "Due Date": DATE_FORMAT}))
+        mobile = st.session_state.get("usermobile")
+        if mobile:
+            # Save now so the renewal index answers for this upload too
+            save_userdata(mobile, "insurance", df)
+            flush_userdata()
+            upcoming = get_renewal_index().due_within(DUE_DAYS, mobile=mobile)
+        else:
+            upcoming = due_in_frame(df, DUE_DAYS)
         if not upcoming.empty:
             st.markdown('<div class="content-box"><h4>Policy Due Soon</h4></div>', unsafe_allow_html=True)
-            for idx, row in upcoming.iterrows():
-                st.warning(f"{row['Policy Type']} policy {row['Policy Number']} premium of {row['Premium Amount']} is due on {row['Due Date']}.")
+            for row in upcoming.itertuples(index=False):
+                st.warning(f"{row.policy_type} policy {row.policy_number} premium of {row.premium:,.0f} is due on {row.due_date:%d-%b-%Y}.")
         else:
-            st.markdown('<div class="content-box">No policies due in the next 30 days.</div>', unsafe_allow_html=True)
-        mobile = st.session_state.get("usermobile")
-        if mobile and "insurancedata" in st.session_state:
-            save_userdata(mobile, "insurance", st.session_state.insurancedata)
+            st.markdown(f'<div class="content-box">No policies due in the next {DUE_DAYS} days.</div>', unsafe_allow_html=True)
+
+def renewalsdashboard():
+    from portfolio_summary import AMOUNT_FORMAT, DATE_FORMAT, styled, totals
+    from renewal_index import DUE_DAYS
+    from renewal_index import get_index as get_renewal_index
+
+    st.markdown('<div class="header-box">Renewals Across Clients</div>', unsafe_allow_html=True)
+    days = st.slider("Due within (days)", min_value=1, max_value=365, value=DUE_DAYS)
+    due = get_renewal_index().due_within(days)
+    if due.empty:
+        st.markdown(f'<div class="content-box">No policies due in the next {days} days.</div>', unsafe_allow_html=True)
+        return
+    names = {mobile: (get_store().get(mobile) or {}).get("name", "") for mobile in due["mobile"].unique()}
+    due.insert(1, "name", due["mobile"].map(names))
+    premium = totals(due, ["premium"])["premium"]
+    st.markdown(f'<div class="content-box"><b>{len(due)} policies</b> from {due["mobile"].nunique()} clients, premium {premium:,.0f}</div>', unsafe_allow_html=True)
+    st.dataframe(styled(due, {"premium": AMOUNT_FORMAT, "due_date": DATE_FORMAT}))
+
+def aumdashboard():
+    from aum_rollups import get_rollups
+    from chart_cache import pie_chart
+    from portfolio_summary import AMOUNT_FORMAT, SHARE_COLUMN, styled
+
+    st.markdown('<div class="header-box">Assets Under Management</div>', unsafe_allow_html=True)
+    rollups = get_rollups()
+    aum, clients = rollups.total()
+    st.markdown(f'<div class="content-box"><b>Total AUM</b>: {aum:,.0f} across {clients} clients</div>', unsafe_allow_html=True)
+    formats = {"aum": AMOUNT_FORMAT, SHARE_COLUMN: "{:.1f}"}
+    for title, dimension in (("Category Allocation", "category"), ("CAMS Holdings by Scheme", "scheme"), ("By Income Bracket", "income_bracket"), ("By Age Bracket", "age_bracket")):
+        df = rollups.breakdown(dimension)
+        if df.empty:
+            continue
+        st.markdown(f'<div class="content-box"><h4>{title}</h4></div>', unsafe_allow_html=True)
+        st.dataframe(styled(df, formats))
+        if dimension not in ("category", "scheme"):
+            st.image(pie_chart(df["bucket"], df["aum"]))
 
 def financialgoals():
+    from chart_cache import progress_chart
+    from goals import CONFIDENCE, PATHS, ROI, VOLATILITY, goal_plan, simulate_goals
+    from portfolio_summary import AMOUNT_FORMAT, styled
+
     st.markdown('<div class="header-box">Financial Goals Planner</div>', unsafe_allow_html=True)
     st.write("Define and track your financial goals below.")
     if "financialgoals" not in st.session_state:
@@ -276,38 +350,56 @@ def financialgoals():
         })
         st.success(f"Added goal: {goaltype}")
     if st.session_state.financialgoals:
-        df = pd.DataFrame(st.session_state.financialgoals)
-        df["Remaining Amount"] = df["Goal Amount"] - df["Current Amount"]
-        df["Progress"] = (df["Current Amount"] / df["Goal Amount"] * 100).clip(0, 100).round(1)
+        plan = goal_plan(st.session_state.financialgoals, ROI)
+        df = plan.drop(columns="Invest per Year")
         st.markdown('<div class="content-box"><h4>Your Goals</h4></div>', unsafe_allow_html=True)
         st.dataframe(df)
         st.markdown('<div class="content-box"><h4>Goal Progress</h4></div>', unsafe_allow_html=True)
-        fig, ax = plt.subplots()
-        ax.bar(df["Goal Type"], df["Progress"], color="#FF6F00", edgecolor="#757575")
-        ax.set_ylabel("Progress towards goal")
-        ax.set_ylim(0, 100)
-        ax.set_title("Progress on Financial Goals", color="#757575")
-        for idx, v in enumerate(df["Progress"]):
-            ax.text(idx, v + 2, f"{v}%", ha="center", color="#FF6F00")
-        st.pyplot(fig)
+        st.image(progress_chart(df["Goal Type"], df["Progress"]))
         # Investment suggestion
         st.markdown('<div class="content-box"><h4>Investment Suggestion</h4></div>', unsafe_allow_html=True)
-        st.write("Assuming an annual average return of 10% in mutual funds, here is an estimate of yearly investment needed for each goal:")
-        roi = 0.10
-        suggestion = []
-        for i, row in df.iterrows():
-            fv = row["Goal Amount"] - row["Current Amount"]
-            n = row["Years"]
-            if fv > 0 and n > 0:
-                p = fv * roi / ((1 + roi) ** n - 1)
-                suggestion.append({"Goal": row["Goal Type"], "Invest per Year": f"{p:,.0f}"})
-        st.table(pd.DataFrame(suggestion))
+        st.write(f"Assuming an annual average return of {ROI:.0%} in mutual funds, here is an estimate of yearly investment needed for each goal:")
+        suggestion = plan.loc[plan["Invest per Year"].notna(), ["Goal Type", "Invest per Year"]].rename(columns={"Goal Type": "Goal"})
+        st.table(styled(suggestion.reset_index(drop=True), {"Invest per Year": AMOUNT_FORMAT}))
+        # Monte Carlo projection: how likely the plan is, and what a given confidence needs
+        st.markdown('<div class="content-box"><h4>Goal Projection</h4></div>', unsafe_allow_html=True)
+        confidence = st.select_slider("Target confidence", options=[75, 80, 90, 95], value=int(CONFIDENCE * 100), format_func=lambda c: f"{c}%")
+        st.write(f"Simulating {PATHS:,} market scenarios ({ROI:.0%} average return, {VOLATILITY:.0%} volatility). Success chance assumes the yearly investment above; the last columns show what reaches each goal in {confidence}% of scenarios.")
+        projection = simulate_goals(st.session_state.financialgoals, confidence=confidence / 100)
+        st.dataframe(styled(projection, {
+            "Success Chance (%)": "{:.1f}",
+            "P10 Outcome": AMOUNT_FORMAT,
+            "Median Outcome": AMOUNT_FORMAT,
+            "P90 Outcome": AMOUNT_FORMAT,
+            "Required per Year": AMOUNT_FORMAT,
+            "Monthly SIP": AMOUNT_FORMAT,
+        }))
     else:
         st.markdown('<div class="content-box">No financial goals yet. Use the form above to add goals.</div>', unsafe_allow_html=True)
     mobile = st.session_state.get("usermobile")
     if mobile and "financialgoals" in st.session_state:
         save_userdata(mobile, "financialgoals", st.session_state.financialgoals)
 
+def metricspanel():
+    with st.sidebar.expander("Performance"):
+        budget = get_budget()
+        sessions = budget.usage()
+        st.metric("Session frames in memory", f"{budget.resident() / 2**20:,.1f} of {budget.ceiling / 2**20:,.0f} MB")
+        st.caption(f"{len(sessions)} sessions, {sum(s['spilled_bytes'] for s in sessions) / 2**20:,.1f} MB spilled to disk")
+        if not metrics.ENABLED:
+            st.caption("Set CAPITAL_CARTEL_METRICS=1 to collect timings.")
+            return
+        for label, name in (("NAV cache hit rate", "nav_cache_total"), ("Chart cache hit rate", "chart_cache_total")):
+            rate = metrics.ratio(name)
+            st.metric(label, "-" if rate is None else f"{rate:.0%}")
+        st.dataframe([
+            {"metric": row["name"], "labels": row["labels"], "count": row["count"],
+             "mean ms": row["mean"] * 1000, "p50 ms": row["p50"] * 1000, "p95 ms": row["p95"] * 1000}
+            for row in metrics.histogram_summary()
+        ])
+        st.download_button("Download Prometheus metrics", metrics.prometheus_text(),
+                           file_name="capital_cartel.prom", mime="text/plain")
+
 # -------------------- Main App Controller ------------------------
 
 def main():
@@ -331,28 +423,41 @@ def main():
     st.sidebar.title("Menu")
     menu = st.sidebar.radio("Choose Action", ["Login", "Register"], key="action_radio")
     if menu == "Register":
-        register_page()
+        with metrics.timer("page_rerun_seconds", page="Register"):
+            register_page()
         return
 
+    get_budget().touch(sessionid())
     loggedin = loginsidebar()
     if loggedin:
         logoutsidebar()
-        option = st.sidebar.selectbox(
-            "Choose an option",
-            ["Welcome Page", "Portfolio Tracker", "Insurance Policies", "Financial Goals"]
-        )
-        if option == "Welcome Page":
-            homepagecontent()
-        elif option == "Portfolio Tracker":
-            portfoliotracker()
-        elif option == "Insurance Policies":
-            insurancepolicies()
-        elif option == "Financial Goals":
-            financialgoals()
-        else:
-            homepagecontent()
+        options = ["Welcome Page", "Portfolio Tracker", "Insurance Policies", "Financial Goals"]
+        if is_admin(st.session_state.get("usermobile")):
+            options += ["Renewals (All Clients)", "AUM (All Clients)"]
+        option = st.sidebar.selectbox("Choose an option", options)
+        with metrics.timer("page_rerun_seconds", page=option):
+            if option == "Welcome Page":
+                homepagecontent()
+            elif option == "Portfolio Tracker":
+                portfoliotracker()
+            elif option == "Insurance Policies":
+                insurancepolicies()
+            elif option == "Financial Goals":
+                financialgoals()
+            elif option == "Renewals (All Clients)":
+                renewalsdashboard()
+            elif option == "AUM (All Clients)":
+                aumdashboard()
+            else:
+                homepagecontent()
+        if is_admin(st.session_state.get("usermobile")):
+            metricspanel()
     else:
         st.write("Login using the sidebar to access your personalized dashboard.")
 
 if __name__ == "__main__":
-    main()
+    metrics.start_writer("backup")
+    try:
+        main()
+    finally:
+        flush_userdata()
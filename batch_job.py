@@ -0,0 +1,149 @@
+"""Nightly valuation, renewal and goal report for every client.
+
+Runs without Streamlit or matplotlib. Client files are spread across a
+process pool; each finished client is appended to a JSONL checkpoint, so an
+interrupted run picks up where it stopped when started again with the same
+checkpoint. The checkpoint is keyed on the report date and renewal window, so
+a run with different parameters starts over, and it is removed once the
+consolidated CSV report has been written.
+
+    python batch_job.py --out report.csv [--workers 8] [--days 30] [--fresh]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+import pandas as pd
+
+from goals import ROI, goal_plan
+from portfolio_summary import portfolio_value
+from renewal_index import DUE_DAYS, due_in_frame
+from userdata_store import DATADIR, UserDataStore
+
+REPORT_COLUMNS = [
+    "mobile", "portfolio_value", "holdings", "policies", "policies_due", "premium_due",
+    "next_due", "goals", "goal_shortfall", "invest_per_year", "error",
+]
+
+_store = None
+
+
+def _worker_store(datadir):
+    global _store
+    if _store is None or _store.datadir != datadir:
+        _store = UserDataStore(datadir)
+    return _store
+
+
+def client_report(mobile, datadir=DATADIR, days=DUE_DAYS, as_of=None, roi=ROI):
+    """One report row for a client; failures are reported in ``error`` rather than raised"""
+    row = dict.fromkeys(REPORT_COLUMNS)
+    row["mobile"] = mobile
+    try:
+        store = _worker_store(datadir)
+        portfolio = store.load_frame(mobile, "portfolio")
+        if portfolio is not None:
+            row["portfolio_value"] = portfolio_value(portfolio)
+            row["holdings"] = len(portfolio)
+        insurance = store.load_frame(mobile, "insurance")
+        if insurance is not None:
+            due = due_in_frame(insurance, days, as_of)
+            row["policies"] = len(insurance)
+            row["policies_due"] = len(due)
+            row["premium_due"] = float(due["premium"].sum())
+            row["next_due"] = due["due_date"].min().date().isoformat() if len(due) else None
+        goals = store.load(mobile, "financialgoals")
+        if goals:
+            plan = goal_plan(goals, roi)
+            row["goals"] = len(plan)
+            row["goal_shortfall"] = float(plan["Remaining Amount"].clip(lower=0).sum())
+            row["invest_per_year"] = float(plan["Invest per Year"].sum())
+    except Exception as exc:  # one bad file must not stop a 50k-client run
+        row["error"] = f"{type(exc).__name__}: {exc}"
+    return row
+
+
+def _report_chunk(args):
+    mobiles, datadir, days, as_of = args
+    return [client_report(mobile, datadir, days, as_of) for mobile in mobiles]
+
+
+def checkpoint_run(path):
+    """The run parameters a checkpoint was written for, from its first line; None if unknown"""
+    try:
+        with open(path) as f:
+            return json.loads(f.readline()).get("run")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def read_checkpoint(path):
+    """Latest row per mobile in a checkpoint, split into (done, failed); failed clients are retried"""
+    latest = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    continue  # partial last line from an interrupted run
+                if "mobile" in row:
+                    latest[row["mobile"]] = row
+    done = {mobile: row for mobile, row in latest.items() if not row.get("error")}
+    failed = {mobile: row for mobile, row in latest.items() if row.get("error")}
+    return done, failed
+
+
+def run(datadir=DATADIR, out="report.csv", checkpoint=None, workers=None, days=DUE_DAYS,
+        as_of=None, chunk_size=200, fresh=False, log=print):
+    """Report on every client under ``datadir``; returns the report frame"""
+    checkpoint = checkpoint or out + ".checkpoint.jsonl"
+    as_of = as_of or date.today()
+    params = {"as_of": as_of.isoformat(), "days": days}
+    if os.path.exists(checkpoint) and (fresh or checkpoint_run(checkpoint) != params):
+        os.remove(checkpoint)
+    done, _ = read_checkpoint(checkpoint)
+    mobiles = [m for m in UserDataStore(datadir).mobiles() if m not in done]
+    log(f"{len(done)} clients already done, {len(mobiles)} to go")
+    chunks = [(mobiles[i:i + chunk_size], datadir, days, as_of) for i in range(0, len(mobiles), chunk_size)]
+    started = time.perf_counter()
+    finished = len(done)
+    with open(checkpoint, "a") as ckpt, ProcessPoolExecutor(max_workers=workers) as pool:
+        if ckpt.tell() == 0:
+            ckpt.write(json.dumps({"run": params}) + "\n")
+        for rows in pool.map(_report_chunk, chunks):
+            ckpt.writelines(json.dumps(row) + "\n" for row in rows)
+            ckpt.flush()
+            os.fsync(ckpt.fileno())
+            finished += len(rows)
+            log(f"{finished} clients processed ({time.perf_counter() - started:.1f}s)")
+    done, failed = read_checkpoint(checkpoint)
+    report = pd.DataFrame([*done.values(), *failed.values()], columns=REPORT_COLUMNS).sort_values("mobile")
+    report.to_csv(out, index=False)
+    os.remove(checkpoint)
+    log(f"Wrote {len(report)} clients to {out} ({len(failed)} with errors)")
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--datadir", default=DATADIR)
+    parser.add_argument("--out", default="report.csv")
+    parser.add_argument("--checkpoint", help="JSONL checkpoint (default: <out>.checkpoint.jsonl)")
+    parser.add_argument("--workers", type=int, help="worker processes (default: CPU count)")
+    parser.add_argument("--days", type=int, default=DUE_DAYS, help="renewal window in days")
+    parser.add_argument("--as-of", type=date.fromisoformat, help="report date (default: today)")
+    parser.add_argument("--chunk-size", type=int, default=200, help="clients per task")
+    parser.add_argument("--fresh", action="store_true", help="ignore an existing checkpoint")
+    args = parser.parse_args(argv)
+    report = run(args.datadir, args.out, args.checkpoint, args.workers, args.days,
+                 args.as_of, args.chunk_size, args.fresh)
+    return 1 if report["error"].notna().any() else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
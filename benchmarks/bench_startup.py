@@ -0,0 +1,78 @@
+"""Cold-start import cost of the Streamlit entry points.
+
+Each entry script is imported in a fresh interpreter under ``-X importtime``
+(without running its ``main()``), which is what a new Streamlit worker pays
+before drawing the login screen. Reports the total import time, the slowest
+top-level imports and whether any heavy module was loaded at startup.
+
+    python benchmarks/bench_startup.py --repeat 3 --top 8
+    python benchmarks/bench_startup.py --check   # exit 1 if a heavy module loads at startup
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENTRY_POINTS = ["app.py", "backup.py", os.path.join("Parse_code", "mf_app.py")]
+HEAVY = ["pandas", "numpy", "matplotlib", "mftool", "pyarrow"]
+
+_IMPORT_ENTRY = """
+import importlib.util, json, sys
+spec = importlib.util.spec_from_file_location("entry", {path!r})
+spec.loader.exec_module(importlib.util.module_from_spec(spec))
+print(json.dumps(sorted(m for m in {heavy!r} if m in sys.modules)))
+"""
+
+
+def parse_importtime(stderr):
+    """(module, cumulative seconds) for every top-level import in -X importtime output"""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not name.startswith("  "):  # deeper imports are indented under their parent
+            imports.append((name.strip(), int(cumulative) / 1e6))
+    return imports
+
+
+def measure(path):
+    """Wall time, top-level import times and heavy modules loaded for one import of ``path``"""
+    code = _IMPORT_ENTRY.format(path=os.path.join(ROOT, path), heavy=HEAVY)
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                            cwd=ROOT, capture_output=True, text=True, check=True)
+    wall = time.perf_counter() - started
+    heavy = json.loads(result.stdout.strip().splitlines()[-1])
+    return wall, parse_importtime(result.stderr), heavy
+
+
+def run(entries=ENTRY_POINTS, repeat=3, top=5):
+    """Print a report; returns {entry: heavy modules loaded at startup}"""
+    loaded = {}
+    for entry in entries:
+        runs = [measure(entry) for _ in range(repeat)]
+        wall, imports, heavy = min(runs, key=lambda r: r[0])
+        total = sum(seconds for _, seconds in imports)
+        print(f"{entry:28} {wall * 1000:8.1f} ms wall  {total * 1000:8.1f} ms imports  "
+              f"heavy: {', '.join(heavy) or 'none'}")
+        for name, seconds in sorted(imports, key=lambda i: -i[1])[:top]:
+            print(f"    {seconds * 1000:8.1f} ms  {name}")
+        loaded[entry] = heavy
+    return loaded
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("entries", nargs="*", default=ENTRY_POINTS)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=5, help="slowest top-level imports to list")
+    parser.add_argument("--check", action="store_true", help="fail if a heavy module loads at startup")
+    args = parser.parse_args()
+    loaded = run(args.entries, args.repeat, args.top)
+    if args.check and any(loaded.values()):
+        sys.exit("Heavy modules imported at startup: " + "; ".join(
+            f"{entry}: {', '.join(mods)}" for entry, mods in loaded.items() if mods))
@@ -0,0 +1,128 @@
+"""Synthetic, seeded inputs for the benchmarks.
+
+Every generator is deterministic for a given size and seed, so timings from
+different runs (and different commits) are comparable. Categorical fields
+use the values the app offers, so benchmarks take the same branches as real
+data.
+"""
+import io
+import json
+import random
+from datetime import date, timedelta
+
+from client_store import AGE_BRACKETS, INCOME_BRACKETS
+
+DESCS = ["Purchase", "SIP Purchase", "Redemption", "Switch Out", "Switch In", "Dividend Reinvestment"]
+POLICY_TYPES = ["Life", "Health", "Vehicle", "Term", "Home"]
+GOAL_TYPES = ["Retirement", "Education", "Car", "House"]  # the goals page's examples
+
+
+def synthetic_statement(transactions, schemes=80, seed=7):
+    """CAMS-style JSON bytes with transactions in random date order"""
+    rng = random.Random(seed)
+    start = date(2010, 1, 1)
+    records = []
+    for _ in range(transactions):
+        records.append({
+            "Scheme Name": f"Synthetic Fund {rng.randrange(schemes)} - Direct Growth",
+            "Date": (start + timedelta(days=rng.randrange(5000))).strftime("%d-%b-%Y"),
+            "Desc": rng.choice(DESCS),
+            "Units": f"{rng.uniform(0.5, 250):.3f}",
+            "Price": f"{rng.uniform(10, 900):.4f}",
+        })
+    return json.dumps({"TRXN_DETAILS": records}).encode()
+
+
+def synthetic_clients(count, seed=7):
+    """A clients.json-shaped dict of ``count`` registered clients"""
+    rng = random.Random(seed)
+    clients = {}
+    for i in range(count):
+        phone = str(9000000000 + i)
+        clients[phone] = {
+            "user_id": f"user{i}",
+            "name": f"Client {i}",
+            "address": f"{rng.randrange(1, 999)}, Sector {rng.randrange(1, 80)}, Gurgaon",
+            "email": f"client{i}@example.com",
+            "income_bracket": rng.choice(INCOME_BRACKETS),
+            "age_bracket": rng.choice(AGE_BRACKETS),
+            "password": f"{rng.getrandbits(64):016x}",
+            "registered": True,
+        }
+    return clients
+
+
+def _csv(rows, columns):
+    out = io.StringIO()
+    out.write(",".join(columns) + "\n")
+    out.writelines(",".join(str(v) for v in row) + "\n" for row in rows)
+    return out.getvalue().encode()
+
+
+def portfolio_csv(rows, categories=12, seed=7):
+    """Portfolio tracker CSV bytes (Scheme Name, Investment Amount)"""
+    rng = random.Random(seed)
+    return _csv(((f"Category {rng.randrange(categories)}", rng.randrange(1000, 500000))
+                 for _ in range(rows)), ["Scheme Name", "Investment Amount"])
+
+
+def insurance_csv(rows, seed=7, today=None):
+    """Insurance CSV bytes with due dates spread over the two years around ``today``"""
+    rng = random.Random(seed)
+    today = today or date.today()
+    return _csv(((rng.choice(POLICY_TYPES), f"POL{i:08d}", rng.randrange(2000, 200000),
+                  (today + timedelta(days=rng.randrange(-365, 365))).isoformat())
+                 for i in range(rows)), ["Policy Type", "Policy Number", "Premium Amount", "Due Date"])
+
+
+def synthetic_goals(count, seed=7):
+    """Financial goals as stored by the goals page"""
+    rng = random.Random(seed)
+    return [{
+        "Goal Type": rng.choice(GOAL_TYPES),
+        "Goal Amount": rng.randrange(100000, 50000000, 1000),
+        "Current Amount": rng.randrange(0, 100000, 1000),
+        "Years": rng.randrange(1, 35),
+    } for i in range(count)]
+
+
+def folio_db(schemes, transactions=24, folios=None, seed=7):
+    """casparser-style portfolio database with ``schemes`` holdings across folios"""
+    rng = random.Random(seed)
+    folios = folios or max(1, schemes // 8)
+    start = date(2015, 1, 1)
+    db = {"investor_info": {"name": "Synthetic Investor"}, "folios": []}
+    for f in range(folios):
+        db["folios"].append({"folio": f"{10000 + f}/01", "schemes": []})
+    for s in range(schemes):
+        units = rng.uniform(10, 5000)
+        nav = rng.uniform(10, 900)
+        txns = [{
+            "date": (start + timedelta(days=30 * t)).isoformat(),
+            "amount": round(rng.uniform(500, 20000), 2),
+            "type": "PURCHASE_SIP",
+        } for t in range(transactions)]
+        db["folios"][s % folios]["schemes"].append({
+            "scheme": f"Synthetic Fund {s} - Direct Growth",
+            "amfi": str(100000 + s),
+            "isin": f"INF{s:09d}",
+            "valuation": {"units": units, "nav": nav, "value": units * nav,
+                          "cost": sum(t["amount"] for t in txns)},
+            "transactions": txns,
+        })
+    return db
+
+
+class FakeMftool:
+    """mftool stand-in answering ``get_scheme_quote`` locally, optionally with latency"""
+
+    def __init__(self, latency=0.0, seed=7):
+        self.latency = latency
+        self.rng = random.Random(seed)
+
+    def get_scheme_quote(self, code):
+        if self.latency:
+            import time
+            time.sleep(self.latency)
+        return {"scheme_code": code, "nav": f"{self.rng.uniform(10, 900):.4f}",
+                "last_updated": date.today().strftime("%d-%b-%Y")}
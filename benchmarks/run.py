@@ -0,0 +1,240 @@
+"""Benchmark suite for the app's hot paths, with saved baselines.
+
+Each case builds its synthetic input once per size (untimed) and then times
+the operation, keeping the best of ``--repeat`` runs. Results can be saved
+as JSON and compared against an earlier baseline:
+
+    python benchmarks/run.py --save benchmarks/baseline.json
+    python benchmarks/run.py --compare benchmarks/baseline.json --tolerance 0.25
+    python benchmarks/run.py --only cams clients --full      # include the 1M / 100k sizes
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import pandas as pd
+
+import generators as gen
+from cams_parser import parse_cams_json
+from client_store import ClientStore
+from csv_ingest import ingest_csv
+from frames import as_frame
+from goals import _simulate, goal_plan, simulate_goals
+from mf_portfolio import flatten_folios, scheme_flows, value_holdings
+from nav_fetch import fetch_navs
+from portfolio_summary import allocation
+from renewal_index import DUE_DAYS, RenewalIndex, due_in_frame, policy_rows
+from returns import returns_table
+
+CASES = {}
+
+
+def case(name, sizes, full_sizes=()):
+    """Register ``setup(size, workdir) -> callable`` as a benchmark case"""
+    def register(setup):
+        CASES[name] = (list(sizes), list(full_sizes), setup)
+        return setup
+    return register
+
+
+@case("cams.parse.columnar", [1000, 10000, 100000], [1000000])
+def _cams_columnar(size, workdir):
+    raw = gen.synthetic_statement(size)
+    return lambda: parse_cams_json(io.BytesIO(raw))
+
+
+@case("cams.parse.stream", [1000, 10000, 100000], [1000000])
+def _cams_stream(size, workdir):
+    raw = gen.synthetic_statement(size)
+    return lambda: parse_cams_json(io.BytesIO(raw), stream=True)
+
+
+def _client_store(size, workdir):
+    store = ClientStore(os.path.join(workdir, f"clients-{size}.db"), legacy_file=None)
+    store.replace_all(gen.synthetic_clients(size))
+    return store
+
+
+@case("clients.save", [1000, 10000], [100000])
+def _clients_save(size, workdir):
+    store = ClientStore(os.path.join(workdir, f"clients-save-{size}.db"), legacy_file=None)
+    clients = gen.synthetic_clients(size)
+    return lambda: store.replace_all(clients)
+
+
+@case("clients.load", [1000, 10000], [100000])
+def _clients_load(size, workdir):
+    return _client_store(size, workdir).all
+
+
+@case("clients.lookup_1k", [1000, 10000], [100000])
+def _clients_lookup(size, workdir):
+    store = _client_store(size, workdir)
+    phones = [str(9000000000 + (i * 7919) % size) for i in range(1000)]
+    return lambda: [store.get(phone) for phone in phones]
+
+
+@case("portfolio.read_csv", [1000, 100000], [1000000])
+def _portfolio_read(size, workdir):
+    raw = gen.portfolio_csv(size)
+    return lambda: as_frame(pd.read_csv(io.BytesIO(raw)), "portfolio")
+
+
+@case("insurance.ingest_csv", [1000, 100000], [1000000])
+def _insurance_ingest(size, workdir):
+    raw = gen.insurance_csv(size)
+    return lambda: ingest_csv(io.BytesIO(raw), "insurance")
+
+
+@case("portfolio.allocation", [1000, 100000], [1000000])
+def _portfolio_allocation(size, workdir):
+    df = as_frame(pd.read_csv(io.BytesIO(gen.portfolio_csv(size))), "portfolio")
+    return lambda: allocation(df, "Scheme Name", "Investment Amount")
+
+
+@case("insurance.due_filter", [1000, 100000], [1000000])
+def _insurance_filter(size, workdir):
+    df = as_frame(pd.read_csv(io.BytesIO(gen.insurance_csv(size))), "insurance")
+    return lambda: due_in_frame(df, DUE_DAYS)
+
+
+@case("insurance.index_query", [10000, 100000], [1000000])
+def _insurance_index(size, workdir):
+    index = RenewalIndex(os.path.join(workdir, f"renewals-{size}.db"))
+    df = as_frame(pd.read_csv(io.BytesIO(gen.insurance_csv(size))), "insurance")
+    with index._connect() as conn:
+        conn.execute("DELETE FROM policies")
+        # Spread the policies over clients of 5 policies each
+        rows = policy_rows("", df)
+        conn.executemany("INSERT INTO policies VALUES (?, ?, ?, ?, ?, ?)",
+                         ((str(i // 5), i % 5, *row[2:]) for i, row in enumerate(rows)))
+    return lambda: index.due_within(DUE_DAYS)
+
+
+@case("goals.plan", [10, 1000], [100000])
+def _goals_plan(size, workdir):
+    goals = gen.synthetic_goals(size)
+    return lambda: goal_plan(goals)
+
+
+@case("goals.simulate", [5, 50])
+def _goals_simulate(size, workdir):
+    goals = gen.synthetic_goals(size)
+
+    def run():
+        _simulate.cache_clear()  # time the simulation, not the memo
+        return simulate_goals(goals)
+    return run
+
+
+@case("mf.valuation", [50, 500], [5000])
+def _mf_valuation(size, workdir):
+    data = gen.folio_db(size)
+    mftool = gen.FakeMftool()
+
+    def run():
+        holdings = flatten_folios(data)
+        navs = fetch_navs(holdings["amfi"], mftool)
+        nav = holdings["amfi"].map(lambda code: navs.get(code, (None, None))[0])
+        valued = value_holdings(holdings, nav)
+        held = pd.DataFrame({"value": valued["value"], "as_of": pd.Timestamp.today().normalize()})
+        return returns_table(scheme_flows(data), held)
+    return run
+
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def run(only=(), full=False, repeat=3, log=print):
+    """Time every selected case; returns a list of result dicts"""
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, (sizes, full_sizes, setup) in CASES.items():
+            if only and not any(name.startswith(prefix) for prefix in only):
+                continue
+            for size in sizes + (full_sizes if full else []):
+                seconds = best_of(setup(size, workdir), repeat)
+                results.append({"case": name, "size": size, "seconds": seconds})
+                log(f"{name:<24} {size:>10,} {seconds * 1000:>11.2f} ms")
+    return results
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Print speed ratios against a baseline; returns the regressions beyond ``tolerance``"""
+    before = {(r["case"], r["size"]): r["seconds"] for r in baseline["results"]}
+    regressions = []
+    print(f"\n{'case':<24} {'size':>10} {'baseline':>12} {'now':>12} {'ratio':>7}")
+    for r in results:
+        old = before.get((r["case"], r["size"]))
+        if not old:
+            continue
+        ratio = r["seconds"] / old
+        flag = " SLOWER" if ratio > 1 + tolerance else ""
+        print(f"{r['case']:<24} {r['size']:>10,} {old * 1000:>9.2f} ms {r['seconds'] * 1000:>9.2f} ms {ratio:>6.2f}x{flag}")
+        if flag:
+            regressions.append({**r, "baseline": old, "ratio": ratio})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--only", nargs="+", default=(), help="case name prefixes to run")
+    parser.add_argument("--full", action="store_true", help="include the largest sizes")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--save", help="write results as a JSON baseline")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown before failing")
+    parser.add_argument("--list", action="store_true", help="list cases and exit")
+    args = parser.parse_args(argv)
+    if args.list:
+        for name, (sizes, full_sizes, _) in CASES.items():
+            print(f"{name:<24} sizes {sizes} full {full_sizes}")
+        return 0
+    results = run(args.only, args.full, args.repeat)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"environment": environment(), "repeat": args.repeat, "results": results}, f, indent=2)
+        print(f"Saved {len(results)} results to {args.save}")
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} case(s) slower than the baseline by more than {args.tolerance:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,278 @@
+"""Persistent CAMS holdings per client, updated incrementally from statements.
+
+Each client's holdings (units and latest NAV per scheme) live in SQLite
+with a checkpoint per folio: the date of the last applied transaction and
+the fingerprints of the transactions applied on that date. Uploading a
+statement streams its transactions and applies only those after the
+checkpoint, so a monthly statement that overlaps earlier ones costs the
+size of its new transactions rather than the full history. Same-day
+transactions are told apart by fingerprint and occurrence, and a statement
+uploaded twice is recognised by its hash without being parsed.
+
+Transactions dated before a folio's checkpoint are treated as already
+applied when the statement also reaches the checkpoint, as overlapping
+statements do; they are returned as ``backdated`` in the summary, since a
+backdated correction among them cannot be told apart from the history it
+repeats. A statement that ends before a folio's checkpoint (an older
+statement uploaded after a newer one) is rejected rather than partly
+applied; loading it needs ``clear(mobile)`` and the statements uploaded
+oldest first, as does a backdated correction.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+
+import metrics
+from cams_parser import apply_transaction, iter_transactions, new_holding, portfolio_rows, record_date
+
+CAMS_LEDGER_DB = os.environ.get("CAMS_LEDGER_DB", "cams_ledger.db")
+FOLIO_FIELDS = ("Folio", "Folio No", "Folio Number", "FOLIO_NO")
+UNDATED = ""  # checkpoint key for transactions without a date
+BACKDATED_FIELDS = ("folio", "date", "scheme", "desc", "units")
+
+
+def record_folio(record):
+    for field in FOLIO_FIELDS:
+        if record.get(field):
+            return str(record[field]).strip()
+    return ""
+
+
+def fingerprint(record):
+    """Identity of a transaction within its folio and date, stable across statements"""
+    try:
+        units, price = float(record.get("Units", 0)), float(record.get("Price", 0))
+    except (TypeError, ValueError):
+        units = price = 0.0
+    return f"{record.get('Scheme Name', 'N/A')}|{str(record.get('Desc', '')).lower()}|{units:.4f}|{price:.4f}"
+
+
+def _backdated(folio, day, record):
+    return folio, day, record.get("Scheme Name", "N/A"), record.get("Desc", ""), record.get("Units")
+
+
+def _digest(file):
+    digest = hashlib.sha256()
+    while chunk := file.read(1 << 20):
+        digest.update(chunk.encode("utf-8") if isinstance(chunk, str) else chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+class CamsLedger:
+    """Holdings and per-folio checkpoints for every client in one SQLite file"""
+
+    def __init__(self, path=CAMS_LEDGER_DB):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS holdings (
+                    mobile TEXT NOT NULL,
+                    scheme TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    units REAL NOT NULL,
+                    latest_nav REAL NOT NULL,
+                    latest_date TEXT,
+                    PRIMARY KEY (mobile, scheme)
+                )""")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS checkpoints (
+                    mobile TEXT NOT NULL,
+                    folio TEXT NOT NULL,
+                    last_date TEXT,
+                    boundary TEXT NOT NULL,
+                    undated TEXT NOT NULL,
+                    applied INTEGER NOT NULL,
+                    PRIMARY KEY (mobile, folio)
+                )""")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS statements (
+                    mobile TEXT NOT NULL,
+                    sha256 TEXT NOT NULL,
+                    ingested_at REAL NOT NULL,
+                    applied INTEGER NOT NULL,
+                    skipped INTEGER NOT NULL,
+                    PRIMARY KEY (mobile, sha256)
+                )""")
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _holdings(self, conn, mobile):
+        holdings = defaultdict(new_holding)
+        for scheme, units, nav, latest in conn.execute(
+                "SELECT scheme, units, latest_nav, latest_date FROM holdings WHERE mobile = ? ORDER BY seq",
+                (mobile,)):
+            holdings[scheme] = {"units": units, "latest_nav": nav, "scheme_name": scheme,
+                                "latest_date": datetime.fromisoformat(latest) if latest else None}
+        return holdings
+
+    def portfolio(self, mobile):
+        """``(portfolio, total_value)`` in the shape ``parse_cams_json`` returns"""
+        return portfolio_rows(self._holdings(self._connect(), mobile))
+
+    def _checkpoints(self, conn, mobile):
+        return {
+            folio: [last_date, set(json.loads(boundary)), set(json.loads(undated)), applied]
+            for folio, last_date, boundary, undated, applied in conn.execute(
+                "SELECT folio, last_date, boundary, undated, applied FROM checkpoints WHERE mobile = ?",
+                (mobile,))
+        }
+
+    def _seen(self, conn, mobile, sha):
+        return conn.execute("SELECT applied, skipped FROM statements WHERE mobile = ? AND sha256 = ?",
+                            (mobile, sha)).fetchone()
+
+    def _scan(self, file, checkpoints, progress=None):
+        """Transactions in ``file`` not covered by ``checkpoints``: ``(new, skipped, backdated, older)``.
+
+        ``skipped`` counts every transaction not applied, ``backdated`` lists
+        (as ``BACKDATED_FIELDS`` tuples) those skipped for predating their
+        folio's checkpoint, and ``older`` maps each folio whose transactions
+        in this statement all predate its checkpoint to that checkpoint's date.
+        """
+        occurrences = Counter()
+        new, skipped, backdated = [], 0, []
+        before, reached = set(), set()
+        for record in iter_transactions(file, progress=progress):
+            folio = record_folio(record)
+            last_date, boundary, undated, _ = checkpoints.get(folio, (None, (), (), 0))
+            day = record_date(record)
+            day = day.date().isoformat() if day else UNDATED
+            if day and last_date and day < last_date:
+                before.add(folio)
+                backdated.append(_backdated(folio, day, record))
+                skipped += 1
+                continue
+            if day:
+                reached.add(folio)
+            mark = fingerprint(record)
+            occurrences[folio, day, mark] += 1
+            token = f"{mark}#{occurrences[folio, day, mark]}"
+            if token in (undated if day == UNDATED else boundary if day == last_date else ()):
+                skipped += 1
+                continue
+            new.append((folio, day, token, record))
+        return new, skipped, backdated, {folio: checkpoints[folio][0] for folio in sorted(before - reached)}
+
+    @metrics.timed("parse_seconds", parser="cams_ledger")
+    def ingest(self, mobile, file, progress=None):
+        """Apply the transactions in a statement not seen before; returns a summary dict.
+
+        ``file`` is a seekable binary file object; ``progress`` is passed to
+        ``iter_transactions``. The statement is read and deduplicated against
+        a snapshot of the checkpoints before the write lock is taken. A
+        statement that ends before a folio's checkpoint is rejected, with
+        ``older`` in the summary naming those folios and their checkpoint
+        dates, since the ledger cannot tell which of its transactions are new.
+        ``backdated`` lists the transactions of an applied statement that were
+        taken as already applied because they predate their folio's
+        checkpoint. ``sha256`` in the summary is the statement's digest, for
+        caches keyed on the file.
+        """
+        sha = _digest(file)
+        conn = self._connect()
+        seen = self._seen(conn, mobile, sha)
+        if seen:
+            return {"applied": 0, "skipped": seen[0] + seen[1], "folios": 0, "duplicate": True, "older": {},
+                    "backdated": [], "sha256": sha}
+        snapshot = self._checkpoints(conn, mobile)
+        new, skipped, backdated, older = self._scan(file, snapshot, progress)
+        if older:
+            metrics.inc("cams_ledger_statements_total", result="older")
+            return {"applied": 0, "skipped": skipped + len(new), "folios": 0, "duplicate": False, "older": older,
+                    "backdated": [], "sha256": sha}
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            seen = self._seen(conn, mobile, sha)
+            if seen:
+                conn.execute("ROLLBACK")
+                return {"applied": 0, "skipped": seen[0] + seen[1], "folios": 0, "duplicate": True, "older": {},
+                        "backdated": [], "sha256": sha}
+            checkpoints = self._checkpoints(conn, mobile)
+            if checkpoints != snapshot:
+                # Another statement for this client was applied meanwhile
+                file.seek(0)
+                new, skipped, backdated, older = self._scan(file, checkpoints)
+                if older:
+                    conn.execute("ROLLBACK")
+                    metrics.inc("cams_ledger_statements_total", result="older")
+                    return {"applied": 0, "skipped": skipped + len(new), "folios": 0, "duplicate": False,
+                            "older": older, "backdated": [], "sha256": sha}
+
+            holdings = self._holdings(conn, mobile)
+            for folio, day, token, record in new:
+                apply_transaction(holdings, record)
+                checkpoint = checkpoints.setdefault(folio, [None, set(), set(), 0])
+                if day == UNDATED:
+                    checkpoint[2].add(token)
+                elif checkpoint[0] is None or day > checkpoint[0]:
+                    checkpoint[0], checkpoint[1] = day, {token}
+                elif day == checkpoint[0]:
+                    checkpoint[1].add(token)
+                checkpoint[3] += 1
+
+            touched = {record.get("Scheme Name", "N/A") for _, _, _, record in new}
+            conn.executemany("INSERT OR REPLACE INTO holdings VALUES (?, ?, ?, ?, ?, ?)", [
+                (mobile, scheme, seq, h["units"], h["latest_nav"],
+                 h["latest_date"].isoformat() if h["latest_date"] else None)
+                for seq, (scheme, h) in enumerate(holdings.items()) if scheme in touched
+            ])
+            folios = {folio for folio, _, _, _ in new}
+            conn.executemany("INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?)", [
+                (mobile, folio, last_date, json.dumps(sorted(boundary)), json.dumps(sorted(undated)), applied)
+                for folio, (last_date, boundary, undated, applied) in checkpoints.items() if folio in folios
+            ])
+            conn.execute("INSERT INTO statements VALUES (?, ?, ?, ?, ?)",
+                         (mobile, sha, time.time(), len(new), skipped))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        metrics.inc("cams_ledger_transactions_total", len(new), result="applied")
+        metrics.inc("cams_ledger_transactions_total", skipped - len(backdated), result="skipped")
+        metrics.inc("cams_ledger_transactions_total", len(backdated), result="backdated")
+        return {"applied": len(new), "skipped": skipped, "folios": len(folios), "duplicate": False, "older": {},
+                "backdated": backdated, "sha256": sha}
+
+    def checkpoints(self, mobile):
+        """{folio: (last applied date, transactions applied)} for a client"""
+        return {folio: (last_date, applied) for folio, last_date, applied in self._connect().execute(
+            "SELECT folio, last_date, applied FROM checkpoints WHERE mobile = ? ORDER BY folio", (mobile,))}
+
+    def clear(self, mobile):
+        """Forget a client's holdings, checkpoints and statement hashes"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for table in ("holdings", "checkpoints", "statements"):
+                conn.execute(f"DELETE FROM {table} WHERE mobile = ?", (mobile,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+
+_ledger = None
+_ledger_lock = threading.Lock()
+
+
+def get_ledger():
+    """Process-wide CAMS ledger"""
+    global _ledger
+    with _ledger_lock:
+        if _ledger is None:
+            _ledger = CamsLedger()
+    return _ledger
@@ -0,0 +1,474 @@
+"""CAMS transaction statement parsing.
+
+``parse_cams_json`` turns a CAMS JSON statement into a list of holdings and
+the total portfolio value. By default transactions are loaded into typed
+column arrays (read by pyarrow's JSON reader for large statements when it
+is installed) and aggregated per scheme by transaction date. With
+``stream=True`` the ``TRXN_DETAILS`` array is read one transaction at a
+time instead, so memory use stays flat no matter how large the statement is.
+"""
+import codecs
+import json
+import re
+from collections import defaultdict
+from datetime import datetime
+from functools import lru_cache
+from operator import itemgetter
+
+import numpy as np
+import pandas as pd
+
+import metrics
+
+TRANSACTIONS_KEY = "TRXN_DETAILS"
+DATE_FIELDS = ("Date", "Trxn Date", "Transaction Date", "TRXN_DATE")
+DATE_FORMATS = ("%d-%b-%Y", "%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y")
+CHUNK_SIZE = 64 * 1024
+PROGRESS_EVERY = 1000  # transactions between progress callbacks
+DATE_CACHE_SIZE = 65536  # distinct date strings remembered by record_date
+ARROW_MIN_BYTES = 256 * 1024  # smaller statements decode faster with the json module
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+class _StreamReader:
+    """Sliding text buffer over a binary or text file object"""
+
+    def __init__(self, file, chunk_size):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.decoder = codecs.getincrementaldecoder("utf-8-sig")()
+        self.json = json.JSONDecoder()
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.bytes_read = 0
+
+    def fill(self):
+        chunk = self.file.read(self.chunk_size)
+        if isinstance(chunk, str):
+            chunk = chunk.encode("utf-8")
+        self.bytes_read += len(chunk)
+        self.eof = not chunk
+        self.buf = self.buf[self.pos:] + self.decoder.decode(chunk, final=self.eof)
+        self.pos = 0
+
+    def peek(self):
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf) or self.eof:
+                return self.buf[self.pos:self.pos + 1]
+            self.fill()
+
+    def take(self, expected):
+        found = self.peek()
+        if found not in expected:
+            raise ValueError(f"Malformed CAMS JSON: expected one of {expected!r}, found {found!r}")
+        self.pos += 1
+        return found
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                obj, end = self.json.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+                self.fill()
+                continue
+            # A number that ends the buffer, or stops at a "." or exponent the
+            # chunk cut short ("3." of "3.25"), may continue in the next chunk
+            if not self.eof and (end == len(self.buf) or (
+                    isinstance(obj, (int, float)) and self.buf[end] in ".eE")):
+                self.fill()
+                continue
+            self.pos = end
+            return obj
+
+
+def iter_transactions(file, key=TRANSACTIONS_KEY, chunk_size=CHUNK_SIZE, progress=None):
+    """Yield the records of the top-level ``key`` array one at a time.
+
+    Other top-level values are decoded and discarded. ``progress(bytes_read,
+    records)`` is called every ``PROGRESS_EVERY`` records and once at the end.
+    """
+    reader = _StreamReader(file, chunk_size)
+    count = 0
+    reader.take("{")
+    if reader.peek() == "}":
+        return
+    while True:
+        name = reader.value()
+        reader.take(":")
+        if name != key:
+            reader.value()
+        else:
+            reader.take("[")
+            if reader.peek() == "]":
+                reader.take("]")
+            else:
+                skip, tried = _WHITESPACE.match, None
+                while True:
+                    # Every whole record in the buffer is decoded by one
+                    # json.loads call. A cut that is not between two records
+                    # leaves invalid JSON, and the buffer then goes one record
+                    # at a time through the reader until it is refilled.
+                    buf = reader.buf
+                    pos = skip(buf, reader.pos).end()
+                    cut = buf.rfind("}", pos) + 1
+                    records = None
+                    if cut > pos and buf is not tried:
+                        try:
+                            records = json.loads("[" + buf[pos:cut] + "]")
+                        except ValueError:
+                            tried = buf
+                    if records:
+                        reader.pos = cut
+                    else:
+                        reader.pos = pos
+                        records = [reader.value()]
+                    for record in records:
+                        yield record
+                        count += 1
+                        if progress and count % PROGRESS_EVERY == 0:
+                            progress(reader.bytes_read, count)
+                    if reader.take(",]") == "]":
+                        break
+        if reader.take(",}") == "}":
+            break
+    if progress:
+        progress(reader.bytes_read, count)
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def _parse_date(text):
+    # Statements repeat a few thousand distinct dates, so each is parsed once
+    text = text.strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def record_date(record):
+    """Date of a transaction from the first date field it has, or None"""
+    for field in DATE_FIELDS:
+        text = record.get(field)
+        if text:
+            return _parse_date(str(text))
+    return None
+
+
+def new_holding():
+    return {"units": 0.0, "latest_nav": 0.0, "latest_date": None, "scheme_name": ""}
+
+
+def apply_transaction(holdings, record):
+    """Apply one transaction to ``holdings``, a defaultdict of ``new_holding()`` by scheme"""
+    scheme_name = record.get("Scheme Name", "N/A")
+    units = float(record.get("Units", 0))
+    nav = float(record.get("Price", 0))
+    desc = record.get("Desc", "").lower()
+    date = record_date(record)
+    holding = holdings[scheme_name]
+
+    # Purchase adds units, redemption/switch/subtract units
+    if "purchase" in desc:
+        holding["units"] += units
+    elif "redemption" in desc or "switch" in desc:
+        holding["units"] -= units
+    else:
+        holding["units"] += units  # treat other as addition
+
+    # Latest NAV comes from the latest-dated transaction; undated rows only
+    # count until a dated one is seen, matching the columnar engine's order
+    latest_date = holding["latest_date"]
+    if date is not None and (latest_date is None or date >= latest_date):
+        holding["latest_nav"] = nav
+        holding["latest_date"] = date
+    elif date is None and latest_date is None:
+        holding["latest_nav"] = nav
+
+    holding["scheme_name"] = scheme_name
+
+
+def portfolio_rows(holdings):
+    """``(portfolio, total_value)`` from per-scheme holdings"""
+    portfolio = []
+    total_value = 0.0
+    for h in holdings.values():
+        value = h["units"] * h["latest_nav"]
+        portfolio.append({
+            "Scheme Name": h["scheme_name"],
+            "Total Units": h["units"],
+            "Current NAV": h["latest_nav"],
+            "Current Value": value
+        })
+        total_value += value
+    return portfolio, total_value
+
+
+def _factorize(values):
+    """Integer codes plus distinct values, so string work runs once per distinct value"""
+    if hasattr(values, "dictionary_encode"):
+        # pyarrow column: nulls stay out of the dictionary and become -1
+        encoded = values.dictionary_encode()
+        codes = encoded.indices.fill_null(-1).to_numpy(zero_copy_only=False).astype(np.intp)
+        return codes, pd.Index(encoded.dictionary.to_pylist(), dtype=object)
+    codes, uniques = pd.factorize(np.asarray(values, dtype=object), use_na_sentinel=True)
+    return codes, pd.Index(uniques, dtype=object)
+
+
+def _take(per_unique, codes, missing):
+    # Code -1 marks a missing value and picks the trailing ``missing`` slot
+    return np.append(np.asarray(per_unique), missing)[codes]
+
+
+def _parse_dates(values):
+    """Parse each distinct date string once, through the same cache as ``record_date``"""
+    codes, uniques = _factorize(values)
+    dates = pd.DatetimeIndex([_parse_date(str(text)) for text in uniques], dtype="datetime64[ns]").to_numpy()
+    return _take(dates, codes, np.datetime64("NaT", "ns"))
+
+
+def _date_field(records):
+    """First of DATE_FIELDS that the statement uses, or None"""
+    for record in records:
+        for field in DATE_FIELDS:
+            if record.get(field):
+                return field
+    return None
+
+
+def _column(records, field, default=None):
+    try:
+        return list(map(itemgetter(field), records))
+    except KeyError:
+        return [record.get(field, default) for record in records]
+
+
+def _to_float(values):
+    try:
+        if hasattr(values, "cast"):
+            return values.cast("float64").to_numpy(zero_copy_only=False)
+        return np.array(values, dtype="float64")
+    except (TypeError, ValueError):
+        if hasattr(values, "to_pandas"):
+            values = values.to_pandas()
+        # Stray text such as "" or "N.A." counts as zero, like a missing value
+        return pd.to_numeric(pd.Series(values, dtype=object), errors="coerce").to_numpy("float64")
+
+
+def _arrow_columns(raw):
+    """TRXN_DETAILS fields of a JSON statement read by pyarrow, as ``transactions_frame`` columns.
+
+    Returns None when pyarrow is missing or cannot read the statement (mixed
+    value types, an empty or odd TRXN_DETAILS), so the caller falls back to
+    the json module.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.json
+    except ImportError:
+        return None
+    try:
+        table = pyarrow.json.read_json(
+            pa.py_buffer(raw),
+            read_options=pyarrow.json.ReadOptions(block_size=len(raw) + 1, use_threads=False),
+            parse_options=pyarrow.json.ParseOptions(newlines_in_values=True),
+        )
+        if table.num_rows != 1 or TRANSACTIONS_KEY not in table.column_names:
+            return None
+        details = table.column(TRANSACTIONS_KEY).combine_chunks()
+        if not pa.types.is_list(details.type) or not pa.types.is_struct(details.type.value_type):
+            return None
+        rows = pc.list_flatten(details)
+        fields = {rows.type.field(i).name: rows.field(i) for i in range(rows.type.num_fields)}
+        # pyarrow turns ISO date strings into timestamps; give them back as text
+        fields = {name: pc.strftime(values, "%Y-%m-%d") if pa.types.is_timestamp(values.type) else values
+                  for name, values in fields.items()}
+        date_field = next((field for field in DATE_FIELDS if field in fields
+                           and pc.any(pc.not_equal(fields[field].cast("string"), "")).as_py()), None)
+        scheme = fields.get("Scheme Name")
+        return len(rows), {
+            "Scheme Name": scheme.fill_null("N/A") if scheme is not None else ["N/A"] * len(rows),
+            "Desc": fields.get("Desc", [None] * len(rows)),
+            "Units": fields.get("Units", [0] * len(rows)),
+            "Price": fields.get("Price", [0] * len(rows)),
+            "Amount": fields.get("Amount"),
+            "Date": fields[date_field] if date_field else None,
+        }
+    except (pa.ArrowException, ValueError, TypeError):
+        return None
+
+
+def transactions_frame(records):
+    """Typed, date-ordered transaction table with signed unit movements"""
+    date_field = _date_field(records)
+    return _frame(*_transactions(len(records), {
+        "Scheme Name": _column(records, "Scheme Name", "N/A"),
+        "Desc": _column(records, "Desc"),
+        "Units": _column(records, "Units", 0),
+        "Price": _column(records, "Price", 0),
+        "Amount": _column(records, "Amount") if any("Amount" in record for record in records) else None,
+        "Date": _column(records, date_field) if date_field else None,
+    }))
+
+
+def stream_transactions_frame(file, progress=None):
+    """``transactions_frame`` for a statement file, read with ``iter_transactions``.
+
+    Only the fields the frame uses are kept for each transaction, so memory
+    follows the number of transactions rather than the size of the document.
+    """
+    columns = {"Scheme Name": [], "Desc": [], "Units": [], "Price": [], "Amount": [], "Date": []}
+    date_field, has_amount = None, False
+    for record in iter_transactions(file, progress=progress):
+        if date_field is None:
+            # Same choice as _date_field; earlier rows have no date either way
+            date_field = next((field for field in DATE_FIELDS if record.get(field)), None)
+        has_amount = has_amount or "Amount" in record
+        columns["Scheme Name"].append(record.get("Scheme Name", "N/A"))
+        columns["Desc"].append(record.get("Desc"))
+        columns["Units"].append(record.get("Units", 0))
+        columns["Price"].append(record.get("Price", 0))
+        columns["Amount"].append(record.get("Amount"))
+        columns["Date"].append(record.get(date_field) if date_field else None)
+    if not has_amount:
+        columns["Amount"] = None
+    if date_field is None:
+        columns["Date"] = None
+    return _frame(*_transactions(len(columns["Units"]), columns))
+
+
+def _transactions(length, columns):
+    """Typed arrays in file order plus the distinct scheme names.
+
+    ``columns`` holds each field's values; ``Amount`` and ``Date`` may be None.
+    """
+    units = np.nan_to_num(_to_float(columns["Units"]))
+    prices = np.nan_to_num(_to_float(columns["Price"]))
+    if columns["Date"] is not None:
+        dates = _parse_dates(columns["Date"])
+    else:
+        dates = np.full(length, np.datetime64("NaT", "ns"))
+
+    desc_codes, desc_values = _factorize(columns["Desc"])
+    lowered = [str(desc).lower() for desc in desc_values]
+    # Purchase adds units, redemption/switch subtract, anything else adds
+    purchase = np.array(["purchase" in desc for desc in lowered], dtype=bool)
+    outflow = ~purchase & np.array(["redemption" in desc or "switch" in desc for desc in lowered], dtype=bool)
+    purchase = _take(purchase, desc_codes, False)
+    outflow = _take(outflow, desc_codes, False)
+
+    scheme_codes, scheme_values = _factorize(columns["Scheme Name"])
+    # Rupee amount of each transaction; units x price when no Amount is given
+    amounts = units * prices
+    if columns["Amount"] is not None:
+        given = _to_float(columns["Amount"])
+        amounts = np.where(np.isnan(given), amounts, np.abs(given))
+    return {
+        "scheme": scheme_codes,
+        "date": dates,
+        "units": units,
+        "signed_units": np.where(outflow, -units, units),
+        "price": prices,
+        "amount": amounts,
+        "purchase": purchase,
+        "outflow": outflow,
+    }, scheme_values
+
+
+def _frame(arrays, schemes):
+    # Stable sort keeps file order for same-day rows; undated rows go first
+    order = np.argsort(arrays["date"].view("int64"), kind="stable")
+    columns = {name: values[order] for name, values in arrays.items()}
+    columns["scheme"] = pd.Categorical.from_codes(columns["scheme"], categories=schemes)
+    return pd.DataFrame(columns, index=order)
+
+
+def _aggregate(codes, schemes, dates, signed_units, prices, rows):
+    """Per-scheme ``(schemes, units, latest_nav, latest_date)`` in order of first appearance.
+
+    The latest NAV is the price on the scheme's latest-dated row, the last
+    one on a tie; undated rows count only until a dated one is seen. ``rows``
+    is each row's position in the file; the arrays themselves are in file or
+    date order.
+    """
+    # One slot per scheme plus a trailing one for a missing scheme name
+    slots = len(schemes) + 1
+    slot = np.where(codes < 0, slots - 1, codes).astype(np.intp)
+    stamps = dates.view("int64")
+    latest = np.full(slots, np.iinfo(np.int64).min)
+    np.maximum.at(latest, slot, stamps)
+    last = np.full(slots, -1)
+    np.maximum.at(last, slot, np.where(stamps == latest[slot], np.arange(len(slot)), -1))
+    first = np.full(slots, np.iinfo(np.int64).max)
+    np.minimum.at(first, slot, rows)
+    held = np.flatnonzero(last >= 0)
+    held = held[np.argsort(first[held], kind="stable")]
+    return (
+        pd.Categorical.from_codes(np.where(held == slots - 1, -1, held), categories=schemes),
+        np.bincount(slot, weights=signed_units, minlength=slots)[held].astype("float64"),
+        prices[last[held]],
+        latest[held].view("datetime64[ns]"),
+    )
+
+
+def aggregate_holdings(trxns):
+    """Units held and latest NAV per scheme, in order of first appearance"""
+    schemes = trxns["scheme"].array
+    names, units, navs, dates = _aggregate(
+        schemes.codes, schemes.categories, trxns["date"].to_numpy("datetime64[ns]"),
+        trxns["signed_units"].to_numpy("float64"), trxns["price"].to_numpy("float64"),
+        trxns.index.to_numpy(np.int64),
+    )
+    totals = pd.DataFrame({"units": units, "latest_nav": navs, "latest_date": dates},
+                          index=pd.CategoricalIndex(names, name="scheme"))
+    totals["value"] = totals["units"] * totals["latest_nav"]
+    return totals
+
+
+# Parse CAMS JSON to extract portfolio data
+@metrics.timed("parse_seconds", parser="cams")
+def parse_cams_json(file, stream=False, progress=None):
+    """Return ``(portfolio, total_value)`` for a CAMS JSON statement.
+
+    ``stream=True`` updates holdings while reading transactions from the file
+    instead of loading the whole document first; ``progress`` is passed to
+    ``iter_transactions``.
+    """
+    if stream:
+        holdings = defaultdict(new_holding)
+        for record in iter_transactions(file, progress=progress):
+            apply_transaction(holdings, record)
+        return portfolio_rows(holdings)
+
+    raw = file.read()
+    if isinstance(raw, str):
+        raw = raw.encode("utf-8")
+    columns = _arrow_columns(raw) if len(raw) >= ARROW_MIN_BYTES else None
+    if columns is None:
+        records = json.loads(raw).get(TRANSACTIONS_KEY, [])
+        date_field = _date_field(records)
+        columns = len(records), {
+            "Scheme Name": _column(records, "Scheme Name", "N/A"),
+            "Desc": _column(records, "Desc"),
+            "Units": _column(records, "Units", 0),
+            "Price": _column(records, "Price", 0),
+            "Amount": None,
+            "Date": _column(records, date_field) if date_field else None,
+        }
+    arrays, schemes = _transactions(*columns)
+    names, units, navs, _ = _aggregate(arrays["scheme"], schemes, arrays["date"], arrays["signed_units"],
+                                       arrays["price"], np.arange(columns[0]))
+    values = units * navs
+    portfolio = [
+        {"Scheme Name": scheme, "Total Units": unit, "Current NAV": nav, "Current Value": value}
+        for scheme, unit, nav, value in zip(names.tolist(), units.tolist(), navs.tolist(), values.tolist())
+    ]
+    return portfolio, float(values.sum())
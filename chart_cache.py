@@ -0,0 +1,102 @@
+"""Rendered chart images, cached by a hash of their data and theme.
+
+Pages pass plain labels and values; a chart is drawn only when that data
+(or the theme) changes and is otherwise served as PNG bytes from a bounded
+LRU. Figures are closed as soon as they are rasterized, so reruns no longer
+accumulate open matplotlib figures.
+"""
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+
+import metrics
+
+CACHE_SIZE = 128
+CACHE_BYTES = 32 * 1024 * 1024
+DPI = 200
+
+THEME = {
+    "palette": ("#FF6F00", "#757575", "#FFD180", "#B0BEC5", "#FFB74D", "#E0E0E0", "#F57C00"),
+    "accent": "#FF6F00",
+    "muted": "#757575",
+}
+
+_cache = OrderedDict()
+_cache_bytes = 0
+_cache_lock = threading.Lock()
+_render_lock = threading.Lock()  # pyplot keeps global state; draw one figure at a time
+
+
+def chart_key(kind, data, theme):
+    """Stable digest of a chart's kind, data and theme"""
+    theme = tuple(sorted(theme.items()))
+    return hashlib.sha256(repr((kind, data, theme)).encode("utf-8")).hexdigest()
+
+
+@metrics.timed("chart_render_seconds")
+def _render(draw, data, theme):
+    import matplotlib.pyplot as plt
+
+    with _render_lock:
+        fig, ax = plt.subplots()
+        try:
+            draw(ax, data, theme)
+            buf = io.BytesIO()
+            fig.savefig(buf, format="png", dpi=DPI, bbox_inches="tight")
+        finally:
+            plt.close(fig)
+    return buf.getvalue()
+
+
+def cached_chart(kind, data, draw, theme=THEME):
+    """PNG bytes of ``draw(ax, data, theme)``, rendered only on a cache miss.
+
+    ``data`` must be built from hashable plain values (tuples of labels and
+    numbers), since its repr is part of the cache key.
+    """
+    global _cache_bytes
+    key = chart_key(kind, data, theme)
+    with _cache_lock:
+        if key in _cache:
+            metrics.inc("chart_cache_total", result="hit")
+            _cache.move_to_end(key)
+            return _cache[key]
+    metrics.inc("chart_cache_total", result="miss")
+    png = _render(draw, data, theme)
+    with _cache_lock:
+        if key not in _cache:
+            _cache[key] = png
+            _cache_bytes += len(png)
+        while _cache and (len(_cache) > CACHE_SIZE or _cache_bytes > CACHE_BYTES):
+            _, evicted = _cache.popitem(last=False)
+            _cache_bytes -= len(evicted)
+    return png
+
+
+def _draw_pie(ax, data, theme):
+    labels, values = data
+    ax.pie(values, labels=labels, autopct='%1.1f%%', startangle=90, colors=theme["palette"])
+    ax.axis('equal')
+
+
+def _draw_progress(ax, data, theme):
+    labels, progress = data
+    ax.bar(range(len(labels)), progress, tick_label=labels, color=theme["accent"], edgecolor=theme["muted"])
+    ax.set_ylabel("Progress towards goal")
+    ax.set_ylim(0, 100)
+    ax.set_title("Progress on Financial Goals", color=theme["muted"])
+    for idx, v in enumerate(progress):
+        ax.text(idx, v + 2, f"{v}%", ha="center", color=theme["accent"])
+
+
+def pie_chart(labels, values, theme=THEME):
+    """Allocation pie as PNG bytes"""
+    data = (tuple(str(label) for label in labels), tuple(float(v) for v in values))
+    return cached_chart("pie", data, _draw_pie, theme)
+
+
+def progress_chart(labels, progress, theme=THEME):
+    """Goal progress bars (0-100) as PNG bytes"""
+    data = (tuple(str(label) for label in labels), tuple(float(v) for v in progress))
+    return cached_chart("progress", data, _draw_progress, theme)
@@ -0,0 +1,155 @@
+"""Embedded client registry backed by SQLite.
+
+Clients are keyed by phone number with a unique index on ``user_id``, so a
+login or registration looks up one row instead of reading every client.
+Registration is a single transactional insert, so concurrent sign-ups
+cannot overwrite each other. The legacy ``clients.json`` file is imported
+once, the first time the database is opened.
+
+    python client_store.py migrate [clients.json]
+"""
+import json
+import os
+import sqlite3
+import sys
+import threading
+
+CLIENTS_DB = os.environ.get("CLIENTS_DB", "clients.db")
+CLIENTS_FILE = "clients.json"
+FIELDS = ("phone", "user_id", "name", "address", "email", "income_bracket", "age_bracket",
+          "password", "registered")
+# Choices offered by the registration form
+INCOME_BRACKETS = ("<5 Lakh", "5-10 Lakh", "10-25 Lakh", "25+ Lakh")
+AGE_BRACKETS = ("<25", "25-35", "35-50", "50+")
+_VALUES = f"VALUES ({', '.join('?' * (len(FIELDS) + 1))})"
+# Phone numbers allowed to see firm-wide views, comma-separated
+ADMINS = frozenset(m.strip() for m in os.environ.get("CAPITAL_CARTEL_ADMINS", "").split(",") if m.strip())
+
+
+class ClientStore:
+    """Client records with O(1) lookups by phone and user_id"""
+
+    def __init__(self, path=CLIENTS_DB, legacy_file=CLIENTS_FILE):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS clients (
+                    phone TEXT PRIMARY KEY,
+                    user_id TEXT UNIQUE,
+                    name TEXT,
+                    address TEXT,
+                    email TEXT,
+                    income_bracket TEXT,
+                    age_bracket TEXT,
+                    password TEXT,
+                    registered INTEGER NOT NULL DEFAULT 0,
+                    extra TEXT NOT NULL DEFAULT '{}'
+                )""")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        if legacy_file and os.path.exists(legacy_file):
+            self.migrate_from_json(legacy_file)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _row(phone, record):
+        known = {field: record.get(field) for field in FIELDS}
+        known["phone"] = phone
+        known["registered"] = 1 if record.get("registered") else 0
+        extra = {k: v for k, v in record.items() if k not in FIELDS}
+        return (*(known[field] for field in FIELDS), json.dumps(extra))
+
+    @staticmethod
+    def _record(row):
+        record = {field: row[field] for field in FIELDS if row[field] is not None}
+        record["registered"] = bool(row["registered"])
+        record.update(json.loads(row["extra"]))
+        return record
+
+    def get(self, phone):
+        """Client record for a phone number, or None"""
+        row = self._connect().execute("SELECT * FROM clients WHERE phone = ?", (phone,)).fetchone()
+        return self._record(row) if row else None
+
+    def user_id_taken(self, user_id):
+        return self._connect().execute(
+            "SELECT 1 FROM clients WHERE user_id = ?", (user_id,)
+        ).fetchone() is not None
+
+    def add(self, phone, record):
+        """Insert a new client atomically; returns (ok, message)"""
+        try:
+            with self._connect() as conn:
+                conn.execute(f"INSERT INTO clients {_VALUES}", self._row(phone, record))
+        except sqlite3.IntegrityError as exc:
+            if "user_id" in str(exc):
+                return False, "User ID already in use."
+            return False, "Mobile number already registered."
+        return True, "Registration complete!"
+
+    def all(self):
+        """Every client as a dict keyed by phone, the shape of clients.json"""
+        rows = self._connect().execute("SELECT * FROM clients ORDER BY rowid")
+        return {row["phone"]: self._record(row) for row in rows}
+
+    def replace_all(self, clients):
+        """Upsert every client in one transaction, for callers of the old save_clients()"""
+        with self._connect() as conn:
+            conn.executemany(
+                f"INSERT OR REPLACE INTO clients {_VALUES}",
+                (self._row(phone, record) for phone, record in clients.items()),
+            )
+
+    def count(self):
+        return self._connect().execute("SELECT COUNT(*) FROM clients").fetchone()[0]
+
+    def migrate_from_json(self, path, force=False):
+        """Import a clients.json file once; returns the number of clients added"""
+        source = os.path.abspath(path)
+        conn = self._connect()
+        if not force and conn.execute("SELECT 1 FROM meta WHERE key = ?", ("migrated:" + source,)).fetchone():
+            return 0
+        with open(path) as f:
+            clients = json.load(f)
+        with conn:
+            before = conn.total_changes
+            conn.executemany(
+                f"INSERT OR IGNORE INTO clients {_VALUES}",
+                (self._row(phone, record) for phone, record in clients.items()),
+            )
+            added = conn.total_changes - before
+            conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", ("migrated:" + source, str(added)))
+        return added
+
+
+def is_admin(phone):
+    return bool(phone) and phone in ADMINS
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Process-wide client store, opened (and migrated) on first use"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ClientStore()
+    return _store
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "migrate":
+        sys.exit(__doc__)
+    store = ClientStore(legacy_file=None)
+    added = store.migrate_from_json(sys.argv[2] if len(sys.argv) > 2 else CLIENTS_FILE, force=True)
+    print(f"Imported {added} clients into {store.path} ({store.count()} total)")
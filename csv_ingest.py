@@ -0,0 +1,163 @@
+"""Typed, chunked CSV ingestion for portfolio and insurance uploads.
+
+Each upload kind declares its columns and how to type them (``SCHEMAS``).
+Every column is read as text and converted once at load time: amounts to
+floats (commas allowed), dates by trying each known format on the distinct
+values. Rows that fail a required column are dropped and reported with
+their row number instead of failing the whole upload.
+
+Files up to ``STREAM_BYTES`` are read in one pass with the pyarrow parser
+when it is installed. Larger files are read ``CHUNK_ROWS`` at a time, so
+only one chunk of raw text is held at once, and files over
+``MAX_UPLOAD_BYTES`` are rejected before parsing.
+"""
+import csv
+import os
+
+import numpy as np
+import pandas as pd
+
+from frames import as_frame, pa
+
+MB = 1024 * 1024
+MAX_UPLOAD_BYTES = int(float(os.environ.get("CSV_MAX_UPLOAD_MB", "50")) * MB)
+STREAM_BYTES = int(float(os.environ.get("CSV_STREAM_MB", "8")) * MB)
+CHUNK_ROWS = 100_000
+MAX_ERRORS = 200  # row errors kept for the report; the count covers all of them
+DATE_FORMATS = ("%Y-%m-%d", "%d-%b-%Y", "%d/%m/%Y", "%d-%m-%Y", "%d-%b-%y")
+
+# column -> (kind, required); undeclared columns are kept as text
+SCHEMAS = {
+    "portfolio": {
+        "Scheme Name": ("text", True),
+        "Investment Amount": ("amount", True),
+    },
+    "insurance": {
+        "Policy Type": ("text", True),
+        "Policy Number": ("text", True),
+        "Premium Amount": ("amount", True),
+        "Due Date": ("date", True),
+        "Client Name": ("text", False),
+        "Email": ("text", False),
+    },
+}
+INVALID = {"amount": "not a number", "date": "not a date", "text": "invalid"}
+
+
+def upload_size(file):
+    """Size in bytes of an uploaded or open file, leaving its position at the start"""
+    size = getattr(file, "size", None)
+    if size is None:
+        file.seek(0, os.SEEK_END)
+        size = file.tell()
+    file.seek(0)
+    return size
+
+
+def _parse_dates(text):
+    """Datetimes for a text column, parsing each distinct value once"""
+    codes, uniques = pd.factorize(text, use_na_sentinel=True)
+    values = pd.Series(uniques, dtype="string").str.strip()
+    dates = pd.Series(pd.NaT, index=values.index, dtype="datetime64[ns]")
+    for fmt in DATE_FORMATS:
+        todo = dates.isna()
+        if not todo.any():
+            break
+        dates[todo] = pd.to_datetime(values[todo], format=fmt, errors="coerce")
+    return pd.Series(np.append(dates.to_numpy(), np.datetime64("NaT", "ns"))[codes], index=text.index)
+
+
+def _convert(chunk, schema, first_row, errors):
+    """Typed copy of one chunk without its invalid rows, appending them to ``errors``"""
+    bad = pd.Series(False, index=chunk.index)
+    for column, (kind, required) in schema.items():
+        if column not in chunk:
+            continue
+        raw = chunk[column]
+        if kind == "amount" and pd.api.types.is_numeric_dtype(raw):
+            # Clean numeric column: the parser already typed it
+            values, invalid = raw.astype("float64"), pd.Series(False, index=chunk.index)
+        elif kind == "date" and not pd.api.types.is_string_dtype(raw):
+            # ISO dates the pyarrow parser already recognised
+            values = pd.to_datetime(raw, errors="coerce").astype("datetime64[ns]")
+            invalid = values.isna() & raw.notna()
+        else:
+            text = raw.astype("string").str.strip().replace("", pd.NA)
+            if kind == "amount":
+                values = pd.to_numeric(text.str.replace(",", "", regex=False), errors="coerce").astype("float64")
+            elif kind == "date":
+                values = _parse_dates(text)
+            else:
+                values = text
+            invalid = values.isna() & text.notna()
+        failed = invalid | (values.isna() if required else False)
+        if failed.any():
+            for idx in failed[failed].index[:max(0, MAX_ERRORS - len(errors))]:
+                errors.append({"row": first_row + idx, "column": column, "value": raw[idx],
+                               "error": INVALID[kind] if invalid[idx] else "missing"})
+            bad |= failed
+        chunk[column] = values
+    return chunk[~bad]
+
+
+def _header(file):
+    """Column names as written on the file's first line, leaving its position at the start"""
+    line = file.readline()
+    file.seek(0)
+    if isinstance(line, bytes):
+        line = line.decode("utf-8-sig", errors="replace")
+    return next(csv.reader([line]), [])
+
+
+def _reader(file, size, schema):
+    # Text columns are read as strings, keeping leading zeros in policy
+    # numbers; amounts and dates are left to the parser's typed fast path.
+    # Names are matched as written, before headers are stripped.
+    text = [name for name in _header(file) if schema.get(name.strip(), ("",))[0] == "text"]
+    if size <= STREAM_BYTES and pa is not None:
+        # pandas' pyarrow engine applies ``dtype`` only after parsing, when
+        # "007" is already 7, so the column types go to pyarrow itself
+        import pyarrow.csv
+
+        options = pyarrow.csv.ConvertOptions(column_types={name: pa.string() for name in text},
+                                             strings_can_be_null=True)
+        yield pyarrow.csv.read_csv(file, convert_options=options).to_pandas()
+    elif size <= STREAM_BYTES:
+        yield pd.read_csv(file, engine="c", dtype={name: "str" for name in text})
+    else:
+        yield from pd.read_csv(file, engine="c", chunksize=CHUNK_ROWS, dtype={name: "str" for name in text})
+
+
+def ingest_csv(file, kind):
+    """Read an uploaded CSV for ``kind``; returns ``(frame, errors, message)``.
+
+    ``frame`` is None when the whole file is rejected, with ``message``
+    saying why. ``errors`` lists up to MAX_ERRORS bad rows (row numbers
+    count data rows from 1) and ``message`` summarises any that were dropped.
+    """
+    schema = SCHEMAS[kind]
+    size = upload_size(file)
+    if size > MAX_UPLOAD_BYTES:
+        return None, [], (f"File is {size / MB:,.1f} MB; uploads are limited to "
+                          f"{MAX_UPLOAD_BYTES / MB:,.0f} MB.")
+    errors, dropped, chunks, rows = [], 0, [], 0
+    try:
+        for chunk in _reader(file, size, schema):
+            chunk.columns = chunk.columns.str.strip()
+            missing = [c for c, (_, required) in schema.items() if required and c not in chunk]
+            if missing:
+                return None, [], f"Missing required columns: {', '.join(missing)}."
+            chunk.index = pd.RangeIndex(len(chunk))
+            typed = _convert(chunk, schema, rows + 1, errors)
+            chunks.append(typed)
+            dropped += len(chunk) - len(typed)
+            rows += len(chunk)
+    except (ValueError, UnicodeDecodeError) as exc:
+        return None, [], f"Could not read the CSV file: {exc}"
+    if not chunks:
+        return None, [], "The CSV file is empty."
+    frame = as_frame(pd.concat(chunks, ignore_index=True), kind)
+    message = None
+    if dropped:
+        message = f"Skipped {dropped:,} of {rows:,} rows with missing or invalid values."
+    return frame, errors, message
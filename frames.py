@@ -0,0 +1,64 @@
+"""Compact columnar frames for session state and storage.
+
+Uploaded portfolio and insurance tables stay DataFrames in memory, with
+low-cardinality text held as categoricals and dates parsed once. On disk
+they are stored as Arrow IPC files, which are memory-mapped on load so
+numeric columns come back without a copy. Without pyarrow, frames fall
+back to the legacy ``df.to_dict()`` JSON layout.
+"""
+import io
+import json
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:  # pragma: no cover - optional dependency
+    pa = None
+
+CATEGORY_RATIO = 0.5  # text columns with at most this share of distinct values become categoricals
+DATE_COLUMNS = {"insurance": ("Due Date",)}
+
+
+def compact_frame(df, dates=()):
+    """Copy of ``df`` with a fresh index, categorical text and parsed date columns"""
+    df = df.reset_index(drop=True)
+    for column in df.columns:
+        values = df[column]
+        if column in dates:
+            df[column] = pd.to_datetime(values, errors="coerce")
+        elif pd.api.types.is_object_dtype(values) or pd.api.types.is_string_dtype(values):
+            if values.nunique(dropna=True) <= max(1, len(values) * CATEGORY_RATIO):
+                df[column] = values.astype("category")
+    return df
+
+
+def as_frame(data, key=None):
+    """DataFrame from a frame, a legacy ``to_dict()`` mapping or a list of records"""
+    if data is None:
+        return None
+    if not isinstance(data, pd.DataFrame):
+        data = pd.DataFrame(data)
+    return compact_frame(data, DATE_COLUMNS.get(key, ()))
+
+
+def encode_frame(df):
+    """Serialize a frame; returns (file extension, payload bytes)"""
+    if pa is None:
+        return "json", df.to_json(date_format="iso").encode("utf-8")
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    return "arrow", sink.getvalue().to_pybytes()
+
+
+def read_arrow(path):
+    """Memory-map an Arrow IPC file into a DataFrame without copying numeric columns"""
+    table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+    return table.to_pandas(split_blocks=True)
+
+
+def read_legacy_json(raw, key=None):
+    return as_frame(json.load(io.BytesIO(raw)), key)
@@ -0,0 +1,106 @@
+"""Financial goal planning: progress, shortfall and required yearly investment.
+
+``goal_plan`` gives the fixed-return annuity; ``simulate_goals`` projects the
+same goals over simulated market paths.
+"""
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+ROI = 0.10  # assumed average annual mutual fund return
+
+
+def goal_plan(goals, roi=ROI):
+    """Goals table with ``Remaining Amount``, ``Progress`` and ``Invest per Year`` added.
+
+    ``goals`` is a list of goal dicts or a frame with ``Goal Type``, ``Goal
+    Amount``, ``Current Amount`` and ``Years``. The yearly investment is the
+    annuity that grows to the remaining amount at ``roi``; it is NaN for goals
+    that are already funded or have no years left.
+    """
+    df = pd.DataFrame(goals).reset_index(drop=True)
+    target = pd.to_numeric(df["Goal Amount"], errors="coerce")
+    current = pd.to_numeric(df["Current Amount"], errors="coerce")
+    years = pd.to_numeric(df["Years"], errors="coerce")
+    remaining = target - current
+    df["Remaining Amount"] = remaining
+    df["Progress"] = (current / target * 100).clip(0, 100).round(1)
+    needed = (remaining > 0) & (years > 0)
+    growth = (1 + roi) ** years.where(needed) - 1
+    df["Invest per Year"] = np.where(needed, remaining * roi / growth, np.nan)
+    return df
+
+
+# Monte Carlo assumptions: yearly returns are lognormal with this mean and volatility
+VOLATILITY = 0.15
+PATHS = 20000
+CONFIDENCE = 0.90
+SEED = 7
+PROJECTION_COLUMNS = ["Goal Type", "Success Chance (%)", "P10 Outcome", "Median Outcome", "P90 Outcome",
+                      "Required per Year", "Monthly SIP"]
+
+
+def return_paths(years, mean=ROI, volatility=VOLATILITY, paths=PATHS, seed=SEED):
+    """Simulated yearly returns, shape (paths, years), with the given arithmetic mean and volatility"""
+    sigma2 = np.log1p((volatility / (1 + mean)) ** 2)
+    mu = np.log1p(mean) - sigma2 / 2
+    rng = np.random.default_rng(seed)
+    return np.expm1(rng.normal(mu, np.sqrt(sigma2), size=(paths, years)))
+
+
+@lru_cache(maxsize=64)
+def _simulate(goals, mean, volatility, paths, seed, confidence):
+    target, current, years, contribution = (np.array(column, dtype=float) for column in zip(*goals))
+    horizon = years.astype(int)
+    returns = return_paths(int(horizon.max()), mean, volatility, paths, seed)
+    # growth[:, t] is the growth of 1 invested at the start over t years
+    growth = np.concatenate([np.ones((paths, 1)), np.cumprod(1 + returns, axis=1)], axis=1)
+    end = growth[:, horizon]  # (paths, goals)
+    # Value at the horizon of 1 paid in at the end of every year
+    annuity = end * np.cumsum(1 / growth[:, 1:], axis=1)[:, horizon - 1]
+    outcome = current * end + contribution * annuity
+    success = (outcome >= target).mean(axis=0) * 100
+    p10, p50, p90 = np.percentile(outcome, [10, 50, 90], axis=0)
+    # Per path, the contribution that just reaches the target; its quantile meets the confidence
+    needed = np.clip((target - current * end) / annuity, 0, None)
+    required = np.quantile(needed, confidence, axis=0)
+    results = np.vstack([success, p10, p50, p90, required])
+    results.flags.writeable = False
+    return results
+
+
+def monthly_sip(yearly, mean=ROI):
+    """Monthly instalment that grows to the same amount as ``yearly`` paid at each year end"""
+    monthly_rate = (1 + mean) ** (1 / 12) - 1
+    return yearly * monthly_rate / ((1 + monthly_rate) ** 12 - 1)
+
+
+def simulate_goals(goals, mean=ROI, volatility=VOLATILITY, paths=PATHS, seed=SEED, confidence=CONFIDENCE):
+    """Monte Carlo projection of every goal over one shared set of return paths.
+
+    Each goal is funded with its current savings plus the ``goal_plan``
+    yearly investment. Returns the success chance with that plan, percentile
+    outcomes, and the yearly investment (and monthly SIP) needed to reach the
+    goal with probability ``confidence``. Results are memoized by the goal
+    parameters, so reruns with unchanged goals cost nothing.
+    """
+    plan = goal_plan(goals, mean)
+    if plan.empty:
+        return pd.DataFrame(columns=PROJECTION_COLUMNS)
+    key = tuple(zip(
+        plan["Goal Amount"].astype(float),
+        plan["Current Amount"].astype(float),
+        plan["Years"].astype(int).clip(lower=1).astype(float),
+        plan["Invest per Year"].fillna(0.0),
+    ))
+    success, p10, p50, p90, required = _simulate(key, mean, volatility, paths, seed, confidence)
+    return pd.DataFrame({
+        "Goal Type": plan["Goal Type"],
+        "Success Chance (%)": success,
+        "P10 Outcome": p10,
+        "Median Outcome": p50,
+        "P90 Outcome": p90,
+        "Required per Year": required,
+        "Monthly SIP": monthly_sip(required, mean),
+    })
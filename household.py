@@ -0,0 +1,167 @@
+"""Household view over several family members' statements.
+
+Statements are parsed in worker processes, one file per task, so a family
+upload takes about as long as its largest file rather than the sum of all
+of them. Both formats the apps accept are read: casparser portfolio
+databases (``folios``) and CAMS transaction statements (``TRXN_DETAILS``).
+Holdings are merged across members by AMFI code, and by scheme name where
+no member's statement gives the code.
+"""
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pandas as pd
+
+from cams_parser import TRANSACTIONS_KEY, aggregate_holdings, transactions_frame
+from mf_portfolio import flatten_folios
+
+WORKERS = int(os.environ.get("HOUSEHOLD_WORKERS", "0")) or None  # None: one per CPU
+HOLDING_COLUMNS = ["member", "scheme", "amfi", "units", "nav", "value", "cost"]
+
+
+def _member_name(name):
+    return os.path.splitext(os.path.basename(name))[0]
+
+
+def parse_statement(name, raw):
+    """Holdings of one statement file as a frame of HOLDING_COLUMNS"""
+    data = json.loads(raw)
+    if "folios" in data:
+        holdings = flatten_folios(data)
+        member = data.get("investor_info", {}).get("name") or _member_name(name)
+        frame = pd.DataFrame({
+            "scheme": holdings["scheme"], "amfi": holdings["amfi"], "units": holdings["units"],
+            "nav": holdings["pdf_nav"], "value": holdings["pdf_value"], "cost": holdings["cost"],
+        })
+    elif TRANSACTIONS_KEY in data:
+        totals = aggregate_holdings(transactions_frame(data[TRANSACTIONS_KEY]))
+        member = _member_name(name)
+        frame = pd.DataFrame({
+            "scheme": totals.index.astype(str), "amfi": None, "units": totals["units"].to_numpy(),
+            "nav": totals["latest_nav"].to_numpy(), "value": totals["value"].to_numpy(), "cost": np.nan,
+        })
+    else:
+        raise ValueError("not a casparser portfolio or CAMS transaction statement")
+    frame.insert(0, "member", member)
+    return frame.reset_index(drop=True)[HOLDING_COLUMNS]
+
+
+def _parse(args):
+    name, raw = args
+    try:
+        return parse_statement(name, raw), None
+    except (ValueError, KeyError, TypeError, AttributeError) as exc:
+        return None, str(exc)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Process-wide parser pool, started once so each upload skips worker start-up.
+
+    Workers are spawned rather than forked: the app process runs background
+    threads, and forking a threaded process can deadlock the child. Spawned
+    workers re-import the entry script, so it must keep its UI under
+    ``if __name__ == "__main__"``.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def _drop_pool(broken):
+    """Forget a broken process-wide pool so ``get_pool`` starts a new one"""
+    global _pool
+    with _pool_lock:
+        if _pool is broken:
+            _pool = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def parse_statements(files, pool=None):
+    """Parse ``(name, raw bytes)`` pairs in parallel; returns ``(frame, error)`` per file, in order.
+
+    If a worker dies (killed by the OS, say) the pool is broken for good: the
+    process-wide pool is replaced and the batch retried once, and if that
+    fails too, or ``pool`` was the caller's own, the files are parsed here.
+    """
+    if len(files) < 2:
+        return [_parse(item) for item in files]
+    for _ in range(2):
+        shared = pool is None
+        current = pool or get_pool()
+        try:
+            return list(current.map(_parse, files))
+        except BrokenProcessPool:
+            if not shared:
+                break
+            _drop_pool(current)
+    return [_parse(item) for item in files]
+
+
+def _scheme_key(schemes):
+    return schemes.astype("string").str.strip().str.lower()
+
+
+def combine(frames):
+    """All members' holdings in one frame, with AMFI codes shared between same-named schemes"""
+    holdings = pd.concat(frames, ignore_index=True)
+    amfi = holdings["amfi"].astype("string").str.strip().replace("", pd.NA)
+    names = _scheme_key(holdings["scheme"])
+    known = pd.Series(amfi.to_numpy(), index=names.to_numpy()).dropna()
+    known = known[~known.index.duplicated()]
+    holdings["amfi"] = amfi.fillna(names.map(known))
+    holdings["key"] = ("amfi:" + holdings["amfi"]).fillna("scheme:" + names)
+    return holdings
+
+
+def revalue(holdings, navs):
+    """Value holdings at ``navs`` ({amfi code: nav}) where a NAV is known"""
+    nav = pd.to_numeric(holdings["amfi"].map(navs), errors="coerce")
+    live = nav.notna() & (nav > 0)
+    holdings = holdings.copy()
+    holdings["nav"] = nav.where(live, holdings["nav"])
+    holdings["value"] = (holdings["units"] * nav).where(live, holdings["value"])
+    holdings["live"] = live
+    return holdings
+
+
+def household_view(holdings):
+    """One row per scheme across the household, largest value first"""
+    merged = holdings.groupby("key", sort=False).agg(
+        scheme=("scheme", "first"), amfi=("amfi", "first"), units=("units", "sum"),
+        value=("value", "sum"), cost=("cost", "sum"), costed=("cost", "count"), rows=("cost", "size"),
+        members=("member", "nunique"),
+    )
+    merged["cost"] = merged["cost"].where(merged["costed"] > 0)
+    merged["nav"] = merged["value"] / merged["units"].where(merged["units"] != 0)
+    # Gain only where every member's statement gives a cost
+    merged["gain"] = (merged["value"] - merged["cost"]).where(merged["costed"] == merged["rows"])
+    return merged.drop(columns=["costed", "rows"]).sort_values("value", ascending=False)
+
+
+def member_totals(holdings):
+    """Value, cost and scheme count per member"""
+    totals = holdings.groupby("member", sort=False).agg(
+        schemes=("key", "nunique"), value=("value", "sum"), cost=("cost", "sum"), costed=("cost", "count"),
+    )
+    totals["cost"] = totals["cost"].where(totals["costed"] > 0)
+    return totals.drop(columns="costed")
+
+
+def member_breakdown(holdings):
+    """Value of each scheme (rows) held by each member (columns)"""
+    breakdown = holdings.pivot_table(index="key", columns="member", values="value",
+                                     aggfunc="sum", fill_value=0.0, sort=False)
+    breakdown.index = holdings.groupby("key", sort=False)["scheme"].first().reindex(breakdown.index)
+    breakdown.columns.name = None
+    return breakdown
@@ -0,0 +1,246 @@
+"""In-process timers, counters and latency histograms.
+
+Disabled unless ``CAPITAL_CARTEL_METRICS`` is set. When disabled, ``timed``
+returns the function it decorates unchanged and ``timer`` returns a shared
+no-op context, so instrumented code pays only a flag check. When enabled,
+samples accumulate per process and can be shown in the admin panel or
+written as Prometheus text (for the node_exporter textfile collector).
+Each process started with ``start_writer`` rewrites its own file next to
+``CAPITAL_CARTEL_METRICS_FILE`` from a background thread, so page reruns
+never write and processes never overwrite each other's counters.
+"""
+import atexit
+import bisect
+import functools
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+ENABLED = os.environ.get("CAPITAL_CARTEL_METRICS", "").lower() in ("1", "true", "yes", "on")
+METRICS_FILE = os.environ.get("CAPITAL_CARTEL_METRICS_FILE")
+PREFIX = "capital_cartel_"
+WRITE_EVERY = float(os.environ.get("CAPITAL_CARTEL_METRICS_WRITE_SECONDS", "15"))
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_lock = threading.Lock()
+_counters = {}    # (name, labels) -> value
+_histograms = {}  # (name, labels) -> [bucket counts..., +Inf count, sum]
+_NOOP = nullcontext()
+_writer = None  # (file, stop event) of this process's writer thread
+_writer_lock = threading.Lock()
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, amount=1, **labels):
+    """Add ``amount`` to a counter"""
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def observe(name, seconds, **labels):
+    """Record one duration in a histogram"""
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    slot = bisect.bisect_left(BUCKETS, seconds)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = [0] * (len(BUCKETS) + 2)
+        hist[slot] += 1
+        hist[-1] += seconds
+
+
+@contextmanager
+def _timer(name, labels):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started, **labels)
+
+
+def timer(name, **labels):
+    """Context manager timing its block into histogram ``name``"""
+    return _timer(name, labels) if ENABLED else _NOOP
+
+
+def timed(name, **labels):
+    """Decorator timing every call into histogram ``name``; a no-op when disabled"""
+    def decorate(fn):
+        if not ENABLED:
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                observe(name, time.perf_counter() - started, **labels)
+        return wrapper
+    return decorate
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+def counters():
+    """{(name, labels): value} snapshot"""
+    with _lock:
+        return dict(_counters)
+
+
+def quantile(hist, q):
+    """Upper bucket bound containing quantile ``q`` of a histogram (inf if beyond the last)"""
+    total = sum(hist[:-1])
+    if not total:
+        return float("nan")
+    rank = q * total
+    seen = 0
+    for bound, count in zip(BUCKETS + (float("inf"),), hist[:-1]):
+        seen += count
+        if seen >= rank:
+            return bound
+    return float("inf")
+
+
+def histogram_summary():
+    """One dict per histogram series: name, labels, count, mean, p50 and p95 (seconds)"""
+    with _lock:
+        histograms = {key: list(hist) for key, hist in _histograms.items()}
+    rows = []
+    for (name, labels), hist in sorted(histograms.items()):
+        count = sum(hist[:-1])
+        rows.append({
+            "name": name, "labels": ", ".join(f"{k}={v}" for k, v in labels), "count": count,
+            "mean": hist[-1] / count if count else float("nan"),
+            "p50": quantile(hist, 0.5), "p95": quantile(hist, 0.95),
+        })
+    return rows
+
+
+def ratio(name, numerator="hit", label="result"):
+    """Share of counter ``name`` whose ``label`` equals ``numerator`` (None without samples)"""
+    total = hit = 0
+    for (counter, labels), value in counters().items():
+        if counter == name:
+            total += value
+            hit += value if dict(labels).get(label) == numerator else 0
+    return hit / total if total else None
+
+
+def _labels(labels, extra=()):
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def prometheus_text(**labels):
+    """All metrics in the Prometheus text exposition format, with ``labels`` added to every series"""
+    common = sorted((name, value) for name, value in labels.items())
+    with _lock:
+        counter_items = sorted(_counters.items())
+        histogram_items = sorted((key, list(hist)) for key, hist in _histograms.items())
+    lines = []
+    declared = set()
+    for (name, labels), value in counter_items:
+        metric = PREFIX + name
+        if metric not in declared:
+            lines.append(f"# TYPE {metric} counter")
+            declared.add(metric)
+        lines.append(f"{metric}{_labels(labels, common)} {value}")
+    for (name, labels), hist in histogram_items:
+        metric = PREFIX + name
+        if metric not in declared:
+            lines.append(f"# TYPE {metric} histogram")
+            declared.add(metric)
+        cumulative = 0
+        for bound, count in zip(BUCKETS + (float("inf"),), hist[:-1]):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f"{metric}_bucket{_labels(labels, [*common, ('le', le)])} {cumulative}")
+        lines.append(f"{metric}_sum{_labels(labels, common)} {hist[-1]}")
+        lines.append(f"{metric}_count{_labels(labels, common)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path=METRICS_FILE, **labels):
+    """Atomically write ``prometheus_text(**labels)`` to ``path``; a no-op when disabled or unset"""
+    if not ENABLED or not path:
+        return False
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".metrics.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(prometheus_text(**labels))
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return True
+
+
+def process_file(path, app):
+    """This process's own file for ``path``: ``metrics.prom`` becomes ``metrics.<app>.<pid>.prom``"""
+    root, ext = os.path.splitext(path)
+    return f"{root}.{app}.{os.getpid()}{ext or '.prom'}"
+
+
+def start_writer(app, path=METRICS_FILE, interval=WRITE_EVERY):
+    """Write this process's metrics every ``interval`` seconds from a daemon thread (idempotent).
+
+    The file is ``process_file(path, app)`` and every series carries ``app``
+    and ``pid`` labels, so the textfile collector can read each process's
+    file side by side. Returns the file written, or None when disabled or
+    no path is set.
+    """
+    global _writer
+    if not ENABLED or not path:
+        return None
+    with _writer_lock:
+        if _writer is None:
+            target = process_file(path, app)
+            labels = {"app": app, "pid": os.getpid()}
+            stop = threading.Event()
+
+            def loop():
+                while not stop.wait(interval):
+                    try:
+                        write_prometheus(target, **labels)
+                    except OSError:
+                        pass  # an unwritable directory is retried on the next tick
+
+            threading.Thread(target=loop, name="metrics-writer", daemon=True).start()
+            _writer = (target, stop)
+            atexit.register(stop_writer)
+        return _writer[0]
+
+
+def stop_writer():
+    """Stop the writer thread and remove its file, so a stopped process's series end with it"""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            return
+        path, stop = _writer
+        _writer = None
+    stop.set()
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,104 @@
+"""Holdings table and valuation for casparser-style portfolio databases."""
+import numpy as np
+import pandas as pd
+
+HOLDING_COLUMNS = ["folio", "scheme", "amfi", "isin", "units", "pdf_nav", "pdf_value", "cost"]
+
+# casparser transaction types that move no money in or out of the portfolio,
+# and those whose amount is money received rather than money invested
+NO_CASH_TYPES = {"DIVIDEND_REINVEST", "SEGREGATION", "MISC", "UNKNOWN"}
+PAYOUT_TYPES = {"DIVIDEND_PAYOUT"}
+
+
+def flatten_folios(data):
+    """One row per scheme held across all folios of a portfolio database"""
+    rows = []
+    for folio in data.get('folios', []):
+        for scheme in folio.get('schemes', []):
+            valuation = scheme.get('valuation', {})
+            rows.append((
+                folio.get('folio'),
+                scheme.get('scheme'),
+                scheme.get('amfi'),  # casparser usually finds this
+                scheme.get('isin'),
+                valuation.get('units', 0),
+                valuation.get('nav', 0),
+                valuation.get('value', 0),
+                valuation.get('cost', 0),
+            ))
+    holdings = pd.DataFrame(rows, columns=HOLDING_COLUMNS)
+    for column in ("units", "pdf_nav", "pdf_value", "cost"):
+        holdings[column] = pd.to_numeric(holdings[column], errors="coerce").fillna(0.0)
+    return holdings
+
+
+def value_holdings(holdings, nav):
+    """Value every holding at ``nav`` (aligned to the holdings index).
+
+    Rows without a usable NAV keep the value and NAV from the statement.
+    Returns the holdings with ``live``, ``nav``, ``value`` and ``gain``
+    columns added.
+    """
+    nav = pd.to_numeric(pd.Series(nav, index=holdings.index), errors="coerce")
+    live = nav.notna() & (nav > 0)
+    valued = holdings.copy()
+    valued["live"] = live
+    valued["nav"] = np.where(live, nav, holdings["pdf_nav"])
+    valued["value"] = np.where(live, holdings["units"] * nav, holdings["pdf_value"])
+    valued["gain"] = np.where(live & (holdings["cost"] > 0), valued["value"] - holdings["cost"], 0.0)
+    return valued
+
+
+def scheme_flows(data):
+    """Dated cash flows per holding row, in the same row order as flatten_folios.
+
+    casparser records purchases with positive amounts and redemptions with
+    negative ones; flows are returned investor-side, so money invested is
+    negative and money received positive.
+    """
+    rows = []
+    position = 0
+    for folio in data.get('folios', []):
+        for scheme in folio.get('schemes', []):
+            for txn in scheme.get('transactions', []) or []:
+                kind = str(txn.get('type', '')).upper()
+                if kind in NO_CASH_TYPES or txn.get('amount') in (None, ""):
+                    continue
+                amount = float(txn['amount'])
+                rows.append((position, txn.get('date'), abs(amount) if kind in PAYOUT_TYPES else -amount))
+            position += 1
+    flows = pd.DataFrame(rows, columns=["scheme", "date", "amount"])
+    flows["date"] = pd.to_datetime(flows["date"], errors="coerce")
+    return flows.dropna(subset=["date"])
+
+
+def unit_balances(data):
+    """Opening units per holding row and dated unit balances, in flatten_folios row order.
+
+    Returns ``(opening, balances)``: ``opening`` is each holding's units
+    before its first transaction (the statement's opening balance, or its
+    closing units if it lists no transactions) and ``balances`` has one row
+    per transaction with the units held after it. casparser's running
+    ``balance`` is used where given, else the transaction units are summed.
+    """
+    opening, rows = [], []
+    position = 0
+    for folio in data.get('folios', []):
+        for scheme in folio.get('schemes', []):
+            txns = scheme.get('transactions') or []
+            units = scheme.get('open') if txns else scheme.get('valuation', {}).get('units')
+            balance = float(units or 0)
+            opening.append(balance)
+            for txn in txns:
+                if txn.get('balance') not in (None, ""):
+                    balance = float(txn['balance'])
+                elif txn.get('units') not in (None, ""):
+                    balance += float(txn['units'])
+                else:
+                    continue
+                rows.append((position, txn.get('date'), balance))
+            position += 1
+    balances = pd.DataFrame(rows, columns=["scheme", "date", "units"])
+    balances["date"] = pd.to_datetime(balances["date"], errors="coerce")
+    balances = balances.dropna(subset=["date"]).sort_values(["scheme", "date"], kind="stable")
+    return np.array(opening, dtype="float64"), balances.reset_index(drop=True)
@@ -0,0 +1,227 @@
+"""On-disk NAV cache shared by every session and process.
+
+Quotes are stored in SQLite keyed by AMFI code and NAV date. Entries do not
+expire on a fixed TTL: AMFI publishes one NAV per business day, so a quote
+stays fresh until the next publication is due. The cache is size-capped
+and evicts the least recently used quotes first. Reads never write: access
+times are noted in memory, at most once per ``TOUCH_EVERY`` per code, and
+written in batches, so concurrent readers do not queue on SQLite's write
+lock. Access times still pending when a process exits are lost, which only
+makes eviction slightly less exact.
+"""
+import os
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+
+import metrics
+from nav_fetch import quote_nav, unique_codes
+
+NAV_CACHE_FILE = os.environ.get("NAV_CACHE_FILE", "nav_cache.db")
+MAX_ENTRIES = 50000
+EVICT_EVERY = 64  # check the size cap once per this many writes
+SQL_BATCH = 500  # codes per IN (...) query
+TOUCH_EVERY = 300  # seconds between access-time updates for the same code
+TOUCH_BATCH = 256  # pending access times that trigger a write
+
+# AMFI publishes the day's NAVs by 11 PM IST on business days
+IST = timezone(timedelta(hours=5, minutes=30))
+PUBLISH_TIME = (23, 0)
+NAV_DATE_FORMATS = ("%d-%b-%Y", "%d-%m-%Y", "%Y-%m-%d", "%d/%m/%Y")
+
+
+def _holidays():
+    raw = os.environ.get("AMFI_HOLIDAYS", "")
+    return {date.fromisoformat(d.strip()) for d in raw.split(",") if d.strip()}
+
+
+HOLIDAYS = _holidays()
+
+
+def is_business_day(day, holidays=HOLIDAYS):
+    return day.weekday() < 5 and day not in holidays
+
+
+def publication_time(day):
+    """Moment the NAV for a given business day is due to be published"""
+    return datetime(day.year, day.month, day.day, *PUBLISH_TIME, tzinfo=IST)
+
+
+def expected_nav_date(now=None, holidays=HOLIDAYS):
+    """Latest NAV date that AMFI should have published by ``now``"""
+    now = (now or datetime.now(IST)).astimezone(IST)
+    day = now.date()
+    if now < publication_time(day):
+        day -= timedelta(days=1)
+    while not is_business_day(day, holidays):
+        day -= timedelta(days=1)
+    return day
+
+
+def next_publication(now=None, holidays=HOLIDAYS):
+    """Moment the next NAV after ``now`` is due to be published"""
+    now = (now or datetime.now(IST)).astimezone(IST)
+    day = expected_nav_date(now, holidays) + timedelta(days=1)
+    while not is_business_day(day, holidays):
+        day += timedelta(days=1)
+    return publication_time(day)
+
+
+def parse_nav_date(text):
+    for fmt in NAV_DATE_FORMATS:
+        try:
+            return datetime.strptime(str(text).strip(), fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+class NavCache:
+    """SQLite-backed NAV quote cache, safe to share across threads and processes"""
+
+    def __init__(self, path=NAV_CACHE_FILE, max_entries=MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._writes = 0
+        self._touch_lock = threading.Lock()
+        self._touched = {}  # code -> when its access time was last noted
+        self._pending = {}  # (code, nav_date) -> access time not yet written
+        self._flushed = time.time()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS nav_quotes (
+                    amfi_code TEXT NOT NULL,
+                    nav_date TEXT NOT NULL,
+                    nav REAL NOT NULL,
+                    last_updated TEXT NOT NULL,
+                    checked_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL,
+                    PRIMARY KEY (amfi_code, nav_date)
+                )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS nav_quotes_accessed ON nav_quotes (accessed_at)")
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def latest(self, amfi_code):
+        """Most recent cached quote for a code as a dict, or None"""
+        code = str(amfi_code).strip()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT nav, last_updated, nav_date, checked_at FROM nav_quotes "
+                "WHERE amfi_code = ? ORDER BY nav_date DESC LIMIT 1", (code,)
+            ).fetchone()
+        if row is None:
+            return None
+        self._touch([(code, row[2])])
+        return {"nav": row[0], "last_updated": row[1], "nav_date": date.fromisoformat(row[2]), "checked_at": row[3]}
+
+    def fresh(self, amfi_codes, force=False, now=None):
+        """{code: (nav, last_updated)} for every code whose latest cached quote is usable (see ``usable``)"""
+        codes = unique_codes(amfi_codes)
+        latest = {}
+        with self._connect() as conn:
+            for start in range(0, len(codes), SQL_BATCH):
+                chunk = codes[start:start + SQL_BATCH]
+                rows = conn.execute(
+                    "SELECT amfi_code, nav, last_updated, nav_date, checked_at FROM nav_quotes "
+                    f"WHERE amfi_code IN ({','.join('?' * len(chunk))}) ORDER BY nav_date", chunk)
+                for code, nav, last_updated, nav_date, checked_at in rows:
+                    latest[code] = {"nav": nav, "last_updated": last_updated,
+                                    "nav_date": date.fromisoformat(nav_date), "checked_at": checked_at}
+        found = {code: entry for code, entry in latest.items() if self.usable(entry, force, now)}
+        self._touch([(code, entry["nav_date"].isoformat()) for code, entry in found.items()])
+        return {code: (entry["nav"], entry["last_updated"]) for code, entry in found.items()}
+
+    def put(self, amfi_code, nav, last_updated, checked_at=None):
+        self.put_many([(amfi_code, nav, last_updated)], checked_at)
+
+    def put_many(self, quotes, checked_at=None):
+        """Store (amfi_code, nav, last_updated) quotes in one transaction"""
+        checked_at = checked_at or time.time()
+        rows = []
+        for amfi_code, nav, last_updated in quotes:
+            nav_date = parse_nav_date(last_updated)
+            if nav_date is None:
+                # Unknown date format: assume it is the NAV due when we checked
+                nav_date = expected_nav_date(datetime.fromtimestamp(checked_at, IST))
+            rows.append((str(amfi_code).strip(), nav_date.isoformat(), float(nav), str(last_updated),
+                         checked_at, checked_at))
+        with self._connect() as conn:
+            conn.executemany("INSERT OR REPLACE INTO nav_quotes VALUES (?, ?, ?, ?, ?, ?)", rows)
+        before, self._writes = self._writes, self._writes + len(rows)
+        if self._writes // EVICT_EVERY > before // EVICT_EVERY:
+            self.evict()
+
+    def _touch(self, keys):
+        """Note reads of ``(code, nav_date)`` quotes; access times are written in batches"""
+        now = time.time()
+        with self._touch_lock:
+            for key in keys:
+                if now - self._touched.get(key[0], 0.0) >= TOUCH_EVERY:
+                    self._touched[key[0]] = now
+                    self._pending[key] = now
+            due = len(self._pending) >= TOUCH_BATCH or (self._pending and now - self._flushed >= TOUCH_EVERY)
+        if due:
+            self.flush_touches()
+
+    def flush_touches(self):
+        """Write pending access times in one transaction; returns how many were written"""
+        with self._touch_lock:
+            pending, self._pending = self._pending, {}
+            self._flushed = time.time()
+        if pending:
+            with self._connect() as conn:
+                conn.executemany(
+                    "UPDATE nav_quotes SET accessed_at = MAX(accessed_at, ?) WHERE amfi_code = ? AND nav_date = ?",
+                    [(accessed, code, nav_date) for (code, nav_date), accessed in pending.items()],
+                )
+        return len(pending)
+
+    def evict(self):
+        """Trim the cache to ``max_entries`` by dropping least recently used quotes"""
+        self.flush_touches()
+        with self._connect() as conn:
+            (count,) = conn.execute("SELECT COUNT(*) FROM nav_quotes").fetchone()
+            excess = count - self.max_entries
+            if excess > 0:
+                conn.execute(
+                    "DELETE FROM nav_quotes WHERE rowid IN "
+                    "(SELECT rowid FROM nav_quotes ORDER BY accessed_at LIMIT ?)", (excess,)
+                )
+        return max(excess, 0)
+
+    def usable(self, entry, force=False, now=None):
+        """Decide whether a cached entry can be served without the network.
+
+        A quote for the latest expected NAV date is always fresh. An older
+        quote that was re-checked after the latest publication (AMFI was late,
+        or the scheme did not publish) is served too, unless ``force`` is set.
+        """
+        if entry is None:
+            return False
+        now = (now or datetime.now(IST)).astimezone(IST)
+        expected = expected_nav_date(now)
+        if entry["nav_date"] >= expected:
+            return True
+        return not force and entry["checked_at"] >= publication_time(expected).timestamp()
+
+    def fetch(self, obj_mftool, amfi_code, force=False, fetch=quote_nav):
+        """Return (nav, nav_date), using the cache first and the network if stale"""
+        entry = self.latest(amfi_code)
+        if self.usable(entry, force):
+            metrics.inc("nav_cache_total", result="hit")
+            return entry["nav"], entry["last_updated"]
+        metrics.inc("nav_cache_total", result="miss")
+        with metrics.timer("nav_quote_seconds"):
+            nav, last_updated = fetch(obj_mftool, amfi_code)
+        self.put(amfi_code, nav, last_updated)
+        return nav, last_updated
@@ -0,0 +1,104 @@
+"""Batched NAV lookups for the live portfolio dashboard.
+
+NAVs are fetched once per unique AMFI code through a bounded thread pool.
+The quote source is any object with an mftool-style ``get_scheme_quote``
+method, so a local fake can stand in for ``Mftool`` when testing.
+"""
+import math
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+DEFAULT_WORKERS = 8
+DEFAULT_TIMEOUT = 15.0   # seconds allowed for a single quote request
+DEFAULT_RETRIES = 2      # extra attempts after the first failure
+DEFAULT_BACKOFF = 0.5    # seconds, doubled on every retry
+
+
+def quote_nav(obj_mftool, amfi_code):
+    """Return (nav, nav_date) for one AMFI code, raising if no quote is found"""
+    quote = obj_mftool.get_scheme_quote(str(amfi_code))
+    if not quote or not quote.get("nav"):
+        raise LookupError(f"No NAV quote for AMFI code {amfi_code}")
+    return float(quote["nav"]), quote["last_updated"]
+
+
+def unique_codes(amfi_codes):
+    """Drop empty codes and duplicates while keeping first-seen order"""
+    seen = {}
+    for code in amfi_codes:
+        if code in (None, ""):
+            continue
+        seen.setdefault(str(code).strip(), None)
+    return [code for code in seen if code]
+
+
+def fetch_navs(amfi_codes, obj_mftool, fetch=quote_nav, max_workers=DEFAULT_WORKERS,
+               timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF,
+               on_progress=None):
+    """Fetch NAVs for many AMFI codes concurrently.
+
+    Returns a dict mapping each unique code to ``(nav, nav_date)``, or to
+    ``(None, None)`` when every attempt failed or timed out.
+    ``on_progress(done, total, code)`` is called as each code finishes.
+
+    A request that never returns keeps its pool thread, so queued requests
+    may never start; the whole call is therefore also bounded by a deadline
+    of every attempt of every batch of ``max_workers`` codes timing out.
+    """
+    codes = unique_codes(amfi_codes)
+    results = {}
+    if not codes:
+        return results
+
+    total = len(codes)
+    started = {}
+    workers = max(1, min(max_workers, total))
+    attempt_budget = timeout * (retries + 1) + backoff * (2 ** retries - 1)
+    deadline = time.monotonic() + attempt_budget * math.ceil(total / workers)
+
+    def attempt(code, tries):
+        # Retries sleep inside the worker so the collecting loop never blocks
+        started.pop(code, None)
+        if tries:
+            time.sleep(backoff * (2 ** (tries - 1)))
+        started[code] = time.monotonic()
+        return fetch(obj_mftool, code)
+
+    def finish(code, value):
+        results[code] = value
+        if on_progress:
+            on_progress(len(results), total, code)
+
+    pool = ThreadPoolExecutor(max_workers=workers)
+    try:
+        pending = {pool.submit(attempt, code, 0): (code, 0) for code in codes}
+        while pending:
+            done, _ = wait(pending, timeout=min(timeout, 1.0, max(deadline - time.monotonic(), 0)),
+                           return_when=FIRST_COMPLETED)
+            now = time.monotonic()
+            retry = []
+            for future in done:
+                code, tries = pending.pop(future)
+                try:
+                    finish(code, future.result())
+                except Exception:
+                    retry.append((code, tries))
+            # A request that has been running too long is abandoned; the pool
+            # thread finishes on its own but its result is ignored
+            for future, (code, tries) in list(pending.items()):
+                began = started.get(code)
+                if future.running() and began is not None and now - began > timeout:
+                    del pending[future]
+                    retry.append((code, tries))
+            if now >= deadline:
+                # Out of time: give up on everything still running or queued
+                retry += list(pending.values())
+                pending.clear()
+            for code, tries in retry:
+                if tries < retries and now < deadline:
+                    pending[pool.submit(attempt, code, tries + 1)] = (code, tries + 1)
+                else:
+                    finish(code, (None, None))
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    return results
@@ -0,0 +1,205 @@
+"""Local NAV history: one memory-mapped, date-aligned array per AMFI code.
+
+Each code has a file of float64 NAVs where element ``i`` is the NAV on day
+``EPOCH + i``, NaN where none is known (weekends, holidays, gaps). Every
+code's array is aligned to the same calendar, so a date range is the same
+slice of each file and reading it is a memory-mapped copy, not a search.
+Files only grow: later dates are appended, earlier gaps are filled, and a
+NAV already stored is never rewritten.
+
+History is loaded from AMFI's NAV history reports or any file in the
+NAVAll.txt format (a URL or a local path, see ``amfi_master``), and the
+background NAV refresher appends each day's NAVs as they are published.
+
+    python nav_history.py load FILE_OR_URL [...]
+    python nav_history.py show AMFI_CODE [days]
+"""
+import os
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+
+import metrics
+
+NAV_HISTORY_DIR = os.environ.get("NAV_HISTORY_DIR", "nav_history")
+EPOCH = np.datetime64("2000-01-01", "D")
+LOOKBACK_DAYS = 31  # how far before a range the last known NAV is looked for
+ITEM = np.dtype("float64").itemsize
+
+
+def day_index(dates):
+    """Days since EPOCH for each date, as int64"""
+    days = pd.DatetimeIndex(pd.to_datetime(dates)).to_numpy("datetime64[D]")
+    return (days - EPOCH).astype("int64")
+
+
+def forward_fill(values):
+    """Carry the last known value forward along the last axis; leading gaps stay NaN"""
+    positions = np.where(np.isnan(values), 0, np.arange(values.shape[-1]))
+    np.maximum.accumulate(positions, axis=-1, out=positions)
+    return np.take_along_axis(values, positions, axis=-1)
+
+
+def _code(amfi_code):
+    try:
+        return int(float(amfi_code))
+    except (TypeError, ValueError):
+        return None
+
+
+class NavHistory:
+    """Daily NAVs per AMFI code, one append-only file each under ``directory``"""
+
+    def __init__(self, directory=NAV_HISTORY_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._maps = {}  # code -> (file size, read-only memmap)
+
+    def path(self, code):
+        return os.path.join(self.directory, f"{code}.f64")
+
+    def _array(self, code):
+        """Read-only view of a code's file, re-mapped when the file has grown; None if absent"""
+        try:
+            size = os.path.getsize(self.path(code))
+        except OSError:
+            return None
+        if size < ITEM:
+            return None
+        with self._lock:
+            cached = self._maps.get(code)
+            if cached is None or cached[0] != size:
+                cached = (size, np.memmap(self.path(code), dtype="float64", mode="r", shape=(size // ITEM,)))
+                self._maps[code] = cached
+        return cached[1]
+
+    def has(self, amfi_code):
+        code = _code(amfi_code)
+        return code is not None and self._array(code) is not None
+
+    def codes(self):
+        """AMFI codes with stored history"""
+        return sorted(int(name[:-4]) for name in os.listdir(self.directory)
+                      if name.endswith(".f64") and name[:-4].isdigit())
+
+    def append(self, amfi_code, dates, navs):
+        """Store NAVs for dates not yet known; returns how many were new"""
+        code = _code(amfi_code)
+        days = day_index(dates)
+        navs = np.asarray(navs, dtype="float64")
+        keep = (days >= 0) & np.isfinite(navs) & (navs > 0)
+        if code is None or not keep.any():
+            return 0
+        days, navs = days[keep], navs[keep]
+        path = self.path(code)
+        with self._lock:
+            length = os.path.getsize(path) // ITEM if os.path.exists(path) else 0
+            end = int(days.max()) + 1
+            if end > length:
+                # Grow the file with NaN up to the newest date
+                with open(path, "ab") as f:
+                    f.write(np.full(end - length, np.nan).tobytes())
+            stored = np.memmap(path, dtype="float64", mode="r+", shape=(max(length, end),))
+            new = np.isnan(stored[days])
+            stored[days[new]] = navs[new]
+            stored.flush()
+            del stored
+        metrics.inc("nav_history_values_total", int(new.sum()))
+        return int(new.sum())
+
+    def append_frame(self, df):
+        """Store rows with ``amfi_code``, ``nav`` and ``nav_date`` columns; returns how many were new"""
+        df = df.dropna(subset=["amfi_code", "nav", "nav_date"])
+        return sum(self.append(code, rows["nav_date"], rows["nav"])
+                   for code, rows in df.groupby("amfi_code", sort=False))
+
+    def append_quotes(self, quotes):
+        """Store ``(amfi_code, nav, last_updated)`` quotes as returned by the NAV fetchers"""
+        from nav_cache import parse_nav_date
+
+        df = pd.DataFrame(quotes, columns=["amfi_code", "nav", "nav_date"])
+        df["nav"] = pd.to_numeric(df["nav"], errors="coerce")
+        df["nav_date"] = pd.to_datetime(df["nav_date"].map(parse_nav_date))
+        return self.append_frame(df)
+
+    def load_source(self, source):
+        """Store every NAV in an AMFI-format file or URL; returns ``(codes, new values)``"""
+        from amfi_master import parse_nav_rows, read_source
+
+        df = parse_nav_rows(read_source(source))
+        return df["amfi_code"].nunique(), self.append_frame(df)
+
+    @metrics.timed("nav_history_seconds", op="navs")
+    def navs(self, amfi_codes, start, end):
+        """``(dates, navs)``: each day from ``start`` to ``end`` and a (codes x days) NAV array.
+
+        Days without a NAV carry the last one forward, looking up to
+        LOOKBACK_DAYS before ``start``; codes without history are all NaN.
+        """
+        dates = pd.date_range(pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize(), freq="D")
+        first, last = day_index(dates[[0, -1]]) if len(dates) else (0, -1)
+        # Days before EPOCH stay NaN, so the window is always as wide as the lookback plus dates
+        lo = first - LOOKBACK_DAYS
+        skip = max(-lo, 0)
+        window = np.full((len(amfi_codes), last - lo + 1), np.nan)
+        for row, amfi_code in enumerate(amfi_codes):
+            code = _code(amfi_code)
+            stored = self._array(code) if code is not None else None
+            if stored is not None and last >= 0:
+                part = stored[lo + skip:last + 1]
+                window[row, skip:skip + len(part)] = part
+        navs = forward_fill(window)[:, window.shape[1] - len(dates):]
+        return dates, navs
+
+
+def value_series(opening, balances, navs, dates):
+    """Daily portfolio value: units held each day times that day's NAV, summed over holdings.
+
+    ``opening`` is each holding's units before its first dated balance and
+    ``balances`` has ``scheme`` (holding row), ``date`` and ``units``
+    (balance after that transaction), as ``mf_portfolio.unit_balances``
+    returns. ``navs`` is aligned to ``dates`` as ``NavHistory.navs``
+    returns. A holding adds nothing on days without a NAV.
+    """
+    units = np.full(navs.shape, np.nan)
+    if len(dates):
+        units[:, 0] = opening
+        # Balances dated before the range land on its first day; the latest wins
+        position = dates.searchsorted(balances["date"].to_numpy("datetime64[ns]"))
+        moves = pd.DataFrame({"scheme": balances["scheme"].to_numpy(), "day": position,
+                              "units": balances["units"].to_numpy("float64")})
+        moves = moves[moves["day"] < len(dates)].drop_duplicates(["scheme", "day"], keep="last")
+        units[moves["scheme"].to_numpy(), moves["day"].to_numpy()] = moves["units"].to_numpy()
+    values = forward_fill(units) * navs
+    return pd.Series(np.nansum(values, axis=0), index=dates, name="value")
+
+
+_history = None
+_history_lock = threading.Lock()
+
+
+def get_history():
+    """Process-wide NAV history"""
+    global _history
+    with _history_lock:
+        if _history is None:
+            _history = NavHistory()
+    return _history
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] not in ("load", "show"):
+        sys.exit(__doc__)
+    history = NavHistory()
+    if sys.argv[1] == "load":
+        for source in sys.argv[2:]:
+            codes, added = history.load_source(source)
+            print(f"{source}: {added:,} new NAVs for {codes:,} schemes")
+    else:
+        days = int(sys.argv[3]) if len(sys.argv) > 3 else 30
+        end = pd.Timestamp.today().normalize()
+        dates, navs = history.navs([sys.argv[2]], end - pd.Timedelta(days=days), end)
+        print(pd.Series(navs[0], index=dates, name="nav").to_string())
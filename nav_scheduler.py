@@ -0,0 +1,280 @@
+"""Background NAV refresh for every scheme held by any client.
+
+Dashboards register the AMFI codes they show with ``hold``. Once AMFI has
+published each day's NAVs (see ``next_publication``) the scheduler refreshes
+every held code from the NAV master file, falling back to per-scheme quotes
+for codes the file does not cover, writes them to the shared NAV cache and
+appends them to the NAV history. Dashboards then read precomputed NAVs with
+``NavCache.fresh`` instead of waiting on the network.
+
+It runs as a daemon thread inside the app (``get_scheduler``) or as a
+sidecar; set ``NAV_SCHEDULER=off`` in the app when a sidecar runs it.
+Processes share the schedule through the NAV cache database, and a lease
+lets only one of them refresh a given NAV date.
+
+    python nav_scheduler.py run       # refresh after every publication
+    python nav_scheduler.py once      # refresh now, even if already done today
+    python nav_scheduler.py status
+"""
+import logging
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+from datetime import date, datetime
+
+import metrics
+from nav_cache import IST, NavCache, expected_nav_date, next_publication, parse_nav_date
+from nav_fetch import fetch_navs, unique_codes
+
+NAV_SCHEDULER = os.environ.get("NAV_SCHEDULER", "thread")
+HOLD_DAYS = 90  # codes no dashboard has shown for this long are dropped
+RETRY_EVERY = 1800  # seconds between attempts while AMFI is late or a refresh failed
+LEASE_SECONDS = 900  # a refresh not finished by then may be taken over
+CHECK_EVERY = 600  # longest sleep, so schedule changes by other processes are noticed
+STATUS_COLUMNS = ("state", "nav_date", "started_at", "finished_at", "codes", "refreshed",
+                  "failed", "error", "retry_at", "lease_until", "owner")
+
+log = logging.getLogger(__name__)
+
+
+def _mftool():
+    from mftool import Mftool
+    return Mftool()
+
+
+def _timestamp(now):
+    return (now or datetime.now(IST)).timestamp()
+
+
+class NavScheduler:
+    """Held AMFI codes, the refresh schedule and its status, stored beside the NAV cache"""
+
+    def __init__(self, cache=None, source=None, quotes=_mftool):
+        self.cache = cache or NavCache()
+        self.path = self.cache.path
+        self.source = source
+        self.quotes = quotes
+        self._local = threading.local()
+        self._stop = None
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS held_codes (
+                    amfi_code TEXT PRIMARY KEY,
+                    last_seen REAL NOT NULL
+                )""")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS nav_refresh (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    state TEXT NOT NULL,
+                    nav_date TEXT,
+                    started_at REAL,
+                    finished_at REAL,
+                    codes INTEGER,
+                    refreshed INTEGER,
+                    failed INTEGER,
+                    error TEXT,
+                    retry_at REAL,
+                    lease_until REAL,
+                    owner TEXT
+                )""")
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def hold(self, amfi_codes, now=None):
+        """Mark codes as held by a client; returns how many were given"""
+        ts = _timestamp(now)
+        codes = unique_codes(amfi_codes)
+        self._connect().executemany(
+            "INSERT INTO held_codes VALUES (?, ?) "
+            "ON CONFLICT (amfi_code) DO UPDATE SET last_seen = excluded.last_seen",
+            [(code, ts) for code in codes],
+        )
+        return len(codes)
+
+    def held(self, now=None):
+        """Codes seen within HOLD_DAYS, dropping older ones"""
+        conn = self._connect()
+        conn.execute("DELETE FROM held_codes WHERE last_seen < ?", (_timestamp(now) - HOLD_DAYS * 86400,))
+        return [code for (code,) in conn.execute("SELECT amfi_code FROM held_codes ORDER BY amfi_code")]
+
+    def status(self):
+        """Last refresh as a dict (state is "never" before the first run)"""
+        conn = self._connect()
+        row = conn.execute(f"SELECT {', '.join(STATUS_COLUMNS)} FROM nav_refresh WHERE id = 1").fetchone()
+        status = dict(zip(STATUS_COLUMNS, row)) if row else {"state": "never"}
+        status["held"] = conn.execute("SELECT COUNT(*) FROM held_codes").fetchone()[0]
+        if status.get("nav_date"):
+            status["nav_date"] = date.fromisoformat(status["nav_date"])
+        return status
+
+    def next_run(self, now=None):
+        """Epoch seconds at which a refresh is next due"""
+        now = now or datetime.now(IST)
+        ts = now.timestamp()
+        status = self.status()
+        if status.get("nav_date") and status["nav_date"] >= expected_nav_date(now):
+            return next_publication(now).timestamp()
+        if status["state"] == "running" and (status["lease_until"] or 0) > ts:
+            return status["lease_until"]
+        return max(ts, status.get("retry_at") or 0)
+
+    def _claim(self, now, force):
+        """Take the refresh lease for the NAV date due at ``now``; None if not due or taken"""
+        ts = now.timestamp()
+        expected = expected_nav_date(now)
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT state, nav_date, retry_at, lease_until FROM nav_refresh WHERE id = 1").fetchone()
+            state, nav_date, retry_at, lease_until = row or ("never", None, None, None)
+            busy = state == "running" and (lease_until or 0) > ts
+            done = nav_date is not None and nav_date >= expected.isoformat()
+            if busy or (not force and (done or (retry_at or 0) > ts)):
+                conn.execute("ROLLBACK")
+                return None
+            conn.execute(
+                "INSERT INTO nav_refresh (id, state, nav_date, started_at, lease_until, owner) "
+                "VALUES (1, 'running', ?, ?, ?, ?) ON CONFLICT (id) DO UPDATE SET state = 'running', "
+                "started_at = excluded.started_at, lease_until = excluded.lease_until, owner = excluded.owner",
+                (nav_date, ts, ts + LEASE_SECONDS, f"{socket.gethostname()}:{os.getpid()}"),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return expected
+
+    def refresh(self, now=None, force=False):
+        """Refresh every held code if a publication is due; returns the new status or None if skipped"""
+        now = (now or datetime.now(IST)).astimezone(IST)
+        expected = self._claim(now, force)
+        if expected is None:
+            return None
+        ts = now.timestamp()
+        codes = self.held(now)
+        with metrics.timer("nav_refresh_seconds"):
+            try:
+                refreshed, failed, newest, error = self._refresh_codes(codes, ts)
+            except Exception as exc:
+                refreshed, failed, newest, error = 0, len(codes), None, str(exc)
+        complete = not failed and (not codes or (newest is not None and newest >= expected))
+        if not complete and error is None:
+            error = f"AMFI has not published NAVs for {expected:%d-%b-%Y} yet"
+        metrics.inc("nav_refresh_total", result="complete" if complete else "retry")
+        self._connect().execute(
+            "UPDATE nav_refresh SET state = ?, nav_date = COALESCE(?, nav_date), finished_at = ?, codes = ?, "
+            "refreshed = ?, failed = ?, error = ?, retry_at = ?, lease_until = NULL WHERE id = 1",
+            ("idle" if complete else "waiting", expected.isoformat() if complete else None, time.time(),
+             len(codes), refreshed, failed, None if complete else error, None if complete else ts + RETRY_EVERY),
+        )
+        return self.status()
+
+    def _refresh_codes(self, codes, ts):
+        """Fetch NAVs for ``codes`` into the cache; returns (refreshed, failed, newest NAV date, error)"""
+        if not codes:
+            return 0, 0, None, None
+        quotes, error = [], None
+        try:
+            from amfi_master import AMFI_NAV_SOURCE, load_nav_master
+
+            found = load_nav_master(self.source or AMFI_NAV_SOURCE).lookup(codes).dropna(subset=["nav", "nav_date"])
+            quotes = [(codes[i], nav, f"{day:%d-%b-%Y}")
+                      for i, nav, day in zip(found.index, found["nav"], found["nav_date"])]
+        except Exception as exc:
+            error = f"NAV master: {exc}"
+        self.cache.put_many(quotes, checked_at=ts)
+        dates = [parse_nav_date(last_updated) for _, _, last_updated in quotes]
+
+        # Codes missing from the file (or every code, if it failed) are quoted one by one
+        done = {code for code, _, _ in quotes}
+        missing = [code for code in codes if code not in done]
+        failed = len(missing)
+        if missing and self.quotes is not None:
+            try:
+                results = fetch_navs(missing, self.quotes(),
+                                     fetch=lambda obj, code: self.cache.fetch(obj, code, force=True))
+            except Exception as exc:
+                error = f"NAV quotes: {exc}"
+            else:
+                fetched = [(code, nav, last_updated) for code, (nav, last_updated) in results.items()
+                           if nav is not None]
+                failed = len(missing) - len(fetched)
+                dates += [parse_nav_date(last_updated) for _, _, last_updated in fetched]
+                quotes += fetched
+        try:
+            from nav_history import get_history
+
+            get_history().append_quotes(quotes)
+        except OSError as exc:
+            error = error or f"NAV history: {exc}"
+        newest = max((d for d in dates if d is not None), default=None)
+        return len(codes) - failed, failed, newest, error
+
+    def start(self, check_every=CHECK_EVERY):
+        """Refresh in a daemon thread whenever a publication is due (idempotent)"""
+        if self._stop is not None:
+            return
+        stop = threading.Event()
+
+        def loop():
+            while not stop.is_set():
+                try:
+                    self.refresh()
+                    wait = self.next_run() - time.time()
+                except Exception:
+                    # A locked database or a failing fetch is retried on the next tick
+                    log.exception("NAV refresh failed; retrying in %s seconds", check_every)
+                    metrics.inc("nav_refresh_total", result="error")
+                    wait = check_every
+                if stop.wait(min(max(wait, 1), check_every)):
+                    return
+
+        self._stop = stop
+        threading.Thread(target=loop, name="nav-scheduler", daemon=True).start()
+
+    def stop(self):
+        if self._stop is not None:
+            self._stop.set()
+            self._stop = None
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler(cache=None):
+    """Process-wide scheduler, running in a thread unless NAV_SCHEDULER=off"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = NavScheduler(cache)
+            if NAV_SCHEDULER != "off":
+                _scheduler.start()
+    return _scheduler
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in ("run", "once", "status"):
+        sys.exit(__doc__)
+    scheduler = NavScheduler()
+    if sys.argv[1] == "run":
+        scheduler.start()
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            scheduler.stop()
+    else:
+        if sys.argv[1] == "once":
+            scheduler.refresh(force=True)
+        for key, value in scheduler.status().items():
+            print(f"{key:12} {value}")
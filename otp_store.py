@@ -0,0 +1,226 @@
+"""One-time passwords shared by every app worker.
+
+OTPs live outside Streamlit session state, so a login can be verified by a
+different worker from the one that sent it. The default store is an embedded
+SQLite database (one file shared by the workers on a host); setting
+``OTP_REDIS_URL`` switches to Redis for multi-host deployments. Both keep
+one row or key per mobile, so issue and verify are O(1). They store only a
+hash of the code, expire codes after ``OTP_TTL`` seconds and limit
+how often a mobile can request a new one.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+OTP_DB = os.environ.get("OTP_DB", "otp.db")
+OTP_REDIS_URL = os.environ.get("OTP_REDIS_URL")
+OTP_TTL = 300  # seconds an OTP stays valid
+MAX_ATTEMPTS = 5  # wrong guesses before the OTP is discarded
+RATE_LIMIT = 3  # OTPs a mobile may request ...
+RATE_WINDOW = 600  # ... per this many seconds
+SWEEP_EVERY = 60
+
+NOT_SENT = "No OTP sent for this number."
+EXPIRED = "OTP has expired."
+INCORRECT = "Incorrect OTP."
+TOO_MANY = "Too many incorrect attempts. Please request a new OTP."
+VERIFIED = "OTP Verified successfully!"
+
+
+def _digest(mobile, otp):
+    return hashlib.sha256(f"{mobile}:{otp}".encode("utf-8")).hexdigest()
+
+
+# Check-and-count in one step, so a key that expires mid-verify is never
+# recreated by HINCRBY as a hash without a TTL
+VERIFY_SCRIPT = """
+local digest = redis.call("HGET", KEYS[1], "digest")
+if not digest then return 0 end
+if digest == ARGV[1] then
+    redis.call("DEL", KEYS[1])
+    return 1
+end
+if redis.call("HINCRBY", KEYS[1], "attempts", 1) >= tonumber(ARGV[2]) then
+    redis.call("DEL", KEYS[1])
+    return 3
+end
+return 2
+"""
+VERIFY_RESULTS = [(False, NOT_SENT), (True, VERIFIED), (False, INCORRECT), (False, TOO_MANY)]
+
+
+def _rate_limited(wait):
+    return f"Too many OTP requests. Please try again in {int(wait) + 1} seconds."
+
+
+class OtpStore:
+    """OTPs in SQLite with TTL expiry and a fixed-window send limit per mobile"""
+
+    def __init__(self, path=OTP_DB, ttl=OTP_TTL, rate_limit=RATE_LIMIT, rate_window=RATE_WINDOW):
+        self.path = path
+        self.ttl = ttl
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self._local = threading.local()
+        self._sweeper = None
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS otps (
+                    mobile TEXT PRIMARY KEY,
+                    digest TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0
+                )""")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS otp_sends (
+                    mobile TEXT PRIMARY KEY,
+                    window_start REAL NOT NULL,
+                    sent INTEGER NOT NULL
+                )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS otps_expiry ON otps (expires_at)")
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def issue(self, mobile, otp, now=None):
+        """Store ``otp`` for ``mobile`` unless rate limited; returns (ok, message)"""
+        now = time.time() if now is None else now
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT window_start, sent FROM otp_sends WHERE mobile = ?", (mobile,)).fetchone()
+            if row and now - row[0] < self.rate_window:
+                if row[1] >= self.rate_limit:
+                    conn.execute("ROLLBACK")
+                    return False, _rate_limited(row[0] + self.rate_window - now)
+                conn.execute("UPDATE otp_sends SET sent = sent + 1 WHERE mobile = ?", (mobile,))
+            else:
+                conn.execute("INSERT OR REPLACE INTO otp_sends VALUES (?, ?, 1)", (mobile, now))
+            conn.execute("INSERT OR REPLACE INTO otps VALUES (?, ?, ?, 0)",
+                         (mobile, _digest(mobile, otp), now + self.ttl))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return True, "OTP sent."
+
+    def verify(self, mobile, otp, now=None):
+        """Check ``otp``; a correct one is consumed. Returns (ok, message)"""
+        now = time.time() if now is None else now
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT digest, expires_at, attempts FROM otps WHERE mobile = ?", (mobile,)).fetchone()
+            if row is None:
+                result = (False, NOT_SENT)
+            elif now > row[1]:
+                conn.execute("DELETE FROM otps WHERE mobile = ?", (mobile,))
+                result = (False, EXPIRED)
+            elif row[0] == _digest(mobile, otp):
+                conn.execute("DELETE FROM otps WHERE mobile = ?", (mobile,))
+                result = (True, VERIFIED)
+            elif row[2] + 1 >= MAX_ATTEMPTS:
+                conn.execute("DELETE FROM otps WHERE mobile = ?", (mobile,))
+                result = (False, TOO_MANY)
+            else:
+                conn.execute("UPDATE otps SET attempts = attempts + 1 WHERE mobile = ?", (mobile,))
+                result = (False, INCORRECT)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return result
+
+    def sweep(self, now=None):
+        """Delete expired OTPs and finished rate windows; returns the number of OTPs removed"""
+        now = time.time() if now is None else now
+        conn = self._connect()
+        removed = conn.execute("DELETE FROM otps WHERE expires_at < ?", (now,)).rowcount
+        conn.execute("DELETE FROM otp_sends WHERE window_start < ?", (now - self.rate_window,))
+        return removed
+
+    def start_sweeper(self, interval=SWEEP_EVERY):
+        """Sweep in a daemon thread every ``interval`` seconds (idempotent)"""
+        if self._sweeper is not None:
+            return
+        stop = threading.Event()
+
+        def loop():
+            while not stop.wait(interval):
+                try:
+                    self.sweep()
+                except sqlite3.Error:
+                    pass  # a locked database is retried on the next tick
+
+        self._sweeper = stop
+        threading.Thread(target=loop, name="otp-sweeper", daemon=True).start()
+
+    def stop_sweeper(self):
+        if self._sweeper is not None:
+            self._sweeper.set()
+            self._sweeper = None
+
+
+class RedisOtpStore:
+    """Same interface backed by Redis; keys expire on their own, so no sweeper is needed"""
+
+    def __init__(self, url=OTP_REDIS_URL, ttl=OTP_TTL, rate_limit=RATE_LIMIT, rate_window=RATE_WINDOW):
+        import redis
+
+        self.redis = redis.Redis.from_url(url)
+        self._verify = self.redis.register_script(VERIFY_SCRIPT)
+        self.ttl = ttl
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+
+    def issue(self, mobile, otp, now=None):
+        sends = f"otp:sends:{mobile}"
+        with self.redis.pipeline() as pipe:
+            pipe.set(sends, 0, ex=self.rate_window, nx=True)
+            pipe.incr(sends)
+            pipe.ttl(sends)
+            _, sent, wait = pipe.execute()
+        if sent > self.rate_limit:
+            return False, _rate_limited(max(wait, 0))
+        key = f"otp:{mobile}"
+        with self.redis.pipeline() as pipe:
+            pipe.delete(key)
+            pipe.hset(key, mapping={"digest": _digest(mobile, otp), "attempts": 0})
+            pipe.expire(key, self.ttl)
+            pipe.execute()
+        return True, "OTP sent."
+
+    def verify(self, mobile, otp, now=None):
+        # Redis drops expired keys, so an expired OTP looks like one never sent.
+        # The script runs atomically, so a correct OTP is used once.
+        return VERIFY_RESULTS[self._verify(keys=[f"otp:{mobile}"], args=[_digest(mobile, otp), MAX_ATTEMPTS])]
+
+    def sweep(self, now=None):
+        return 0
+
+    def start_sweeper(self, interval=SWEEP_EVERY):
+        pass
+
+    def stop_sweeper(self):
+        pass
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Process-wide OTP store (Redis if OTP_REDIS_URL is set) with its sweeper running"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = RedisOtpStore() if OTP_REDIS_URL else OtpStore()
+            _store.start_sweeper()
+    return _store
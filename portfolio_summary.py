@@ -0,0 +1,57 @@
+"""Portfolio aggregation that keeps amounts numeric until display.
+
+Amounts are coerced to floats once, allocation and totals are computed with
+vectorized group sums, and formatting happens only in ``styled`` at the
+display boundary. Shared by the CAMS, casparser and CSV portfolio pages.
+"""
+import pandas as pd
+
+AMOUNT_FORMAT = "{:,.0f}"
+DATE_FORMAT = "{:%d-%b-%Y}"
+SHARE_COLUMN = "Share (%)"
+VALUE_COLUMNS = ("Current Value", "Investment Amount")  # CAMS holdings, CSV uploads
+
+
+def to_amounts(values):
+    """Float series from numbers or strings such as "1,50,000"; unparseable values become 0"""
+    values = pd.Series(values)
+    if not pd.api.types.is_numeric_dtype(values):
+        values = values.astype("string").str.replace(",", "", regex=False).str.strip()
+    return pd.to_numeric(values, errors="coerce").fillna(0.0).astype("float64")
+
+
+def shares(values):
+    """Each value as a percentage of the total (0 when the total is 0)"""
+    values = to_amounts(values)
+    total = values.sum()
+    return values * (100.0 / total) if total else values * 0.0
+
+
+def allocation(df, category, amount):
+    """Amount and share per category, sorted by category like ``groupby``"""
+    amounts = to_amounts(df[amount]).set_axis(df.index)
+    summary = amounts.groupby(df[category], observed=True, sort=True).sum().to_frame(amount)
+    summary[SHARE_COLUMN] = shares(summary[amount])
+    return summary
+
+
+def totals(df, columns):
+    """Column sums as plain floats, skipping columns the frame does not have"""
+    present = [column for column in columns if column in df]
+    return {column: float(total) for column, total in df[present].apply(to_amounts).sum().items()}
+
+
+def value_column(df):
+    """Column holding a stored portfolio's value: current value where known, else amount invested"""
+    return next((column for column in VALUE_COLUMNS if column in df), None)
+
+
+def portfolio_value(df):
+    """Total value of a stored portfolio"""
+    column = value_column(df)
+    return float(to_amounts(df[column]).sum()) if column else 0.0
+
+
+def styled(df, formats, na_rep="-"):
+    """Styler that formats numeric columns for display without touching the data"""
+    return df.style.format({k: v for k, v in formats.items() if k in df}, na_rep=na_rep)
@@ -0,0 +1,211 @@
+"""Insurance renewal index across every client.
+
+Each client's policies are mirrored into a SQLite table with a B-tree
+index on the due date, so "policies due between two dates" is an index
+range scan (O(log n + k)) instead of opening every insurance file. The
+index follows ``userdata_store`` writes through an ``on_save`` hook and is
+built from the existing files the first time it is opened. The stat
+signature of each client's file is indexed too, and ``reconcile`` re-reads
+every file that no longer matches, so writes made by other processes or
+before the hook was attached are picked up.
+
+    python renewal_index.py rebuild
+    python renewal_index.py due [days]
+"""
+import os
+import sqlite3
+import sys
+import threading
+import time
+from datetime import date, timedelta
+
+import pandas as pd
+
+import userdata_store
+
+RENEWALS_DB = os.environ.get("RENEWALS_DB", "renewals.db")
+KEY = "insurance"
+DUE_DAYS = 30
+INDEX_VERSION = "2"  # bumped when the tables change meaning, so stored indexes are rebuilt
+RECONCILE_EVERY = float(os.environ.get("RENEWALS_RECONCILE_SECONDS", "30"))
+COLUMNS = {
+    "Policy Number": "policy_number",
+    "Policy Type": "policy_type",
+    "Premium Amount": "premium",
+    "Due Date": "due_date",
+}
+RESULT_COLUMNS = ["mobile", *COLUMNS.values()]
+
+
+def policy_frame(mobile, df):
+    """Typed index rows for one client's policy frame; policies without a due date are skipped"""
+    def column(name, convert):
+        return convert(df[name]) if name in df else pd.Series(None, index=df.index, dtype=object)
+
+    due = pd.to_datetime(column("Due Date", lambda s: s), errors="coerce")
+    rows = pd.DataFrame({
+        "mobile": mobile,
+        "row": range(len(df)),
+        "policy_number": column("Policy Number", lambda s: s.astype("string")),
+        "policy_type": column("Policy Type", lambda s: s.astype("string")),
+        "premium": column("Premium Amount", lambda s: pd.to_numeric(s, errors="coerce")).astype("float64"),
+        "due_date": due,
+    }, index=df.index)
+    return rows[due.notna()].reset_index(drop=True)
+
+
+def policy_rows(mobile, df):
+    """``policy_frame`` as tuples for SQLite"""
+    rows = policy_frame(mobile, df)
+    rows["due_date"] = rows["due_date"].dt.strftime("%Y-%m-%d")
+    rows = rows.astype(object).where(rows.notna(), None)
+    return list(rows.itertuples(index=False, name=None))
+
+
+def _typed(due):
+    due["premium"] = pd.to_numeric(due["premium"], errors="coerce").astype("float64")
+    due["due_date"] = pd.to_datetime(due["due_date"])
+    return due
+
+
+def due_in_frame(df, days=DUE_DAYS, today=None):
+    """``due_within`` for a policy frame that is not (yet) indexed"""
+    today = pd.Timestamp(today or date.today())
+    due = policy_frame("", df)
+    ahead = (due["due_date"].dt.normalize() - today).dt.days
+    due = due[(ahead >= 0) & (ahead < days)]
+    return due.sort_values("due_date", kind="stable")[RESULT_COLUMNS].reset_index(drop=True)
+
+
+class RenewalIndex:
+    """Policies of all clients, range-queryable by due date"""
+
+    def __init__(self, path=RENEWALS_DB):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS policies (
+                    mobile TEXT NOT NULL,
+                    row INTEGER NOT NULL,
+                    policy_number TEXT,
+                    policy_type TEXT,
+                    premium REAL,
+                    due_date TEXT NOT NULL,
+                    PRIMARY KEY (mobile, row)
+                )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS policies_due ON policies (due_date)")
+            conn.execute("CREATE TABLE IF NOT EXISTS sources (mobile TEXT PRIMARY KEY, signature TEXT NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def update_client(self, mobile, df, signature=None):
+        """Replace one client's policies; ``df`` None removes them.
+
+        ``signature`` is the stat signature of the file ``df`` was saved to
+        (see ``UserDataStore.signature``); without one, ``reconcile`` reads
+        the client's file again.
+        """
+        rows = policy_rows(mobile, df) if df is not None else []
+        with self._connect() as conn:
+            conn.execute("DELETE FROM policies WHERE mobile = ?", (mobile,))
+            conn.executemany("INSERT INTO policies VALUES (?, ?, ?, ?, ?, ?)", rows)
+            conn.execute("DELETE FROM sources WHERE mobile = ?", (mobile,))
+            if signature:
+                conn.execute("INSERT INTO sources VALUES (?, ?)", (mobile, signature))
+
+    def reconcile(self, store):
+        """Re-index every client whose insurance file changed since it was indexed; returns how many"""
+        current = store.signatures(KEY)
+        known = dict(self._connect().execute("SELECT mobile, signature FROM sources"))
+        stale = sorted(mobile for mobile in current.keys() | known.keys() if current.get(mobile) != known.get(mobile))
+        for mobile in stale:
+            df = store.load_frame(mobile, KEY) if mobile in current else None
+            self.update_client(mobile, df, current.get(mobile))
+        return len(stale)
+
+    def due_between(self, start, end, mobile=None):
+        """Policies due from ``start`` to ``end`` inclusive, ordered by due date"""
+        sql = f"SELECT {', '.join(RESULT_COLUMNS)} FROM policies WHERE due_date BETWEEN ? AND ?"
+        params = [start.isoformat(), end.isoformat()]
+        if mobile is not None:
+            sql += " AND mobile = ?"
+            params.append(mobile)
+        rows = self._connect().execute(sql + " ORDER BY due_date, mobile, row", params).fetchall()
+        return _typed(pd.DataFrame(rows, columns=RESULT_COLUMNS))
+
+    def due_within(self, days=DUE_DAYS, mobile=None, today=None):
+        """Policies due in the ``days`` days starting today (today up to, not including, today + days)"""
+        today = today or date.today()
+        return self.due_between(today, today + timedelta(days=days - 1), mobile)
+
+    def count(self):
+        return self._connect().execute("SELECT COUNT(*) FROM policies").fetchone()[0]
+
+    def rebuild(self, store):
+        """Re-index every insurance file in ``store``; returns the number of clients indexed"""
+        signatures = store.signatures(KEY)
+        mobiles = sorted(signatures)
+        with self._connect() as conn:
+            conn.execute("DELETE FROM policies")
+            conn.execute("DELETE FROM sources")
+            for mobile in mobiles:
+                df = store.load_frame(mobile, KEY)
+                if df is not None:
+                    conn.executemany("INSERT INTO policies VALUES (?, ?, ?, ?, ?, ?)", policy_rows(mobile, df))
+            conn.executemany("INSERT INTO sources VALUES (?, ?)", signatures.items())
+            conn.execute("INSERT OR REPLACE INTO meta VALUES ('built', ?)", (date.today().isoformat(),))
+            conn.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (INDEX_VERSION,))
+        return len(mobiles)
+
+    def built(self):
+        """Whether the index was built by this version of the tables"""
+        row = self._connect().execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        return row is not None and row[0] == INDEX_VERSION
+
+
+_index = None
+_reconciled = 0.0
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """Process-wide renewal index, built on first use.
+
+    Saves through this process's ``get_store()`` reach the index at once
+    through an ``on_save`` hook; any other save is found by ``reconcile``,
+    which runs here at most once per ``RECONCILE_EVERY`` seconds.
+    """
+    global _index, _reconciled
+    with _index_lock:
+        store = userdata_store.get_store()
+        if _index is None:
+            index = RenewalIndex()
+            if not index.built():
+                index.rebuild(store)
+            store.on_save(KEY, lambda mobile, df: index.update_client(mobile, df, store.signature(mobile, KEY)))
+            _index = index
+        if time.monotonic() - _reconciled >= RECONCILE_EVERY:
+            _index.reconcile(store)
+            _reconciled = time.monotonic()
+    return _index
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in ("rebuild", "due"):
+        sys.exit(__doc__)
+    index = RenewalIndex()
+    if sys.argv[1] == "rebuild":
+        clients = index.rebuild(userdata_store.get_store())
+        print(f"Indexed {index.count()} policies from {clients} clients into {index.path}")
+    else:
+        index.reconcile(userdata_store.get_store())
+        days = int(sys.argv[2]) if len(sys.argv) > 2 else DUE_DAYS
+        print(index.due_within(days).to_string(index=False))
@@ -0,0 +1,194 @@
+"""Return analytics from dated cash flows: XIRR, absolute and holding-period return.
+
+XIRR is solved for every scheme at once. Cash flows are laid out as a
+padded (schemes x flows) matrix, and Newton steps run on the whole matrix,
+with a vectorized bisection for rows Newton cannot settle.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import metrics
+from cams_parser import aggregate_holdings, stream_transactions_frame, transactions_frame
+
+MIN_RATE = -0.9999
+MAX_RATE = 100.0
+TOLERANCE = 1e-9
+NEWTON_STEPS = 50
+BISECT_STEPS = 100
+TOTAL_LABEL = "Total Portfolio"
+CACHE_SIZE = 32
+RETURN_COLUMNS = ["Invested", "Current Value", "Absolute Return", "Holding Period Return (%)",
+                  "Holding Days", "XIRR (%)"]
+
+
+def _npv(rates, amounts, years):
+    """Net present value of every row and its derivative with respect to the rate"""
+    discount = (1.0 + rates)[:, None] ** -years
+    value = (amounts * discount).sum(axis=1)
+    slope = (-years * amounts * discount).sum(axis=1) / (1.0 + rates)
+    return value, slope
+
+
+def xirr_matrix(amounts, years, guess=0.1):
+    """Annualised IRR for each row of a padded cash-flow matrix.
+
+    ``amounts`` and ``years`` are (rows x flows) arrays padded with zero
+    amounts, with ``years`` counted from each row's first flow. Rows without
+    both an outflow and an inflow, or with no root in range, get NaN.
+    """
+    amounts = np.asarray(amounts, dtype="float64")
+    years = np.asarray(years, dtype="float64")
+    rates = np.full(len(amounts), guess)
+    solvable = (amounts < 0).any(axis=1) & (amounts > 0).any(axis=1)
+    scale = np.maximum(np.abs(amounts).sum(axis=1), 1.0)
+
+    with np.errstate(over="ignore", invalid="ignore", divide="ignore"):
+        for _ in range(NEWTON_STEPS):
+            value, slope = _npv(rates, amounts, years)
+            step = np.where(np.isfinite(slope) & (slope != 0), value / slope, 0.0)
+            rates = np.clip(rates - np.nan_to_num(step), MIN_RATE, MAX_RATE)
+            if not (np.abs(step[solvable]) > TOLERANCE).any():
+                break
+        value, _ = _npv(rates, amounts, years)
+        settled = np.isfinite(value) & (np.abs(value) <= 1e-6 * scale)
+
+        # Bisection over the whole rate range for rows Newton did not settle
+        todo = solvable & ~settled
+        if todo.any():
+            a, y = amounts[todo], years[todo]
+            low = np.full(len(a), MIN_RATE)
+            high = np.full(len(a), MAX_RATE)
+            f_low = _npv(low, a, y)[0]
+            bracketed = np.sign(f_low) != np.sign(_npv(high, a, y)[0])
+            for _ in range(BISECT_STEPS):
+                mid = (low + high) / 2
+                f_mid = _npv(mid, a, y)[0]
+                same = np.sign(f_mid) == np.sign(f_low)
+                low = np.where(same, mid, low)
+                f_low = np.where(same, f_mid, f_low)
+                high = np.where(same, high, mid)
+            rates[todo] = (low + high) / 2
+            settled[todo] = bracketed
+    return np.where(solvable & settled, rates, np.nan)
+
+
+def xirr_by_group(groups, dates, amounts):
+    """XIRR per group from long-format (group, date, amount) cash flows.
+
+    Negative amounts are money invested, positive amounts money received.
+    """
+    flows = pd.DataFrame({"group": groups, "date": pd.to_datetime(dates), "amount": amounts})
+    flows = flows.dropna(subset=["date"])
+    flows = flows.groupby(["group", "date"], sort=True, observed=True)["amount"].sum().reset_index()
+    if flows.empty:
+        return pd.Series(dtype="float64")
+    first = flows.groupby("group", observed=True)["date"].transform("min")
+    row, labels = pd.factorize(flows["group"])
+    slot = flows.groupby("group", observed=True).cumcount().to_numpy()
+    amounts = np.zeros((len(labels), slot.max() + 1))
+    years = np.zeros_like(amounts)
+    amounts[row, slot] = flows["amount"].to_numpy()
+    years[row, slot] = ((flows["date"] - first).dt.days / 365.0).to_numpy()
+    return pd.Series(xirr_matrix(amounts, years), index=pd.Index(labels))
+
+
+def returns_table(flows, holdings):
+    """Per-scheme and whole-portfolio returns.
+
+    ``flows`` has ``scheme``, ``date`` and ``amount`` columns (negative for
+    money invested, positive for money received). ``holdings`` is indexed by
+    scheme with ``value`` and ``as_of`` columns; the current value counts as
+    a final inflow on ``as_of``. Holdings without any flows are left out.
+    """
+    holdings = holdings.dropna(subset=["as_of"])
+    holdings = holdings[holdings.index.isin(flows["scheme"])]
+    terminal = pd.DataFrame({
+        "scheme": holdings.index, "date": holdings["as_of"].to_numpy(), "amount": holdings["value"].to_numpy(),
+    })
+    flows = pd.concat([flows[["scheme", "date", "amount"]], terminal], ignore_index=True)
+    flows["scheme"] = flows["scheme"].astype(object)
+    if flows.empty:
+        return pd.DataFrame(columns=RETURN_COLUMNS, index=pd.Index([], name="Scheme Name"))
+    # The whole portfolio is one more group holding every flow
+    every = flows.assign(scheme=TOTAL_LABEL)
+    both = pd.concat([flows, every], ignore_index=True)
+    both["invested"] = (-both["amount"]).clip(lower=0)
+
+    xirr = xirr_by_group(both["scheme"], both["date"], both["amount"])
+    grouped = both.groupby("scheme", sort=False)
+    invested = grouped["invested"].sum()
+    first, last = grouped["date"].min(), grouped["date"].max()
+    value = holdings["value"].reindex(invested.index)
+    value[TOTAL_LABEL] = holdings["value"].sum()
+
+    table = pd.DataFrame({
+        "Invested": invested,
+        "Current Value": value.fillna(0.0),
+        "Absolute Return": grouped["amount"].sum(),
+        "Holding Days": (last - first).dt.days,
+        "XIRR (%)": xirr.reindex(invested.index) * 100,
+    })
+    table["Holding Period Return (%)"] = table["Absolute Return"] / table["Invested"].where(table["Invested"] > 0) * 100
+    table.index.name = "Scheme Name"
+    return table[RETURN_COLUMNS]
+
+
+def _cams_returns(trxns):
+    sign = np.where(trxns["purchase"], -1.0, np.where(trxns["outflow"], 1.0, 0.0))
+    flows = pd.DataFrame({"scheme": trxns["scheme"], "date": trxns["date"], "amount": trxns["amount"] * sign})
+    flows = flows[flows["amount"] != 0]
+    holdings = aggregate_holdings(trxns).rename(columns={"latest_date": "as_of"})
+    return returns_table(flows, holdings)
+
+
+def cams_returns(records):
+    """Returns for CAMS TRXN_DETAILS records: purchases are money in, redemptions and switches out"""
+    return _cams_returns(transactions_frame(records))
+
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _cached(key, compute):
+    """``compute()`` through a small LRU cache; callers get their own copy"""
+    with _cache_lock:
+        if key in _cache:
+            metrics.inc("returns_cache_total", result="hit")
+            _cache.move_to_end(key)
+            return _cache[key].copy()
+    metrics.inc("returns_cache_total", result="miss")
+    table = compute()
+    with _cache_lock:
+        _cache[key] = table
+        if len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return table.copy()
+
+
+def statement_returns(file, digest):
+    """Returns for a CAMS JSON statement file, cached by ``digest``, its SHA-256.
+
+    The ledger's ingest summary already carries the digest. On a miss the
+    statement is streamed with ``iter_transactions`` from the start of
+    ``file``, never loaded whole.
+    """
+    def compute():
+        file.seek(0)
+        return _cams_returns(stream_transactions_frame(file))
+
+    return _cached(digest, compute)
+
+
+def holdings_returns(digest, flows, holdings):
+    """``returns_table(flows(), holdings)``, cached by the statement's ``digest`` and the valuation.
+
+    ``flows`` is called only on a miss; ``holdings`` values and dates are
+    part of the key, so a rerun at the same NAVs is served from the cache.
+    """
+    key = (digest, tuple(holdings.index), holdings["value"].to_numpy("float64").tobytes(),
+           pd.to_datetime(holdings["as_of"]).to_numpy("datetime64[ns]").tobytes())
+    return _cached(key, lambda: returns_table(flows(), holdings))
@@ -0,0 +1,255 @@
+"""Memory accounting for the frames each browser session holds.
+
+Pages keep their large frames here rather than in ``st.session_state``,
+keyed by Streamlit session id, so the server can see what every session
+holds. A session idle for ``IDLE_SECONDS`` has its frames spilled to Arrow
+files under ``SPILL_DIR``. When resident frames across all sessions exceed
+``MEMORY_CEILING``, the least recently used sessions are spilled first.
+A spilled frame is read back (memory-mapped) on its next ``get``. Spill
+files of sessions not seen for ``SPILL_TTL`` are deleted, which is how
+abandoned tabs are eventually forgotten. A frame Arrow cannot encode (an
+object column of mixed types) stays in memory and is not tried again
+until it is replaced.
+"""
+import logging
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import time
+
+import metrics
+
+MB = 1024 * 1024
+MEMORY_CEILING = int(float(os.environ.get("SESSION_MEMORY_MB", "512")) * MB)
+IDLE_SECONDS = int(os.environ.get("SESSION_IDLE_SECONDS", "900"))
+SPILL_DIR = os.environ.get("SESSION_SPILL_DIR", os.path.join(tempfile.gettempdir(), "capital_cartel_sessions"))
+SPILL_TTL = 24 * 3600
+SWEEP_EVERY = 60
+
+log = logging.getLogger(__name__)
+
+
+def _is_frame(value):
+    return type(value).__name__ == "DataFrame" and hasattr(value, "memory_usage")
+
+
+def value_bytes(value):
+    """Approximate bytes held by a value: deep memory use for frames, pickled size otherwise"""
+    if _is_frame(value):
+        return int(value.memory_usage(deep=True, index=True).sum())
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except (pickle.PicklingError, TypeError, AttributeError):
+        return 0
+
+
+class SessionBudget:
+    """Per-session values with byte accounting, LRU spilling and rehydration"""
+
+    def __init__(self, ceiling=MEMORY_CEILING, idle=IDLE_SECONDS, spill_dir=SPILL_DIR, ttl=SPILL_TTL):
+        self.ceiling = ceiling
+        self.idle = idle
+        self.spill_dir = spill_dir
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        # session id -> {"seen": time, "values": {name: [value or None, bytes, spill path or None]}}
+        self._sessions = {}
+        self._unspillable = set()  # (session id, name) of frames that failed to encode
+        self._sweeper = None
+
+    def _session(self, session_id, now):
+        session = self._sessions.setdefault(session_id, {"seen": now, "values": {}})
+        session["seen"] = now
+        return session
+
+    def touch(self, session_id, now=None):
+        with self._lock:
+            self._session(session_id, now or time.time())
+
+    def put(self, session_id, name, value, now=None):
+        """Hold ``value`` for a session, spilling other sessions if the ceiling is passed"""
+        now = now or time.time()
+        size = value_bytes(value)
+        with self._lock:
+            values = self._session(session_id, now)["values"]
+            old = values.get(name)
+            if old and old[2]:
+                _remove(old[2])
+            self._unspillable.discard((session_id, name))
+            values[name] = [value, size, None]
+            self.enforce(keep=session_id)
+
+    def get(self, session_id, name, default=None, now=None):
+        """A session's value, read back from its spill file if it was spilled.
+
+        A spill file that is gone or unreadable (a temp cleaner, a full disk)
+        drops the entry and returns ``default``, so callers fall back to
+        their own store.
+        """
+        with self._lock:
+            values = self._session(session_id, now or time.time())["values"]
+            entry = values.get(name)
+            if entry is None:
+                return default
+            if entry[0] is None:
+                try:
+                    entry[0] = _load(entry[2])
+                except OSError:
+                    del values[name]
+                    metrics.inc("session_rehydrations_total", result="lost")
+                    return default
+                metrics.inc("session_rehydrations_total", result="ok")
+                self.enforce(keep=session_id)
+            return entry[0]
+
+    def pop(self, session_id, name):
+        with self._lock:
+            entry = self._sessions.get(session_id, {"values": {}})["values"].pop(name, None)
+            self._unspillable.discard((session_id, name))
+        if entry and entry[2]:
+            _remove(entry[2])
+
+    def drop(self, session_id):
+        """Forget a session and delete its spill files"""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            self._unspillable = {key for key in self._unspillable if key[0] != session_id}
+        shutil.rmtree(os.path.join(self.spill_dir, session_id), ignore_errors=True)
+
+    def resident(self):
+        """Bytes held in memory across all sessions"""
+        with self._lock:
+            return sum(e[1] for s in self._sessions.values() for e in s["values"].values() if e[0] is not None)
+
+    def usage(self, now=None):
+        """One dict per session: id, idle seconds, resident and spilled bytes, most recent first"""
+        now = now or time.time()
+        with self._lock:
+            rows = [{
+                "session": session_id, "idle_seconds": now - s["seen"],
+                "resident_bytes": sum(e[1] for e in s["values"].values() if e[0] is not None),
+                "spilled_bytes": sum(e[1] for e in s["values"].values() if e[0] is None),
+            } for session_id, s in self._sessions.items()]
+        return sorted(rows, key=lambda row: row["idle_seconds"])
+
+    def _spill_session(self, session_id, reason):
+        """Move a session's frames to disk; returns the bytes freed"""
+        freed = 0
+        for name, entry in self._sessions[session_id]["values"].items():
+            if entry[0] is None or not _is_frame(entry[0]) or (session_id, name) in self._unspillable:
+                continue
+            if entry[2] is None:
+                try:
+                    entry[2] = _spill(os.path.join(self.spill_dir, session_id), name, entry[0])
+                except OSError as exc:
+                    # A full or unwritable spill directory is retried next time
+                    log.warning("Could not spill %s of session %s: %s", name, session_id, exc)
+                    metrics.inc("session_spill_errors_total", reason="io")
+                    continue
+                except Exception as exc:
+                    log.warning("Keeping %s of session %s in memory, it cannot be encoded: %s",
+                                name, session_id, exc)
+                    metrics.inc("session_spill_errors_total", reason="encode")
+                    self._unspillable.add((session_id, name))
+                    continue
+            entry[0] = None
+            freed += entry[1]
+        if freed:
+            metrics.inc("session_spills_total", reason=reason)
+        return freed
+
+    def enforce(self, keep=None):
+        """Spill least recently used sessions until resident bytes fit the ceiling"""
+        with self._lock:
+            excess = self.resident() - self.ceiling
+            for session_id in sorted(self._sessions, key=lambda s: self._sessions[s]["seen"]):
+                if excess <= 0:
+                    break
+                if session_id != keep:
+                    excess -= self._spill_session(session_id, "ceiling")
+            return max(excess, 0)
+
+    def sweep(self, now=None):
+        """Spill idle sessions and forget long-abandoned ones; returns (spilled, forgotten)"""
+        now = now or time.time()
+        spilled, expired = 0, []
+        with self._lock:
+            for session_id, session in self._sessions.items():
+                idle = now - session["seen"]
+                if idle > self.ttl:
+                    expired.append(session_id)
+                elif idle > self.idle and self._spill_session(session_id, "idle"):
+                    spilled += 1
+        for session_id in expired:
+            self.drop(session_id)
+        return spilled, len(expired)
+
+    def start_sweeper(self, interval=SWEEP_EVERY):
+        """Sweep in a daemon thread every ``interval`` seconds (idempotent)"""
+        if self._sweeper is not None:
+            return
+        stop = threading.Event()
+
+        def loop():
+            while not stop.wait(interval):
+                try:
+                    self.sweep()
+                except Exception:
+                    log.exception("Session sweep failed; retrying in %s seconds", interval)
+
+        self._sweeper = stop
+        threading.Thread(target=loop, name="session-sweeper", daemon=True).start()
+
+    def stop_sweeper(self):
+        if self._sweeper is not None:
+            self._sweeper.set()
+            self._sweeper = None
+
+
+def _spill(directory, name, df):
+    from frames import encode_frame
+
+    os.makedirs(directory, exist_ok=True)
+    ext, payload = encode_frame(df)
+    path = os.path.join(directory, f"{name}.{ext}")
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=f".{name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(payload)
+        os.replace(tmp, path)
+    except BaseException:
+        _remove(tmp)
+        raise
+    return path
+
+
+def _load(path):
+    from frames import read_arrow, read_legacy_json
+
+    if path.endswith(".arrow"):
+        return read_arrow(path)
+    with open(path, "rb") as f:
+        return read_legacy_json(f.read())
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+_budget = None
+_budget_lock = threading.Lock()
+
+
+def get_budget():
+    """Process-wide session budget with its sweeper running"""
+    global _budget
+    with _budget_lock:
+        if _budget is None:
+            _budget = SessionBudget()
+            _budget.start_sweeper()
+    return _budget
@@ -0,0 +1,137 @@
+import sqlite3
+
+import pandas as pd
+import pytest
+
+import aum_rollups
+import client_store
+import userdata_store
+from aum_rollups import AumRollups
+from userdata_store import UserDataStore
+
+
+class FakeClients:
+    def __init__(self, clients):
+        self.clients = clients
+
+    def get(self, phone):
+        return self.clients.get(phone)
+
+    def all(self):
+        return self.clients
+
+
+class EmptyUserdata:
+    def signatures(self, key):
+        return {}
+
+
+@pytest.fixture
+def clients(monkeypatch):
+    fake = FakeClients({
+        "111": {"income_bracket": "10-25L", "age_bracket": "30-40"},
+        "222": {"income_bracket": "25L+", "age_bracket": "40-50"},
+    })
+    monkeypatch.setattr(client_store, "get_store", lambda: fake)
+    return fake
+
+
+@pytest.fixture
+def rollups(tmp_path):
+    return AumRollups(str(tmp_path / "aum.db"))
+
+
+def csv_portfolio(amounts):
+    return pd.DataFrame({"Scheme Name": list(amounts), "Investment Amount": list(amounts.values())})
+
+
+def buckets(rollups):
+    with sqlite3.connect(rollups.path) as conn:
+        return {(dimension, bucket): (aum, clients) for dimension, bucket, aum, clients in conn.execute(
+            "SELECT dimension, bucket, aum, clients FROM rollups")}
+
+
+def test_save_resave_and_clear_return_every_bucket_to_zero(rollups, clients):
+    rollups.update_client("111", csv_portfolio({"Equity": 100_000, "Debt": 50_000}))
+    rollups.update_client("222", csv_portfolio({"Equity": 20_000}))
+    assert rollups.total() == (170_000, 2)
+
+    rollups.update_client("111", csv_portfolio({"Equity": 60_000, "Gold": 10_000}))
+    assert buckets(rollups) == {
+        ("total", ""): (90_000, 2),
+        ("category", "Equity"): (80_000, 2),
+        ("category", "Gold"): (10_000, 1),
+        ("income_bracket", "10-25L"): (70_000, 1),
+        ("income_bracket", "25L+"): (20_000, 1),
+        ("age_bracket", "30-40"): (70_000, 1),
+        ("age_bracket", "40-50"): (20_000, 1),
+    }
+
+    rollups.update_client("111", None)
+    rollups.update_client("222", None)
+    assert buckets(rollups) == {}
+    assert rollups.total() == (0.0, 0)
+
+
+def test_bracket_change_moves_the_client(rollups, clients):
+    rollups.update_client("111", csv_portfolio({"Equity": 100_000}))
+    clients.clients["111"]["income_bracket"] = "25L+"
+    rollups.update_client("111", csv_portfolio({"Equity": 100_000}))
+    assert rollups.breakdown("income_bracket")[["bucket", "aum", "clients"]].values.tolist() == [
+        ["25L+", 100_000, 1]]
+
+
+def test_cams_holdings_roll_up_by_scheme(rollups, clients):
+    rollups.update_client("111", csv_portfolio({"Equity": 100_000}))
+    rollups.update_client("222", pd.DataFrame({
+        "Scheme Name": ["Axis Bluechip Fund - Growth"], "Total Units": [100.0],
+        "Current NAV": [50.0], "Current Value": [5_000.0],
+    }))
+    assert rollups.breakdown("category")["bucket"].tolist() == ["Equity"]
+    assert rollups.breakdown("scheme")["bucket"].tolist() == ["Axis Bluechip Fund - Growth"]
+    assert rollups.total() == (105_000, 2)
+
+
+def test_rollups_from_an_older_version_are_rebuilt(rollups, clients, monkeypatch):
+    assert not rollups.built()
+    rollups.rebuild(EmptyUserdata())
+    assert rollups.built()
+    monkeypatch.setattr(aum_rollups, "ROLLUP_VERSION", "next")
+    assert not rollups.built()
+
+
+def test_saves_without_the_hook_are_reconciled(rollups, clients, tmp_path):
+    store = UserDataStore(str(tmp_path / "userdata"))
+    rollups.rebuild(store)
+    store.save_frame("111", "portfolio", csv_portfolio({"Equity": 100_000}))
+    assert rollups.total() == (0.0, 0)
+    assert rollups.reconcile(store) == 1
+    assert rollups.total() == (100_000, 1)
+    assert rollups.reconcile(store) == 0
+
+    store.save_frame("111", "portfolio", csv_portfolio({"Debt": 40_000}))
+    store.save_frame("222", "portfolio", csv_portfolio({"Equity": 20_000}))
+    assert rollups.reconcile(store) == 2
+    assert rollups.breakdown("category")[["bucket", "aum"]].values.tolist() == [["Debt", 40_000], ["Equity", 20_000]]
+
+    store.clear("111")
+    assert rollups.reconcile(store) == 1
+    assert rollups.total() == (20_000, 1)
+
+
+def test_process_rollups_see_saves_made_before_they_were_opened(clients, tmp_path, monkeypatch):
+    store = UserDataStore(str(tmp_path / "userdata"))
+    monkeypatch.setattr(userdata_store, "get_store", lambda: store)
+    monkeypatch.setattr(aum_rollups, "AumRollups", lambda: AumRollups(str(tmp_path / "aum.db")))
+    monkeypatch.setattr(aum_rollups, "_rollups", None)
+    monkeypatch.setattr(aum_rollups, "_reconciled", 0.0)
+    rollups = aum_rollups.get_rollups()
+    store.save_frame("111", "portfolio", csv_portfolio({"Equity": 100_000}))
+    assert rollups.total() == (100_000, 1)  # through the hook
+
+    other = UserDataStore(store.datadir)  # another process, or the batch job
+    other.save_frame("222", "portfolio", csv_portfolio({"Equity": 20_000}))
+    assert rollups.total() == (100_000, 1)
+    monkeypatch.setattr(aum_rollups, "_reconciled", 0.0)
+    assert aum_rollups.get_rollups().total() == (120_000, 2)
+    assert rollups.reconcile(store) == 0
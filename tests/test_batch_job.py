@@ -0,0 +1,51 @@
+import json
+import os
+from datetime import date
+
+import batch_job
+from userdata_store import UserDataStore
+
+AS_OF = date(2026, 10, 15)
+
+
+def goal(amount):
+    return [{"Goal Type": "Retirement", "Goal Amount": amount, "Current Amount": 10, "Years": 5}]
+
+
+def test_second_run_reports_changed_data(tmp_path):
+    datadir, out = str(tmp_path / "userdata"), str(tmp_path / "report.csv")
+    store = UserDataStore(datadir)
+    store.save("111", "financialgoals", goal(100))
+    report = batch_job.run(datadir, out, workers=1, as_of=AS_OF, log=lambda *_: None)
+    assert report["goal_shortfall"].tolist() == [90]
+    assert not os.path.exists(out + ".checkpoint.jsonl")
+
+    store.save("111", "financialgoals", goal(510))
+    report = batch_job.run(datadir, out, workers=1, as_of=AS_OF, log=lambda *_: None)
+    assert report["goal_shortfall"].tolist() == [500]
+
+
+def test_checkpoint_for_other_parameters_is_ignored(tmp_path):
+    datadir, out = str(tmp_path / "userdata"), str(tmp_path / "report.csv")
+    UserDataStore(datadir).save("111", "financialgoals", goal(510))
+    checkpoint = out + ".checkpoint.jsonl"
+    stale = dict.fromkeys(batch_job.REPORT_COLUMNS)
+    stale.update(mobile="111", goal_shortfall=90)
+    with open(checkpoint, "w") as f:
+        f.write(json.dumps({"run": {"as_of": "2026-10-14", "days": batch_job.DUE_DAYS}}) + "\n")
+        f.write(json.dumps(stale) + "\n")
+    report = batch_job.run(datadir, out, workers=1, as_of=AS_OF, log=lambda *_: None)
+    assert report["goal_shortfall"].tolist() == [500]
+
+
+def test_interrupted_run_resumes_from_its_checkpoint(tmp_path):
+    datadir, out = str(tmp_path / "userdata"), str(tmp_path / "report.csv")
+    UserDataStore(datadir).save("111", "financialgoals", goal(510))
+    checkpoint = out + ".checkpoint.jsonl"
+    done = dict.fromkeys(batch_job.REPORT_COLUMNS)
+    done.update(mobile="111", goal_shortfall=90)
+    with open(checkpoint, "w") as f:
+        f.write(json.dumps({"run": {"as_of": AS_OF.isoformat(), "days": batch_job.DUE_DAYS}}) + "\n")
+        f.write(json.dumps(done) + "\n")
+    report = batch_job.run(datadir, out, workers=1, as_of=AS_OF, log=lambda *_: None)
+    assert report["goal_shortfall"].tolist() == [90]
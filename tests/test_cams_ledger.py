@@ -0,0 +1,75 @@
+import io
+import json
+
+import pytest
+
+from cams_ledger import CamsLedger
+
+
+def trxn(date, units, desc="Purchase", folio="F1", scheme="Fund A", price=10.0):
+    return {"Folio": folio, "Scheme Name": scheme, "Desc": desc, "Units": str(units), "Price": str(price),
+            "Date": date}
+
+
+def statement(*trxns):
+    return io.BytesIO(json.dumps({"TRXN_DETAILS": list(trxns)}).encode())
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    return CamsLedger(str(tmp_path / "ledger.db"))
+
+
+def units(ledger, mobile="111"):
+    return {row["Scheme Name"]: row["Total Units"] for row in ledger.portfolio(mobile)[0]}
+
+
+JAN = [trxn("01-Jan-2026", 10), trxn("05-Jan-2026", 5)]
+
+
+def test_same_statement_twice_is_a_duplicate(ledger):
+    first = ledger.ingest("111", statement(*JAN))
+    assert (first["applied"], first["duplicate"]) == (2, False)
+    again = ledger.ingest("111", statement(*JAN))
+    assert (again["applied"], again["skipped"], again["duplicate"]) == (0, 2, True)
+    assert units(ledger) == {"Fund A": 15}
+    assert ledger.ingest("222", statement(*JAN))["applied"] == 2  # another client's ledger
+
+
+def test_overlapping_statement_applies_only_new_transactions(ledger):
+    ledger.ingest("111", statement(*JAN))
+    summary = ledger.ingest("111", statement(*JAN, trxn("09-Jan-2026", 3, "Redemption")))
+    assert (summary["applied"], summary["skipped"]) == (1, 2)
+    assert summary["backdated"] == [("F1", "2026-01-01", "Fund A", "Purchase", "10")]
+    assert units(ledger) == {"Fund A": 12}
+    assert ledger.checkpoints("111") == {"F1": ("2026-01-09", 3)}
+
+
+def test_backdated_correction_is_reported_not_applied(ledger):
+    ledger.ingest("111", statement(*JAN))
+    correction = trxn("03-Jan-2026", 2)
+    summary = ledger.ingest("111", statement(JAN[0], correction, JAN[1], trxn("09-Jan-2026", 1)))
+    assert summary["applied"] == 1
+    assert ("F1", "2026-01-03", "Fund A", "Purchase", "2") in summary["backdated"]
+    assert units(ledger) == {"Fund A": 16}
+
+
+def test_older_statement_is_rejected(ledger):
+    ledger.ingest("111", statement(*JAN, trxn("09-Jan-2026", 3)))
+    summary = ledger.ingest("111", statement(trxn("01-Jan-2026", 10), trxn("03-Jan-2026", 1)))
+    assert summary["older"] == {"F1": "2026-01-09"}
+    assert (summary["applied"], summary["skipped"]) == (0, 2)
+    assert units(ledger) == {"Fund A": 18}
+    # A statement for another folio is not held back by this one's checkpoint
+    other = ledger.ingest("111", statement(trxn("02-Jan-2026", 4, folio="F2", scheme="Fund B")))
+    assert (other["applied"], other["older"]) == (1, {})
+
+
+def test_identical_transactions_on_one_day_are_counted_apart(ledger):
+    twice = [trxn("05-Jan-2026", 1), trxn("05-Jan-2026", 1)]
+    assert ledger.ingest("111", statement(*twice))["applied"] == 2
+    assert units(ledger) == {"Fund A": 2}
+    # The same two again in a longer statement are skipped; a third one that day is new
+    summary = ledger.ingest("111", statement(*twice, trxn("05-Jan-2026", 1)))
+    assert (summary["applied"], summary["skipped"]) == (1, 2)
+    assert units(ledger) == {"Fund A": 3}
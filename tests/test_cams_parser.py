@@ -0,0 +1,115 @@
+import io
+import json
+from collections import defaultdict
+
+import pytest
+
+import cams_parser
+from benchmarks.generators import synthetic_statement
+from cams_parser import iter_transactions, parse_cams_json, record_date
+
+
+def legacy_parse_cams_json(file):
+    """The original row-at-a-time parser: the latest NAV is the last row's in file order"""
+    holdings = defaultdict(lambda: {"units": 0.0, "latest_nav": 0.0})
+    for record in json.load(file).get("TRXN_DETAILS", []):
+        desc = record.get("Desc", "").lower()
+        units = float(record.get("Units", 0))
+        holding = holdings[record.get("Scheme Name", "N/A")]
+        if "purchase" in desc:
+            holding["units"] += units
+        elif "redemption" in desc or "switch" in desc:
+            holding["units"] -= units
+        else:
+            holding["units"] += units
+        holding["latest_nav"] = float(record.get("Price", 0))
+    return {scheme: (h["units"], h["latest_nav"]) for scheme, h in holdings.items()}
+
+
+def engines(raw, monkeypatch):
+    """Portfolio from the streaming, columnar and pyarrow paths"""
+    results = {"streaming": parse_cams_json(io.BytesIO(raw), stream=True)}
+    monkeypatch.setattr(cams_parser, "ARROW_MIN_BYTES", len(raw) + 1)
+    results["columnar"] = parse_cams_json(io.BytesIO(raw))
+    monkeypatch.setattr(cams_parser, "ARROW_MIN_BYTES", 0)
+    results["arrow"] = parse_cams_json(io.BytesIO(raw))
+    return results
+
+
+def by_scheme(portfolio):
+    """``{scheme: units}`` and ``{scheme: NAV}``, comparable with ``pytest.approx``"""
+    return ({row["Scheme Name"]: row["Total Units"] for row in portfolio},
+            {row["Scheme Name"]: row["Current NAV"] for row in portfolio})
+
+
+def split(holdings):
+    return {s: units for s, (units, _) in holdings.items()}, {s: nav for s, (_, nav) in holdings.items()}
+
+
+def statement(*records, **other):
+    return json.dumps({**other, "TRXN_DETAILS": list(records)}).encode()
+
+
+def test_engines_match_the_legacy_parser_on_an_unsorted_statement(monkeypatch):
+    raw = synthetic_statement(3000, schemes=25)
+    assert cams_parser._arrow_columns(raw) is not None
+    records = json.loads(raw)["TRXN_DETAILS"]
+    # The legacy parser took the last row's NAV, so it agrees once rows are in date order
+    in_date_order = sorted(records, key=record_date)
+    expected = legacy_parse_cams_json(io.BytesIO(statement(*in_date_order)))
+    units, navs = split(expected)
+
+    results = engines(raw, monkeypatch)
+    for name, (portfolio, total) in results.items():
+        assert by_scheme(portfolio)[0] == pytest.approx(units), name
+        assert by_scheme(portfolio)[1] == navs, name
+        assert total == pytest.approx(sum(units[s] * navs[s] for s in units)), name
+    # Every engine lists schemes in order of first appearance in the file
+    orders = {name: [row["Scheme Name"] for row in portfolio] for name, (portfolio, _) in results.items()}
+    assert orders["streaming"] == orders["columnar"] == orders["arrow"] == list(dict.fromkeys(
+        record["Scheme Name"] for record in records))
+
+
+def test_redemptions_and_switches_subtract_units(monkeypatch):
+    raw = statement(
+        {"Scheme Name": "A", "Desc": "Purchase", "Units": "10", "Price": "10", "Date": "01-Jan-2026"},
+        {"Scheme Name": "A", "Desc": "Redemption", "Units": "3", "Price": "11", "Date": "02-Jan-2026"},
+        {"Scheme Name": "A", "Desc": "Switch Out", "Units": "2", "Price": "12", "Date": "03-Jan-2026"},
+        {"Scheme Name": "A", "Desc": "Switch In", "Units": "1", "Price": "13", "Date": "04-Jan-2026"},
+        {"Scheme Name": "A", "Desc": "Dividend Reinvestment", "Units": "0.5", "Price": "14", "Date": "05-Jan-2026"},
+        {"Scheme Name": "B", "Desc": "SIP Purchase", "Units": "4", "Price": "20", "Date": "01-Jan-2026"},
+        {"Scheme Name": "B", "Desc": "REDEMPTION", "Units": "4", "Price": "21", "Date": "02-Jan-2026"},
+    )
+    expected = {"A": (4.5, 14.0), "B": (0.0, 21.0)}
+    assert legacy_parse_cams_json(io.BytesIO(raw)) == expected
+    for name, (portfolio, total) in engines(raw, monkeypatch).items():
+        assert by_scheme(portfolio) == split(expected), name
+        assert total == pytest.approx(63.0), name
+
+
+def test_latest_nav_is_the_last_row_of_the_latest_date(monkeypatch):
+    raw = statement(
+        {"Scheme Name": "A", "Desc": "Purchase", "Units": "1", "Price": "30", "Date": "05-Jan-2026"},
+        {"Scheme Name": "A", "Desc": "Purchase", "Units": "1", "Price": "10", "Date": "01-Jan-2026"},
+        {"Scheme Name": "A", "Desc": "Purchase", "Units": "1", "Price": "31", "Date": "05-Jan-2026"},
+        {"Scheme Name": "A", "Desc": "Purchase", "Units": "1", "Price": "20", "Date": "03-Jan-2026"},
+    )
+    for name, (portfolio, _) in engines(raw, monkeypatch).items():
+        assert by_scheme(portfolio) == ({"A": 4.0}, {"A": 31.0}), name
+
+
+@pytest.mark.parametrize("raw", [statement(), b"{}", statement(investor={"name": "Asha"}), b'{"TRXN_DETAILS": [ ]}'])
+def test_statements_without_transactions_are_empty(raw, monkeypatch):
+    for name, result in engines(raw, monkeypatch).items():
+        assert result == ([], 0.0), name
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 1 << 16])
+def test_iter_transactions_survives_any_chunk_boundary(chunk_size):
+    records = json.loads(synthetic_statement(200))["TRXN_DETAILS"]
+    raw = json.dumps({"before": [1, {"x": "}"}], "TRXN_DETAILS": records, "after": 3.25}, indent=1).encode()
+    progress = []
+    found = list(iter_transactions(io.BytesIO(raw), chunk_size=chunk_size,
+                                   progress=lambda done, count: progress.append(count)))
+    assert found == records
+    assert progress[-1] == len(records)
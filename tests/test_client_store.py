@@ -0,0 +1,70 @@
+import json
+
+from client_store import ClientStore
+
+LEGACY = {
+    "9000000001": {"user_id": "asha", "name": "Asha", "email": "asha@example.com",
+                   "income_bracket": "5-10 Lakh", "age_bracket": "25-35", "password": "x1",
+                   "registered": True, "otp_verified": True},
+    "9000000002": {"user_id": "ravi", "name": "Ravi", "income_bracket": "<5 Lakh",
+                   "age_bracket": "<25", "password": "x2", "registered": True},
+    "9000000003": {"name": "Pending"},
+}
+
+
+def legacy_file(tmp_path, clients=LEGACY):
+    path = tmp_path / "clients.json"
+    path.write_text(json.dumps(clients))
+    return str(path)
+
+
+def test_migrates_clients_json(tmp_path):
+    store = ClientStore(str(tmp_path / "clients.db"), legacy_file=legacy_file(tmp_path))
+
+    assert store.count() == 3
+    assert store.all() == {
+        "9000000001": {**LEGACY["9000000001"], "phone": "9000000001"},
+        "9000000002": {**LEGACY["9000000002"], "phone": "9000000002"},
+        "9000000003": {"name": "Pending", "phone": "9000000003", "registered": False},
+    }
+    assert store.user_id_taken("ravi")
+    assert not store.user_id_taken("nobody")
+
+
+def test_migrates_only_once(tmp_path):
+    db, legacy = str(tmp_path / "clients.db"), legacy_file(tmp_path)
+    store = ClientStore(db, legacy_file=legacy)
+    store.replace_all({"9000000002": {**LEGACY["9000000002"], "name": "Ravi Kumar"}})
+    legacy_file(tmp_path, {**LEGACY, "9000000004": {"user_id": "late", "registered": True}})
+
+    reopened = ClientStore(db, legacy_file=legacy)
+
+    assert reopened.migrate_from_json(legacy) == 0
+    assert reopened.count() == 3
+    assert reopened.get("9000000002")["name"] == "Ravi Kumar"
+    assert reopened.get("9000000004") is None
+
+
+def test_forced_migration_adds_only_new_clients(tmp_path):
+    db, legacy = str(tmp_path / "clients.db"), legacy_file(tmp_path)
+    store = ClientStore(db, legacy_file=legacy)
+    store.replace_all({"9000000002": {**LEGACY["9000000002"], "name": "Ravi Kumar"}})
+    legacy_file(tmp_path, {**LEGACY, "9000000004": {"user_id": "late", "registered": True}})
+
+    assert store.migrate_from_json(legacy, force=True) == 1
+    assert store.count() == 4
+    assert store.get("9000000002")["name"] == "Ravi Kumar"
+
+
+def test_rejects_duplicate_registration(tmp_path):
+    store = ClientStore(str(tmp_path / "clients.db"), legacy_file=legacy_file(tmp_path))
+
+    assert store.add("9000000009", {"user_id": "asha", "registered": True}) == (False, "User ID already in use.")
+    assert store.add("9000000001", {"user_id": "asha2", "registered": True}) == (
+        False, "Mobile number already registered.")
+    assert store.get("9000000009") is None
+    assert store.get("9000000001")["user_id"] == "asha"
+
+    assert store.add("9000000009", {"user_id": "meera", "registered": True}) == (True, "Registration complete!")
+    assert store.add("9000000010", {"user_id": "meera", "registered": True})[0] is False
+    assert store.count() == 4
@@ -0,0 +1,22 @@
+import io
+
+import pytest
+
+import csv_ingest
+from csv_ingest import ingest_csv
+
+POLICIES = (
+    b"Policy Type, Policy Number,Premium Amount,Due Date\n"
+    b"Life,007,\"1,200\",2026-11-01\n"
+    b"Health,0042,800,01-Dec-2026\n"
+)
+
+
+@pytest.mark.parametrize("stream_bytes", [csv_ingest.STREAM_BYTES, 0], ids=["one-pass", "chunked"])
+def test_policy_numbers_keep_leading_zeros(monkeypatch, stream_bytes):
+    monkeypatch.setattr(csv_ingest, "STREAM_BYTES", stream_bytes)
+    frame, errors, message = ingest_csv(io.BytesIO(POLICIES), "insurance")
+    assert errors == [] and message is None
+    assert frame["Policy Number"].tolist() == ["007", "0042"]
+    assert frame["Premium Amount"].tolist() == [1200.0, 800.0]
+    assert frame["Due Date"].dt.strftime("%Y-%m-%d").tolist() == ["2026-11-01", "2026-12-01"]
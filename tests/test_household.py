@@ -0,0 +1,40 @@
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+import household
+
+STATEMENT = json.dumps({"TRXN_DETAILS": [
+    {"Scheme Name": "Fund A", "Desc": "Purchase", "Units": "10", "Price": "12.5", "Date": "01-Jan-2026"},
+]}).encode()
+FILES = [("asha.json", STATEMENT), ("ravi.json", STATEMENT)]
+
+
+def broken_pool():
+    pool = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+    with pytest.raises(BrokenProcessPool):
+        pool.submit(os._exit, 1).result()
+    return pool
+
+
+def check(results):
+    assert [error for _, error in results] == [None, None]
+    assert [frame["member"].iloc[0] for frame, _ in results] == ["asha", "ravi"]
+    assert [frame["value"].iloc[0] for frame, _ in results] == [125.0, 125.0]
+
+
+def test_broken_shared_pool_is_replaced(monkeypatch):
+    broken = broken_pool()
+    monkeypatch.setattr(household, "_pool", broken)
+    check(household.parse_statements(FILES))
+    assert household._pool is not broken
+    household._pool.shutdown()
+    household._pool = None
+
+
+def test_broken_own_pool_falls_back_to_this_process():
+    check(household.parse_statements(FILES, pool=broken_pool()))
@@ -0,0 +1,53 @@
+import os
+import time
+
+import pytest
+
+import metrics
+
+
+@pytest.fixture
+def enabled(monkeypatch):
+    monkeypatch.setattr(metrics, "ENABLED", True)
+    metrics.reset()
+    yield
+    metrics.stop_writer()
+    metrics.reset()
+
+
+def wait_for(path, text, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if os.path.exists(path):
+            with open(path) as f:
+                content = f.read()
+            if text in content:
+                return content
+        time.sleep(0.02)
+    raise AssertionError(f"{path} never contained {text!r}")
+
+
+def test_writer_rewrites_its_own_file_in_the_background(enabled, tmp_path):
+    path = metrics.start_writer("backup", path=str(tmp_path / "capital_cartel.prom"), interval=0.05)
+    assert path == str(tmp_path / f"capital_cartel.backup.{os.getpid()}.prom")
+    assert metrics.start_writer("backup", path=str(tmp_path / "other.prom")) == path
+
+    metrics.inc("uploads_total", kind="cams")
+    content = wait_for(path, "uploads_total")
+    assert f'capital_cartel_uploads_total{{kind="cams",app="backup",pid="{os.getpid()}"}} 1' in content
+    metrics.inc("uploads_total", kind="cams")
+    wait_for(path, "} 2")
+
+    metrics.stop_writer()
+    assert not os.path.exists(path)
+
+
+def test_processes_write_separate_files(enabled):
+    assert metrics.process_file("/var/lib/prom/app.prom", "cams") != metrics.process_file(
+        "/var/lib/prom/app.prom", "mf_app")
+    assert metrics.process_file("/var/lib/prom/app", "cams").endswith(f"app.cams.{os.getpid()}.prom")
+
+
+def test_writer_is_off_when_disabled(monkeypatch, tmp_path):
+    monkeypatch.setattr(metrics, "ENABLED", False)
+    assert metrics.start_writer("backup", path=str(tmp_path / "m.prom")) is None
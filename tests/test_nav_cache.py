@@ -0,0 +1,57 @@
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+import nav_cache
+from nav_cache import NavCache
+
+
+PUBLISHED = datetime(2026, 10, 15, 23, 30, tzinfo=nav_cache.IST)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = NavCache(str(tmp_path / "nav.db"))
+    cache.put_many([("100", 10.5, "15-Oct-2026"), ("200", 20.0, "15-Oct-2026")], checked_at=1.0)
+    return cache
+
+
+def accessed(cache):
+    with sqlite3.connect(cache.path) as conn:
+        return dict(conn.execute("SELECT amfi_code, accessed_at FROM nav_quotes"))
+
+
+def test_reads_do_not_write_until_a_batch_is_due(cache):
+    for _ in range(50):
+        assert cache.latest("100")["nav"] == 10.5
+        assert cache.fresh(["200"], now=PUBLISHED) == {"200": (20.0, "15-Oct-2026")}
+    assert accessed(cache) == {"100": 1.0, "200": 1.0}
+    # Repeat reads of a code inside TOUCH_EVERY are noted once
+    assert cache.flush_touches() == 2
+    times = accessed(cache)
+    assert times["100"] > 1.0
+    cache.latest("100")
+    assert cache.flush_touches() == 0
+
+
+def test_a_full_batch_is_written_by_the_read_that_fills_it(cache, monkeypatch):
+    monkeypatch.setattr(nav_cache, "TOUCH_BATCH", 2)
+    cache.latest("100")
+    assert accessed(cache)["100"] == 1.0
+    cache.latest("200")
+    assert all(value > 1.0 for value in accessed(cache).values())
+
+
+def test_eviction_sees_pending_reads(cache):
+    cache.max_entries = 1
+    cache.latest("200")
+    assert cache.evict() == 1
+    assert list(accessed(cache)) == ["200"]
+
+
+def test_forced_refresh_skips_only_stale_quotes(cache):
+    rechecked = PUBLISHED.timestamp() + 60  # AMFI was late; re-checked after the publication time
+    cache.put("300", 30.0, "14-Oct-2026", checked_at=rechecked)
+    assert set(cache.fresh(["100", "300", "400"], now=PUBLISHED)) == {"100", "300"}
+    assert set(cache.fresh(["100", "300", "400"], force=True, now=PUBLISHED)) == {"100"}
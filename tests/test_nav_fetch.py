@@ -0,0 +1,52 @@
+import threading
+import time
+
+from nav_fetch import fetch_navs
+
+
+class FakeMftool:
+    """Stands in for ``Mftool``: fixed quotes, optional failures and hangs"""
+
+    def __init__(self, navs, fail_once=(), hang=()):
+        self.navs = navs
+        self.fail_once = set(fail_once)
+        self.hang = set(hang)
+        self.calls = []
+        self.release = threading.Event()
+
+    def get_scheme_quote(self, code):
+        self.calls.append(code)
+        if code in self.hang:
+            self.release.wait()
+        if code in self.fail_once:
+            self.fail_once.discard(code)
+            raise ConnectionError("reset")
+        if code not in self.navs:
+            return None
+        return {"nav": str(self.navs[code]), "last_updated": "15-Oct-2026"}
+
+
+def test_fetches_each_unique_code_once():
+    fake = FakeMftool({"1": 10.5, "2": 20.0})
+    progress = []
+    results = fetch_navs(["1", "2", "1", None, ""], fake, on_progress=lambda *args: progress.append(args))
+    assert results == {"1": (10.5, "15-Oct-2026"), "2": (20.0, "15-Oct-2026")}
+    assert sorted(fake.calls) == ["1", "2"]
+    assert [done for done, _, _ in progress] == [1, 2]
+
+
+def test_retries_failures_and_reports_missing_codes():
+    fake = FakeMftool({"1": 10.5}, fail_once={"1"})
+    results = fetch_navs(["1", "3"], fake, retries=1, backoff=0)
+    assert results == {"1": (10.5, "15-Oct-2026"), "3": (None, None)}
+
+
+def test_hung_requests_cannot_block_queued_codes():
+    fake = FakeMftool({}, hang={"1", "2", "3"})
+    began = time.monotonic()
+    try:
+        results = fetch_navs(["1", "2", "3"], fake, max_workers=2, timeout=0.5, retries=1, backoff=0)
+    finally:
+        fake.release.set()
+    assert results == {code: (None, None) for code in ("1", "2", "3")}
+    assert time.monotonic() - began < 5
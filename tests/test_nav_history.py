@@ -0,0 +1,24 @@
+import numpy as np
+import pytest
+
+from nav_history import NavHistory
+
+
+@pytest.fixture
+def history(tmp_path):
+    history = NavHistory(str(tmp_path))
+    history.append(100, ["2000-01-01", "2000-01-03"], [10.0, 11.0])
+    return history
+
+
+def test_range_starting_before_epoch_stays_aligned(history):
+    dates, navs = history.navs([100, 200], "1999-12-30", "2000-01-04")
+    assert navs.shape == (2, len(dates)) == (2, 6)
+    np.testing.assert_array_equal(navs[0], [np.nan, np.nan, 10.0, 10.0, 11.0, 11.0])
+    assert np.isnan(navs[1]).all()
+
+
+def test_range_entirely_before_epoch_is_all_nan(history):
+    dates, navs = history.navs([100], "1999-01-01", "1999-01-10")
+    assert navs.shape == (1, 10) and np.isnan(navs).all()
+    assert history.navs([100], "2000-01-05", "2000-01-04")[1].shape == (1, 0)
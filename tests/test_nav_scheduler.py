@@ -0,0 +1,66 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+import nav_scheduler
+from nav_cache import IST, NavCache
+from nav_scheduler import LEASE_SECONDS, NavScheduler
+
+PUBLISHED = datetime(2026, 10, 15, 23, 30, tzinfo=IST)
+
+
+@pytest.fixture
+def schedulers(tmp_path):
+    path = str(tmp_path / "nav.db")
+    return NavScheduler(NavCache(path), quotes=None), NavScheduler(NavCache(path), quotes=None)
+
+
+def test_one_of_two_schedulers_takes_the_lease(schedulers):
+    claims, start = [], threading.Barrier(2)
+
+    def claim(scheduler):
+        start.wait()
+        claims.append(scheduler._claim(PUBLISHED, False))
+
+    threads = [threading.Thread(target=claim, args=(s,)) for s in schedulers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(claims, key=str) == [PUBLISHED.date(), None]
+    assert schedulers[0].status()["state"] == "running"
+
+
+def test_finished_refresh_is_not_repeated_by_the_other(schedulers):
+    first, second = schedulers
+    assert first.refresh(PUBLISHED)["nav_date"] == PUBLISHED.date()
+    assert second.refresh(PUBLISHED + timedelta(minutes=5)) is None
+    assert second.next_run(PUBLISHED) > PUBLISHED.timestamp()
+
+
+def test_expired_lease_is_taken_over(schedulers):
+    first, second = schedulers
+    assert first._claim(PUBLISHED, False) == PUBLISHED.date()  # then its process dies
+    assert second.refresh(PUBLISHED + timedelta(seconds=LEASE_SECONDS - 1)) is None
+    status = second.refresh(PUBLISHED + timedelta(seconds=LEASE_SECONDS + 1))
+    assert (status["state"], status["nav_date"], status["lease_until"]) == ("idle", PUBLISHED.date(), None)
+
+
+def test_loop_survives_a_failing_refresh(schedulers, monkeypatch):
+    scheduler = schedulers[0]
+    calls = []
+
+    def refresh():
+        calls.append(time.monotonic())
+        raise ConnectionError("mftool is down")
+
+    monkeypatch.setattr(scheduler, "refresh", refresh)
+    monkeypatch.setattr(nav_scheduler.log, "exception", lambda *args: None)
+    scheduler.start(check_every=0.02)
+    deadline = time.monotonic() + 5
+    while len(calls) < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    scheduler.stop()
+    assert len(calls) >= 3
@@ -0,0 +1,81 @@
+import os
+import time
+
+import pytest
+
+import otp_store
+from otp_store import EXPIRED, INCORRECT, NOT_SENT, TOO_MANY, VERIFIED, OtpStore
+
+REDIS_URL = os.environ.get("OTP_TEST_REDIS_URL")
+
+
+@pytest.fixture
+def store(tmp_path):
+    return OtpStore(str(tmp_path / "otp.db"), ttl=300, rate_limit=3, rate_window=600)
+
+
+def test_correct_otp_is_used_once(store):
+    assert store.issue("111", "1234", now=0)[0]
+    assert store.verify("111", "1234", now=10) == (True, VERIFIED)
+    assert store.verify("111", "1234", now=11) == (False, NOT_SENT)
+
+
+def test_otp_expires(store):
+    store.issue("111", "1234", now=0)
+    assert store.verify("111", "1234", now=301) == (False, EXPIRED)
+    assert store.verify("111", "1234", now=302) == (False, NOT_SENT)
+
+
+def test_wrong_guesses_discard_the_otp(store):
+    store.issue("111", "1234", now=0)
+    for _ in range(otp_store.MAX_ATTEMPTS - 1):
+        assert store.verify("111", "0000", now=1) == (False, INCORRECT)
+    assert store.verify("111", "0000", now=1) == (False, TOO_MANY)
+    assert store.verify("111", "1234", now=1) == (False, NOT_SENT)
+
+
+def test_sends_are_rate_limited_per_window(store):
+    for otp in ("1", "2", "3"):
+        assert store.issue("111", otp, now=0)[0]
+    ok, message = store.issue("111", "4", now=100)
+    assert not ok and "501 seconds" in message
+    assert store.issue("222", "5", now=100)[0]
+    assert store.issue("111", "6", now=600)[0]
+    assert store.verify("111", "3", now=600) == (False, INCORRECT)  # replaced by the newest OTP
+
+
+def test_sweep_removes_expired_otps(store):
+    store.issue("111", "1", now=0)
+    store.issue("222", "2", now=200)
+    assert store.sweep(now=400) == 1
+    assert store.verify("222", "2", now=400) == (True, VERIFIED)
+
+
+@pytest.fixture
+def redis_store():
+    if not REDIS_URL:
+        pytest.skip("set OTP_TEST_REDIS_URL to test the Redis store")
+    store = otp_store.RedisOtpStore(REDIS_URL, ttl=1, rate_limit=3, rate_window=2)
+    store.redis.delete("otp:111", "otp:sends:111")
+    return store
+
+
+def test_redis_store_verifies_once_and_caps_attempts(redis_store):
+    redis_store.issue("111", "1234")
+    for _ in range(otp_store.MAX_ATTEMPTS - 1):
+        assert redis_store.verify("111", "0000") == (False, INCORRECT)
+    assert redis_store.redis.ttl("otp:111") > 0
+    assert redis_store.verify("111", "0000") == (False, TOO_MANY)
+    redis_store.issue("111", "1234")
+    assert redis_store.verify("111", "1234") == (True, VERIFIED)
+    assert redis_store.verify("111", "1234") == (False, NOT_SENT)
+
+
+def test_redis_store_expiry_and_rate_limit(redis_store):
+    for otp in ("1", "2", "3"):
+        assert redis_store.issue("111", otp)[0]
+    assert not redis_store.issue("111", "4")[0]
+    time.sleep(2.1)
+    assert redis_store.verify("111", "3") == (False, NOT_SENT)
+    assert not redis_store.redis.exists("otp:111")
+    assert redis_store.issue("111", "5")[0]
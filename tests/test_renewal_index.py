@@ -0,0 +1,64 @@
+from datetime import date
+
+import pandas as pd
+import pytest
+
+import renewal_index
+import userdata_store
+from renewal_index import RenewalIndex, due_in_frame
+from userdata_store import UserDataStore
+
+TODAY = date(2026, 10, 15)
+
+
+def policies(*due_dates):
+    return pd.DataFrame({
+        "Policy Number": [f"P{i}" for i in range(len(due_dates))],
+        "Policy Type": "Term",
+        "Premium Amount": [1000.0 * (i + 1) for i in range(len(due_dates))],
+        "Due Date": list(due_dates),
+    })
+
+
+@pytest.fixture
+def store(tmp_path):
+    return UserDataStore(str(tmp_path / "userdata"))
+
+
+@pytest.fixture
+def index(tmp_path, store, monkeypatch):
+    monkeypatch.setattr(userdata_store, "get_store", lambda: store)
+    monkeypatch.setattr(renewal_index, "RenewalIndex", lambda: RenewalIndex(str(tmp_path / "renewals.db")))
+    monkeypatch.setattr(renewal_index, "_index", None)
+    monkeypatch.setattr(renewal_index, "_reconciled", 0.0)
+    return renewal_index.get_index()
+
+
+def test_due_window_is_half_open(index, store):
+    df = policies("2026-10-14", "2026-10-15", "2026-11-13", "2026-11-14")
+    store.save_frame("111", "insurance", df)
+    assert index.due_within(30, today=TODAY)["policy_number"].tolist() == ["P1", "P2"]
+    assert due_in_frame(df, 30, TODAY)["policy_number"].tolist() == ["P1", "P2"]
+
+
+def test_hook_and_reconcile_follow_every_save(index, store):
+    store.save_frame("111", "insurance", policies("2026-10-20"))
+    assert index.due_within(today=TODAY)["mobile"].tolist() == ["111"]  # through the hook
+    assert index.reconcile(store) == 0
+
+    other = UserDataStore(store.datadir)  # another process, or a save before the hook was attached
+    other.save_frame("222", "insurance", policies("2026-10-18"))
+    other.save_frame("111", "insurance", policies("2026-12-20"))
+    assert index.due_within(today=TODAY)["mobile"].tolist() == ["111"]
+    assert index.reconcile(store) == 2
+    assert index.due_within(today=TODAY)["mobile"].tolist() == ["222"]
+
+    other.clear("222")
+    renewal_index._reconciled = 0.0
+    assert renewal_index.get_index().due_within(today=TODAY).empty
+
+
+def test_index_from_an_older_version_is_rebuilt(index, store, monkeypatch):
+    assert index.built()
+    monkeypatch.setattr(renewal_index, "INDEX_VERSION", "next")
+    assert not index.built()
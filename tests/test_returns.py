@@ -0,0 +1,67 @@
+import io
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import returns
+from returns import TOTAL_LABEL, holdings_returns, statement_returns, xirr_by_group, xirr_matrix
+
+
+def test_one_year_return():
+    xirr = xirr_by_group(["A", "A"], ["2025-01-01", "2026-01-01"], [-1000.0, 1100.0])
+    assert xirr["A"] == pytest.approx(0.10)
+
+
+@pytest.mark.parametrize("amounts", [[-100.0, -50.0], [100.0, 50.0], [0.0, 0.0]])
+def test_flows_all_one_way_have_no_rate(amounts):
+    assert np.isnan(xirr_matrix([amounts], [[0.0, 1.0]])).all()
+
+
+def test_bisection_settles_what_newton_cannot(monkeypatch):
+    amounts, years = [[-137.0, -120.0, 52.0]], [[0.0, 1.43, 2.94]]
+    calls = []
+    npv = returns._npv
+    monkeypatch.setattr(returns, "_npv", lambda *args: calls.append(1) or npv(*args))
+    rate = xirr_matrix(amounts, years)[0]
+    assert len(calls) > returns.NEWTON_STEPS  # Newton gave up and bisection ran
+    assert rate == pytest.approx(-0.5358545, abs=1e-6)
+    assert npv(np.array([rate]), np.array(amounts), np.array(years))[0][0] == pytest.approx(0, abs=1e-6)
+
+
+def test_rows_are_solved_together():
+    rates = xirr_matrix([[-100.0, 110.0, 0.0], [-100.0, 0.0, 121.0], [-100.0, -100.0, 0.0]],
+                        [[0.0, 1.0, 0.0], [0.0, 0.0, 2.0], [0.0, 1.0, 0.0]])
+    np.testing.assert_allclose(rates[:2], [0.10, 0.10])
+    assert np.isnan(rates[2])
+
+
+def test_returns_are_cached_by_statement_and_valuation(monkeypatch):
+    monkeypatch.setattr(returns, "_cache", returns.OrderedDict())
+    flows = pd.DataFrame({"scheme": [0, 1], "date": pd.to_datetime(["2025-01-01", "2025-01-01"]),
+                          "amount": [-1000.0, -500.0]})
+    held = pd.DataFrame({"value": [1100.0, 550.0], "as_of": pd.Timestamp("2026-01-01")})
+    built = []
+
+    def read_flows():
+        built.append(1)
+        return flows
+
+    table = holdings_returns("abc", read_flows, held)
+    assert table.loc[TOTAL_LABEL, "XIRR (%)"] == pytest.approx(10.0)
+    assert holdings_returns("abc", read_flows, held).equals(table) and len(built) == 1
+    holdings_returns("abc", read_flows, held.assign(value=[1200.0, 550.0]))
+    holdings_returns("def", read_flows, held)
+    assert len(built) == 3
+
+
+def test_statement_returns_stream_the_file_once_per_digest(monkeypatch):
+    monkeypatch.setattr(returns, "_cache", returns.OrderedDict())
+    raw = json.dumps({"TRXN_DETAILS": [
+        {"Scheme Name": "A", "Desc": "Purchase", "Units": "100", "Price": "10", "Date": "01-Jan-2025"},
+        {"Scheme Name": "A", "Desc": "Redemption", "Units": "50", "Price": "11", "Date": "01-Jan-2026"},
+    ]}).encode()
+    table = statement_returns(io.BytesIO(raw), "abc")
+    assert table.loc["A", "XIRR (%)"] == pytest.approx(10.0)
+    assert statement_returns(io.BytesIO(b"not read"), "abc").equals(table)
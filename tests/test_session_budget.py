@@ -0,0 +1,32 @@
+import os
+
+import pandas as pd
+
+from session_budget import SessionBudget
+
+
+def test_missing_spill_file_returns_default_and_drops_the_entry(tmp_path):
+    budget = SessionBudget(ceiling=1, spill_dir=str(tmp_path))
+    budget.put("a", "portfolio", pd.DataFrame({"value": range(1000)}))
+    budget.put("b", "portfolio", pd.DataFrame({"value": range(1000)}))
+    entry = budget._sessions["a"]["values"]["portfolio"]
+    assert entry[0] is None and os.path.exists(entry[2])
+
+    os.remove(entry[2])
+    assert budget.get("a", "portfolio", default="reload") == "reload"
+    assert "portfolio" not in budget._sessions["a"]["values"]
+    assert budget.get("b", "portfolio")["value"].sum() == sum(range(1000))
+
+
+def test_frame_that_cannot_be_encoded_stays_in_memory(tmp_path):
+    budget = SessionBudget(ceiling=1, idle=0, spill_dir=str(tmp_path))
+    mixed = pd.DataFrame({"value": [1, "a", 2.5] * 100})
+    budget.put("a", "mixed", mixed, now=1.0)
+    budget.put("a", "portfolio", pd.DataFrame({"value": range(1000)}), now=1.0)
+    budget.put("b", "portfolio", pd.DataFrame({"value": range(1000)}), now=2.0)
+
+    values = budget._sessions["a"]["values"]
+    assert values["mixed"][0] is mixed and values["portfolio"][0] is None
+    assert budget.sweep(now=3.0) == (1, 0)
+    assert budget.get("a", "mixed") is mixed
+    assert budget._sessions["b"]["values"]["portfolio"][0] is None
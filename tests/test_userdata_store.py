@@ -0,0 +1,68 @@
+import os
+
+import pandas as pd
+import pytest
+
+from userdata_store import UserDataStore, WriteBatch
+
+
+@pytest.fixture
+def store(tmp_path):
+    return UserDataStore(str(tmp_path / "userdata"))
+
+
+def test_unchanged_writes_are_skipped(store):
+    goals = [{"Goal Type": "Home", "Goal Amount": 100}]
+    assert store.save("111", "financialgoals", goals)
+    mtime = os.stat(store.path("111", "financialgoals")).st_mtime_ns
+    assert not store.save("111", "financialgoals", goals)
+    assert os.stat(store.path("111", "financialgoals")).st_mtime_ns == mtime
+    assert store.save_frame("111", "portfolio", pd.DataFrame({"Investment Amount": [1.0]}))
+    assert not store.save_frame("111", "portfolio", pd.DataFrame({"Investment Amount": [1.0]}))
+
+
+def test_batch_keeps_the_latest_change_per_file(store):
+    store.save("111", "financialgoals", [1])
+    batch = WriteBatch(store)
+    batch.stage("111", "financialgoals", [2])
+    batch.stage("111", "financialgoals", [3])
+    batch.stage("222", "financialgoals", [4])
+    batch.stage("222", "financialgoals", [5])
+    batch.stage("222", "financialgoals", [4])
+    batch.stage("333", "financialgoals", [6])
+    batch.stage("111", "financialgoals", [1])  # back to what is on disk: nothing to write
+    assert batch.flush() == 2
+    assert [store.load(m, "financialgoals") for m in ("111", "222", "333")] == [[1], [4], [6]]
+    assert batch.pending == {} and batch.flush() == 0
+
+
+def test_failed_write_stays_pending_and_the_rest_are_written(store, monkeypatch):
+    batch = WriteBatch(store)
+    for mobile in ("111", "222", "333"):
+        batch.stage(mobile, "financialgoals", [mobile])
+    write = store.write
+
+    def flaky(mobile, *args):
+        if mobile == "222":
+            raise OSError("disk full")
+        return write(mobile, *args)
+
+    monkeypatch.setattr(store, "write", flaky)
+    with pytest.raises(OSError):
+        batch.flush()
+    assert list(batch.pending) == [("222", "financialgoals")]
+    assert store.load("111", "financialgoals") == ["111"] and store.load("333", "financialgoals") == ["333"]
+
+    monkeypatch.setattr(store, "write", write)
+    assert batch.flush() == 1
+    assert store.load("222", "financialgoals") == ["222"]
+
+
+def test_hooks_hear_writes_and_clears_and_cannot_fail_a_save(store):
+    heard = []
+    store.on_save("financialgoals", lambda mobile, data: heard.append((mobile, data)))
+    store.on_save("financialgoals", lambda mobile, data: 1 / 0)
+    assert store.save("111", "financialgoals", [1])
+    assert not store.save("111", "financialgoals", [1])
+    store.clear("111")
+    assert heard == [("111", [1]), ("111", None)]
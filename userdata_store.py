@@ -0,0 +1,283 @@
+"""Storage for per-user data files (portfolio, goals, insurance).
+
+Writes are skipped when the content hash matches what is already on disk.
+Files are replaced atomically, so a crash mid-write cannot leave a
+truncated file behind. Pages stage their writes in a ``WriteBatch``, which
+is flushed once at the end of each script run. Tabular data is stored as
+Arrow IPC files (see ``frames``); existing JSON files are still read.
+Derived indexes subscribe with ``on_save`` to hear about every write made
+through this store, and compare ``signatures`` with what they last saw to
+catch writes made anywhere else.
+"""
+import hashlib
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+
+import metrics
+
+DATADIR = "userdata"
+KEYS = ("portfolio", "financialgoals", "insurance")
+EXTENSIONS = ("json", "arrow")
+
+log = logging.getLogger(__name__)
+
+
+def _encode(data):
+    return json.dumps(data, default=str).encode("utf-8")
+
+
+def is_frame(data):
+    """True for a pandas DataFrame, without importing pandas if nothing has yet"""
+    pd = sys.modules.get("pandas")
+    return pd is not None and isinstance(data, pd.DataFrame)
+
+
+class UserDataStore:
+    """Data files under ``datadir``, written only when their content changes"""
+
+    def __init__(self, datadir=DATADIR):
+        self.datadir = datadir
+        os.makedirs(datadir, exist_ok=True)
+        self._hashes = {}
+        self._hooks = {}
+        self._lock = threading.Lock()
+
+    def on_save(self, key, callback):
+        """Call ``callback(mobile, data)`` after each write of ``key``; data is None on clear.
+
+        The write has already happened when hooks run, so a failing hook is
+        logged rather than raised.
+        """
+        with self._lock:
+            self._hooks.setdefault(key, []).append(callback)
+
+    def _notify(self, mobile, key, data):
+        with self._lock:
+            hooks = list(self._hooks.get(key, ()))
+        for callback in hooks:
+            try:
+                callback(mobile, data)
+            except Exception:
+                log.exception("on_save hook for %s of %s failed", key, mobile)
+                metrics.inc("userdata_hook_errors_total", key=key)
+
+    def path(self, mobile, key, ext="json"):
+        return os.path.join(self.datadir, f"{mobile}_{key}.{ext}")
+
+    def _remember(self, path, digest):
+        # The stat signature lets another process's write invalidate the entry
+        try:
+            st = os.stat(path)
+            signature = (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            signature = None
+        with self._lock:
+            self._hashes[path] = (signature, digest)
+
+    def _disk_hash(self, path):
+        """SHA-256 of the file on disk, re-read only when its stat signature changes"""
+        try:
+            st = os.stat(path)
+            signature = (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            cached = self._hashes.get(path)
+        if cached and cached[0] == signature:
+            return cached[1]
+        with open(path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        with self._lock:
+            self._hashes[path] = (signature, digest)
+        return digest
+
+    def changed(self, mobile, key, payload, ext="json"):
+        """True if the encoded ``payload`` differs from the file on disk"""
+        return hashlib.sha256(payload).hexdigest() != self._disk_hash(self.path(mobile, key, ext))
+
+    @metrics.timed("userdata_seconds", op="write")
+    def write(self, mobile, key, payload, ext="json", data=None):
+        """Atomically replace the file with ``payload`` if it changed; returns True if written.
+
+        ``data`` is the decoded value, passed on to ``on_save`` hooks.
+        """
+        path = self.path(mobile, key, ext)
+        digest = hashlib.sha256(payload).hexdigest()
+        if digest == self._disk_hash(path):
+            metrics.inc("userdata_writes_total", result="unchanged")
+            return False
+        fd, tmp = tempfile.mkstemp(dir=self.datadir, prefix=f".{mobile}_{key}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        self._remember(path, digest)
+        metrics.inc("userdata_writes_total", result="written")
+        if ext != "json":
+            # The legacy JSON copy is superseded; drop it so loads are unambiguous
+            self._remove(self.path(mobile, key))
+        if data is not None:
+            self._notify(mobile, key, data)
+        return True
+
+    def _remove(self, path):
+        if os.path.exists(path):
+            os.remove(path)
+        with self._lock:
+            self._hashes.pop(path, None)
+
+    def save(self, mobile, key, data):
+        return self.write(mobile, key, _encode(data), data=data)
+
+    @metrics.timed("userdata_seconds", op="load")
+    def load(self, mobile, key):
+        """Stored data, or None if missing, empty or unreadable"""
+        path = self.path(mobile, key)
+        try:
+            with open(path, "rb") as f:
+                raw = f.read()
+        except FileNotFoundError:
+            return None
+        self._remember(path, hashlib.sha256(raw).hexdigest())
+        try:
+            return json.loads(raw) if raw.strip() else None
+        except ValueError:
+            return None
+
+    def signature(self, mobile, key):
+        """Stat signature of a client's stored files for ``key``; None if there are none"""
+        parts = []
+        for ext in EXTENSIONS:
+            try:
+                st = os.stat(self.path(mobile, key, ext))
+            except FileNotFoundError:
+                continue
+            parts.append(f"{ext}:{st.st_mtime_ns}:{st.st_size}")
+        return ",".join(sorted(parts)) or None
+
+    def signatures(self, key):
+        """``{mobile: signature}`` for every client with a stored file for ``key``, in one scan"""
+        suffixes = {f"_{key}.{ext}": ext for ext in EXTENSIONS}
+        found = {}
+        with os.scandir(self.datadir) as entries:
+            for entry in entries:
+                if entry.name.startswith("."):
+                    continue
+                for suffix, ext in suffixes.items():
+                    if entry.name.endswith(suffix):
+                        try:
+                            st = entry.stat()
+                        except FileNotFoundError:
+                            break
+                        found.setdefault(entry.name[:-len(suffix)], []).append(
+                            f"{ext}:{st.st_mtime_ns}:{st.st_size}")
+        return {mobile: ",".join(sorted(parts)) for mobile, parts in found.items()}
+
+    def mobiles(self, keys=KEYS):
+        """Sorted mobile numbers with at least one stored file for ``keys``"""
+        suffixes = tuple(f"_{key}.{ext}" for key in keys for ext in EXTENSIONS)
+        found = set()
+        for name in os.listdir(self.datadir):
+            for suffix in suffixes:
+                if name.endswith(suffix) and not name.startswith("."):
+                    found.add(name[:-len(suffix)])
+        return sorted(found)
+
+    def save_frame(self, mobile, key, df):
+        from frames import encode_frame
+
+        ext, payload = encode_frame(df)
+        return self.write(mobile, key, payload, ext, data=df)
+
+    @metrics.timed("userdata_seconds", op="load_frame")
+    def load_frame(self, mobile, key):
+        """Stored table as a DataFrame, from the Arrow file or a legacy JSON file"""
+        from frames import pa, read_arrow, read_legacy_json
+
+        path = self.path(mobile, key, "arrow")
+        if pa is not None and os.path.exists(path):
+            try:
+                return read_arrow(path)
+            except (OSError, pa.ArrowInvalid):
+                return None
+        try:
+            with open(self.path(mobile, key), "rb") as f:
+                raw = f.read()
+        except FileNotFoundError:
+            return None
+        self._remember(self.path(mobile, key), hashlib.sha256(raw).hexdigest())
+        try:
+            return read_legacy_json(raw, key) if raw.strip() else None
+        except ValueError:
+            return None
+
+    def clear(self, mobile):
+        for key in KEYS:
+            for ext in EXTENSIONS:
+                self._remove(self.path(mobile, key, ext))
+            self._notify(mobile, key, None)
+
+
+class WriteBatch:
+    """Pending writes for one session; only the latest value per file is kept"""
+
+    def __init__(self, store):
+        self.store = store
+        self.pending = {}
+
+    def stage(self, mobile, key, data):
+        self._stage(mobile, key, "json", _encode(data), data)
+
+    def stage_frame(self, mobile, key, df):
+        from frames import encode_frame
+
+        self._stage(mobile, key, *encode_frame(df), df)
+
+    def _stage(self, mobile, key, ext, payload, data):
+        if self.store.changed(mobile, key, payload, ext):
+            self.pending[(mobile, key)] = (ext, payload, data)
+        else:
+            self.pending.pop((mobile, key), None)
+
+    def flush(self):
+        """Write every staged change; returns the number of files written.
+
+        A write that fails stays pending for the next flush; the others are
+        still written, then the first failure is raised.
+        """
+        written, error = 0, None
+        for target, staged in list(self.pending.items()):
+            ext, payload, data = staged
+            try:
+                written += self.store.write(*target, payload, ext, data)
+            except Exception as exc:
+                error = error or exc
+                continue
+            if self.pending.get(target) is staged:
+                del self.pending[target]
+        if error is not None:
+            raise error
+        return written
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Process-wide user data store"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = UserDataStore()
+    return _store